@@ -0,0 +1,81 @@
+import importlib
+
+
+"""
+Intel RealSense tools of the CALHCI project: frame sources, recordings and
+the shared memory frame bus, color segmentation, object tracking with depth,
+and the AprilTag based Tower of Hanoi tracker with its state service,
+multi-camera fusion and offline batch processing.
+
+Importing the package is cheap. The names below are only imported from their
+module, together with numpy, OpenCV and the native apriltag and pyrealsense2
+modules they need, the first time they are used (PEP 562), so a worker process
+or a command line tool only pays for what it touches. The command line tools
+are installed as console scripts (see pyproject.toml) and also run with
+python -m realsense.<module>.
+"""
+
+
+# Public name -> module defining it.
+_EXPORTS = {
+    "Frame": "frame_source",
+    "FrameSource": "frame_source",
+    "Intrinsics": "frame_source",
+    "RealSenseSource": "frame_source",
+    "ReplaySource": "frame_source",
+    "SessionWriter": "frame_source",
+    "WebcamSource": "frame_source",
+    "open_source": "frame_source",
+    "FrameBusSource": "frame_bus",
+    "FrameBusWriter": "frame_bus",
+    "Recording": "recording",
+    "RecordingSource": "recording",
+    "RecordingWriter": "recording",
+    "AprilTagTracker": "apriltag_detect",
+    "DetectionError": "apriltag_detect",
+    "get_hanoi_tower": "apriltag_detect",
+    "get_rod": "apriltag_detect",
+    "BatchPoseSolver": "pose",
+    "Calibration": "calibration",
+    "CalibrationStore": "calibration",
+    "DividerVerifier": "calibration",
+    "load_or_calibrate": "calibration",
+    "HanoiStateFilter": "hanoi_service",
+    "HanoiStateServer": "hanoi_service",
+    "subscribe": "hanoi_service",
+    "FrameAligner": "multicam",
+    "MultiCameraRunner": "multicam",
+    "state_changes": "hanoi_states",
+    "state_lists": "hanoi_states",
+    "BatchProcessor": "batch",
+    "COLORS": "segmentation",
+    "ColorSegmenter": "segmentation",
+    "BlobTracker": "blob_tracker",
+    "TrackedBlob": "blob_tracker",
+    "BufferArena": "buffers",
+    "Deprojector": "deproject",
+    "box_depth_stats": "depth_stats",
+    "label_depth_stats": "depth_stats",
+    "Metrics": "metrics",
+    "NULL_METRICS": "metrics",
+    "PredictiveTracker": "predictive",
+    "ParallelMultiTracker": "multitrack",
+    "StagedPipeline": "stages",
+    "run_pipeline": "stages",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    # Later lookups find the name directly and skip __getattr__.
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,707 @@
+import numpy as np
+import cv2
+import argparse
+import time
+
+from .calibration import (add_calibration_arguments, calibration_from_args, load_or_calibrate,
+						verifier_from_args)
+from .depth_stats import label_depth_stats
+from .frame_source import add_source_arguments, source_from_args
+from .metrics import NULL_METRICS, add_metrics_arguments, metrics_from_args
+from .motion import add_motion_arguments, merge_rects, motion_gate_from_args, rects_overlap
+from .pose import BatchPoseSolver
+
+class DetectionError(Exception):
+	"""Exception raised when the camera fails to detect an AprilTag"""
+	pass
+
+def draw_details(tag, img):
+	"""Modify image to draw a bounding box, center, and id number on top of
+	the april tags to show additional information.
+
+	Args:
+		tag (AprilTag): April tag object
+		img (Image): Opencv image object
+	"""
+	(ptA, ptB, ptC, ptD) = tag.corners
+	ptB = (int(ptB[0]), int(ptB[1]))
+	ptC = (int(ptC[0]), int(ptC[1]))
+	ptD = (int(ptD[0]), int(ptD[1]))
+	ptA = (int(ptA[0]), int(ptA[1]))
+
+	# Draw bounding box.
+	cv2.line(img, ptA, ptB, (0, 255, 0), 2)
+	cv2.line(img, ptB, ptC, (0, 255, 0), 2)
+	cv2.line(img, ptC, ptD, (0, 255, 0), 2)
+	cv2.line(img, ptD, ptA, (0, 255, 0), 2)
+
+	# Draw the center.
+	(cX, cY) = (int(tag.center[0]), int(tag.center[1]))
+	cv2.circle(img, (cX, cY), 5, (0, 0, 255), -1)
+
+	cv2.putText(img, "ID: " + str(tag.tag_id), (ptA[0], ptA[1] - 15),
+				cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+
+def get_average_pos(arr):
+	"""Based on a given list of coordinates, find the average x, y, and z of a
+	every tag in the array.
+
+	Args:
+		arr (List): 2D List containing coordinates grouped by id
+
+	Returns:
+		Tuple: A tuple which returns (x, y, z)
+	"""
+	arr = np.array(arr)
+	return (np.mean(arr[:, 0]), np.mean(arr[:, 1]), np.mean(arr[:, 2]))
+
+
+# Corners of a tag in the tag's own coordinate system. The detector projects
+# these through its homography to get tag.corners, so they are in the same
+# order. Used to rebuild the homography after undistorting corners.
+TAG_CORNERS = np.array([[-1, 1], [1, 1], [1, -1], [-1, -1]], np.float32)
+
+# Stop criteria of the sub-pixel corner refinement after decimated detection.
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 0.01)
+
+
+def tag_rect(tag):
+	"""Return the (x0, y0, x1, y1) bounding rectangle of a tag's corners."""
+	(x0, y0), (x1, y1) = tag.corners.min(axis=0), tag.corners.max(axis=0)
+	return (x0, y0, x1, y1)
+
+
+class AprilTagTracker:
+	"""Long-lived AprilTag detector for a frame source. The detector, camera
+	matrix and undistortion data are created once and reused for every
+	picture instead of being rebuilt on each call.
+
+	Args:
+		source (FrameSource): Source to take pictures from
+		undistort (str): "remap" undistorts the whole image with precomputed
+			remap tables (same result as cv2.undistort). "points" detects on
+			the raw image and only undistorts the detected corners.
+		metrics (Metrics): Where to record timing spans and counters
+		incremental (boolean): Only search around the tags of the last frame
+		full_scan_every (int): In incremental mode, scan the whole frame at
+			least this often (new tags only show up on full scans)
+		padding (float): Padding of the incremental search windows relative to
+			the tag size
+		decimate (float): Find tags on an image this many times smaller and
+			refine their corners at full resolution (1 disables it)
+		fuse_depth (boolean): Scale tag positions to meters with the depth
+			under each tag. Needs a source with depth aligned to color.
+		max_pose_error (float): Ignore tags whose pose reprojects their
+			corners worse than this many pixels (root mean square)
+		motion_gate (MotionGate): Reuse the last detections while the image
+			doesn't change and only detect again where it changed (the gate's
+			padding covers the difference between raw and undistorted pixels)
+	"""
+
+	def __init__(self, source, undistort="remap", metrics=NULL_METRICS, incremental=False,
+				full_scan_every=30, padding=0.5, decimate=1, fuse_depth=False,
+				max_pose_error=None, motion_gate=None):
+		if undistort not in ("remap", "points"):
+			raise ValueError("undistort must be 'remap' or 'points'")
+		if decimate < 1:
+			raise ValueError("decimate must be at least 1")
+		self.source = source
+		self.undistort = undistort
+		self.metrics = metrics
+		self.incremental = incremental
+		self.decimate = decimate
+		self.fuse_depth = fuse_depth
+		self.max_pose_error = max_pose_error
+		self.motion_gate = motion_gate
+		self.full_scan_every = full_scan_every
+		self.padding = padding
+		self._last_corners = []
+		self._last_raw = []
+		self._last_result = None
+		self._since_scan = 0
+
+		# Set up April Tag detector to work with "tag36h11" tags. The native
+		# module is only loaded once a tracker is made, so importing this
+		# module (or a CLI built on it) stays cheap.
+		import apriltag
+		options = apriltag.DetectorOptions(families="tag36h11")
+		self.detector = apriltag.Detector(options)
+
+		self.intr = None
+		self.camera_matrix = None
+		self.dist_coeffs = None
+		self.camera_params = None
+		self.pose_solver = None
+		self.pose_errors = np.zeros(0)
+		# (x, y, z) of the dividers seen by the last get_tower_locations call.
+		self.divider_positions = []
+		self._maps = None
+
+	def _calibrate(self, intr):
+		"""Cache the camera matrix, distortion coefficients and remap tables for
+		the given intrinsics. Only does work when the intrinsics change.
+		"""
+		if intr is None:
+			raise DetectionError("Source does not provide camera intrinsics.")
+		if intr == self.intr:
+			return
+
+		self.intr = intr
+		self.camera_matrix = np.array([[intr.fx, 0, intr.ppx],
+									[0, intr.fy, intr.ppy],
+									[0, 0, 1]])
+		self.dist_coeffs = np.array(intr.coeffs)
+		self.camera_params = [intr.fx, intr.fy, intr.ppx, intr.ppy]
+		self.pose_solver = BatchPoseSolver(self.camera_params)
+		self._maps = None
+
+	def set_remap_tables(self, intr, maps=None):
+		"""Calibrate for intr and use remap tables built earlier, e.g. loaded
+		from a CalibrationStore, instead of building them on first use.
+
+		Args:
+			intr (Intrinsics): Intrinsics of the source's color stream
+			maps (Tuple): map1 and map2 made for intr, or None to build them
+		"""
+		self._calibrate(intr)
+		if maps is not None:
+			self._maps = maps
+
+	def remap_tables(self):
+		"""Return the undistortion remap tables, building them on first use.
+		These are the same tables cv2.undistort builds internally every call.
+		"""
+		if self._maps is None:
+			self._maps = cv2.initUndistortRectifyMap(
+				self.camera_matrix, self.dist_coeffs, None, self.camera_matrix,
+				(self.intr.width, self.intr.height), cv2.CV_16SC2)
+		return self._maps
+
+	def _undistort_detections(self, detections):
+		"""Move the corners and centers of detections made on the raw image into
+		undistorted pixel coordinates and rebuild their homographies.
+		"""
+		if not detections:
+			return detections
+
+		# Undistort every corner and center of the frame in a single call.
+		pts = np.concatenate([np.vstack((tag.corners, tag.center)) for tag in detections])
+		pts = cv2.undistortPoints(pts.reshape(-1, 1, 2).astype(np.float64),
+								self.camera_matrix, self.dist_coeffs,
+								P=self.camera_matrix).reshape(-1, 5, 2)
+
+		result = []
+		for tag, tag_pts in zip(detections, pts):
+			corners = tag_pts[:4]
+			homography = cv2.getPerspectiveTransform(TAG_CORNERS, corners.astype(np.float32))
+			result.append(tag._replace(corners=corners, center=tag_pts[4], homography=homography))
+		return result
+
+	def undistort_image(self, img):
+		"""Return an undistorted copy of a color image from the source."""
+		map1, map2 = self.remap_tables()
+		return cv2.remap(img, map1, map2, cv2.INTER_LINEAR)
+
+	def _detect_in(self, img, rect=None):
+		"""Detect tags in one rectangle (x0, y0, x1, y1) of a color image, or in
+		the whole image. Corners are in undistorted pixel coordinates in "remap"
+		mode and raw pixel coordinates in "points" mode.
+		"""
+		height, width = img.shape[:2]
+		x0, y0, x1, y1 = rect or (0, 0, width, height)
+
+		if self.undistort == "remap":
+			# Modify the image to undo warping. Remapping a slice of the tables
+			# undistorts just that part of the image.
+			with self.metrics.span("undistort"):
+				map1, map2 = self.remap_tables()
+				img = cv2.remap(img, map1[y0:y1, x0:x1], map2[y0:y1, x0:x1], cv2.INTER_LINEAR)
+		else:
+			img = img[y0:y1, x0:x1]
+
+		# Make grayscale version for detection.
+		gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+		if self.decimate > 1:
+			detections = self._detect_decimated(gray)
+		else:
+			with self.metrics.span("detect"):
+				detections = self.detector.detect(gray)
+
+		if x0 or y0:
+			shift = np.array([[1, 0, x0], [0, 1, y0], [0, 0, 1]], np.float64)
+			detections = [tag._replace(corners=tag.corners + (x0, y0), center=tag.center + (x0, y0),
+									homography=shift @ tag.homography) for tag in detections]
+		return detections
+
+	def _detect_decimated(self, gray):
+		"""Find tag candidates on a decimated copy of a grayscale image, then
+		refine their corners with sub-pixel accuracy on the full resolution
+		image and rebuild the homographies from the refined corners.
+		"""
+		height, width = gray.shape
+		small = cv2.resize(gray, (max(int(round(width / self.decimate)), 1),
+								max(int(round(height / self.decimate)), 1)),
+						interpolation=cv2.INTER_AREA)
+		with self.metrics.span("detect"):
+			candidates = self.detector.detect(small)
+		if not candidates:
+			return candidates
+
+		with self.metrics.span("refine"):
+			# Scale the corners of all tags back up and refine them in one call.
+			scale = np.array([width / small.shape[1], height / small.shape[0]], np.float32)
+			corners = np.concatenate([tag.corners for tag in candidates]).astype(np.float32)
+			corners = (corners + 0.5) * scale - 0.5
+			win = max(2, int(np.ceil(self.decimate)) + 1)
+			corners = cv2.cornerSubPix(gray, corners.reshape(-1, 1, 2), (win, win), (-1, -1),
+									SUBPIX_CRITERIA).reshape(-1, 4, 2)
+
+			detections = []
+			for tag, quad in zip(candidates, corners):
+				homography = cv2.getPerspectiveTransform(TAG_CORNERS, quad)
+				center = homography[:2, 2] / homography[2, 2]
+				detections.append(tag._replace(corners=quad.astype(np.float64), center=center,
+											homography=homography))
+		return detections
+
+	def _search_windows(self, width, height):
+		"""Padded rectangles around the tags found in the previous frame, with
+		overlapping rectangles merged so no tag is detected twice.
+		"""
+		rects = []
+		for corners in self._last_corners:
+			(x0, y0), (x1, y1) = corners.min(axis=0), corners.max(axis=0)
+			pad = self.padding * max(x1 - x0, y1 - y0) + 4
+			rects.append([max(int(x0 - pad), 0), max(int(y0 - pad), 0),
+						min(int(x1 + pad) + 1, width), min(int(y1 + pad) + 1, height)])
+		return merge_rects(rects)
+
+	def detect(self, frame=None):
+		"""Take a picture and detect every AprilTag in it.
+
+		In incremental mode only windows around the tags of the previous frame
+		are searched. The whole frame is scanned every full_scan_every frames
+		and whenever a tag goes missing from the windows.
+
+		With a motion gate, the last detections are returned as they are when
+		the image didn't change, and when part of it changed only the tags in
+		the changed regions are detected again.
+
+		Args:
+			frame (Frame): Picture to use instead of reading one from the source
+
+		Returns:
+			List: Detections with corners in undistorted pixel coordinates
+		"""
+		if frame is None:
+			with self.metrics.span("capture"):
+				frame = self.source.read()
+		self._calibrate(frame.intrinsics)
+		img = frame.color
+		height, width = img.shape[:2]
+
+		detections = None
+		regions = None
+		if self.motion_gate is not None:
+			with self.metrics.span("motion"):
+				regions = self.motion_gate.update(img)
+			if regions is None and self._last_result is not None:
+				self.metrics.incr("motion_skips")
+				return self._last_result
+			if regions == [[0, 0, width, height]]:
+				regions = None
+
+		if regions:
+			detections = [tag for tag in self._last_raw if not any(
+				rects_overlap(tag_rect(tag), rect) for rect in regions)]
+			for rect in regions:
+				detections.extend(self._detect_in(img, rect))
+		elif self.incremental and self._last_corners and self._since_scan < self.full_scan_every:
+			detections = []
+			for rect in self._search_windows(width, height):
+				detections.extend(self._detect_in(img, rect))
+			if len(detections) < len(self._last_corners):
+				self.metrics.incr("incremental_misses")
+				detections = None
+
+		if detections is None:
+			detections = self._detect_in(img)
+			self._since_scan = 0
+		else:
+			self._since_scan += 1
+		self._last_corners = [tag.corners for tag in detections]
+		self._last_raw = detections
+
+		if self.undistort == "points":
+			with self.metrics.span("undistort"):
+				detections = self._undistort_detections(detections)
+		self._last_result = detections
+		return detections
+
+	def _raw_corners(self, corners):
+		"""Move undistorted corners back into the pixels of the camera image,
+		which is where the aligned depth image has them.
+		"""
+		if not np.any(self.dist_coeffs):
+			return corners
+		rays = np.ones((len(corners), 1, 3))
+		rays[:, 0, 0] = (corners[:, 0] - self.intr.ppx) / self.intr.fx
+		rays[:, 0, 1] = (corners[:, 1] - self.intr.ppy) / self.intr.fy
+		raw, _ = cv2.projectPoints(rays, np.zeros(3), np.zeros(3), self.camera_matrix, self.dist_coeffs)
+		return raw.reshape(-1, 2)
+
+	def _fuse_depth(self, detections, translations, frame):
+		"""Scale the tag_size=1 translations of detections to meters. The depth
+		of every tag is the median depth under its quad, and all tags are
+		measured in one pass over a label image of their quads.
+		"""
+		if frame.depth is None:
+			raise DetectionError("Depth fusion needs a source with depth aligned to color.")
+		if not detections:
+			return []
+
+		quads = self._raw_corners(np.concatenate([tag.corners for tag in detections]))
+		height, width = frame.depth.shape[:2]
+		x0, y0 = np.clip(np.floor(quads.min(axis=0)).astype(int), 0, (width, height))
+		x1, y1 = np.clip(np.ceil(quads.max(axis=0)).astype(int) + 1, 0, (width, height))
+
+		# Only label the part of the image the tags cover.
+		labels = np.zeros((y1 - y0, x1 - x0), np.int32)
+		for i, quad in enumerate(quads.reshape(-1, 4, 2)):
+			cv2.fillConvexPoly(labels, np.round(quad - (x0, y0)).astype(np.int32), i + 1)
+		stats = label_depth_stats(frame.depth[y0:y1, x0:x1], labels, len(detections),
+								frame.depth_scale)
+
+		# The pose gets the direction to the tag right but not its distance, so
+		# stretch the translation until its z matches the measured depth.
+		fused = []
+		for tvec, z in zip(translations, stats.median):
+			if tvec is None:
+				fused.append(None)
+			elif np.isnan(z) or tvec[2] <= 0:
+				self.metrics.incr("depth_misses")
+				fused.append(None)
+			else:
+				fused.append(tvec * (z / tvec[2]))
+		return fused
+
+	def _tag_positions(self, detections, frame):
+		"""Return the translation of every detection, in meters with
+		fuse_depth and in tag sizes otherwise. None for tags without depth or
+		with a pose error above max_pose_error.
+		"""
+		# Solve the 3D poses of all tags together, each starting from its pose
+		# in the previous frame when it was seen there.
+		with self.metrics.span("pose"):
+			poses = self.pose_solver.solve([april_tag.tag_id for april_tag in detections],
+										[april_tag.corners for april_tag in detections])
+		self.pose_errors = poses.errors
+		translations = list(poses.translations)
+		if self.max_pose_error is not None:
+			for i, error in enumerate(poses.errors):
+				if error > self.max_pose_error:
+					self.metrics.incr("pose_rejections")
+					translations[i] = None
+
+		if self.fuse_depth:
+			with self.metrics.span("depth"):
+				translations = self._fuse_depth(detections, translations, frame)
+		return translations
+
+	def get_pos_of_dividers(self, reverse=False, frame=None):
+		"""Return the x of both AprilTags with IDs of 0 in sorted order (or in reverse
+		sorted order depending on the camera's orientation).
+
+		Args:
+			reverse (boolean): Whether to output the boundaries in reverse
+			frame (Frame): Picture to use instead of reading one from the source
+
+		Returns:
+			Tuple: A tuple which stores the x of both dividers in sorted order
+		"""
+		if frame is None:
+			with self.metrics.span("capture"):
+				frame = self.source.read()
+		detections = self.detect(frame)
+
+		dividers = [april_tag for april_tag in detections if april_tag.tag_id == 0]
+		found_tags = [tvec for tvec in self._tag_positions(dividers, frame) if tvec is not None]
+
+		if len(found_tags) != 2:
+			self.metrics.incr("divider_failures")
+		if len(found_tags) < 2:
+			raise ValueError("Two AprilTag dividers not found.")
+		elif len(found_tags) > 2:
+			raise ValueError("Too many AprilTag dividers found.")
+		else:
+			if reverse:
+				return (max(found_tags[0][0], found_tags[1][0]),
+						min(found_tags[0][0], found_tags[1][0])
+					)
+			else:
+				return (min(found_tags[0][0], found_tags[1][0]),
+						max(found_tags[0][0], found_tags[1][0])
+					)
+
+	def get_ring_locations(self, n, headless=True, frame=None):
+		"""Take a picture and locate the average location of each tag, keeping
+		a place for the rings that weren't seen.
+
+		Args:
+			n (int): Quantity of all tower of hanoi blocks
+			headless (boolean): Hide debug image if true
+			frame (Frame): Picture to use instead of reading one from the source
+
+		Returns:
+			List: Average (x, y, z) of IDs 1 to n, None for each ID not found
+		"""
+		if frame is None:
+			with self.metrics.span("capture"):
+				frame = self.source.read()
+		detections = self.detect(frame)
+
+		# Corners are undistorted, so draw on an undistorted copy of the image.
+		if not headless:
+			img = self.undistort_image(frame.color)
+
+		# Stores all coordinates of each id.
+		coords = [[] for _ in range(n)]
+
+		rings = [april_tag for april_tag in detections if april_tag.tag_id <= n and april_tag.tag_id > 0]
+		for april_tag, tvec in zip(rings, self._tag_positions(rings, frame)):
+			# Draw bounding box, center, and id on top of each tag.
+			if not headless: draw_details(april_tag, img)
+
+			# Store translation vector in coordinates array at its id's list.
+			if tvec is not None:
+				coords[april_tag.tag_id - 1].append(tvec)
+
+		# Count the frames in which some ring wasn't seen.
+		if not all(coords):
+			self.metrics.incr("detection_failures")
+
+		# Show image with bounding boxes.
+		if not headless:
+			cv2.imshow("Out", img)
+			cv2.waitKey(1)
+
+		return [get_average_pos(coord) if coord else None for coord in coords]
+
+	def get_tower_locations(self, n, frame=None):
+		"""Locate the dividers and every ring in the same picture, detecting
+		the tags only once.
+
+		Args:
+			n (int): Quantity of all tower of hanoi blocks
+			frame (Frame): Picture to use instead of reading one from the source
+
+		Returns:
+			Tuple: Sorted x of the dividers found, and the average (x, y, z) of
+				IDs 1 to n with None for each ID not found
+		"""
+		if frame is None:
+			with self.metrics.span("capture"):
+				frame = self.source.read()
+		detections = self.detect(frame)
+
+		tags = [april_tag for april_tag in detections if april_tag.tag_id <= n and april_tag.tag_id >= 0]
+		dividers = []
+		coords = [[] for _ in range(n)]
+		for april_tag, tvec in zip(tags, self._tag_positions(tags, frame)):
+			if tvec is None:
+				continue
+			if april_tag.tag_id == 0:
+				dividers.append(tvec)
+			else:
+				coords[april_tag.tag_id - 1].append(tvec)
+		self.divider_positions = sorted(dividers, key=lambda tvec: tvec[0])
+		return ([tvec[0] for tvec in self.divider_positions],
+				[get_average_pos(coord) if coord else None for coord in coords])
+
+	def get_average_location_of_id(self, n, headless=True, frame=None):
+		"""Take a picture and locate average location of each tag. So get the
+		average location of all tags with ID 1 and all tags with ID 2 and so on.
+
+		Args:
+			n (int): Quantity of all tower of hanoi blocks
+			headless (boolean): Hide debug image if true
+			frame (Frame): Picture to use instead of reading one from the source
+
+		Returns:
+			List: List of tuples which store average (x, y, z) in the order of ID
+		"""
+		return [loc for loc in self.get_ring_locations(n, headless, frame) if loc is not None]
+
+
+def get_pos_of_dividers(source, reverse=False):
+	"""Return the x of both AprilTags with IDs of 0 in sorted order (or in reverse
+	sorted order depending on the camera's orientation). Builds a throwaway
+	AprilTagTracker, so keep a tracker around when calling this repeatedly.
+
+	Args:
+		source (FrameSource): Source to take the picture from
+		reverse (boolean): Whether to output the boundaries in reverse
+
+	Returns:
+		Tuple: A tuple which stores the x of both dividers in sorted order
+	"""
+	return AprilTagTracker(source).get_pos_of_dividers(reverse)
+
+
+def get_average_location_of_id(source, n, headless=True):
+	"""Take a picture and locate average location of each tag. Builds a
+	throwaway AprilTagTracker, so keep a tracker around when calling this
+	repeatedly.
+
+	Args:
+		source (FrameSource): Source to take the picture from
+		n (int): Quantity of all tower of hanoi blocks
+		headless (boolean): Hide debug image if true
+
+	Returns:
+		List: List of tuples which store average (x, y, z) in the order of ID
+	"""
+	return AprilTagTracker(source).get_average_location_of_id(n, headless)
+
+def get_rod(x, left_boundary, right_boundary):
+	"""Return the index (0, 1 or 2) of the rod a ring at x is on.
+
+	Args:
+		x (double): x value of the ring
+		left_boundary (double): x value which separates rod 1 and rod 2
+		right_boundary (double): x value which separates rod 3 and rod 2
+
+	Returns:
+		int: Index of the rod
+	"""
+	if x < left_boundary:
+		return 0
+	elif x > right_boundary:
+		return 2
+	return 1
+
+def get_hanoi_tower(arr, left_boundary, right_boundary):
+	"""From the tag locations, determine which rod the rings a part of and in
+	what order they're in to generate a tower of hanoi frame.
+
+	Args:
+		arr (List): List of each hanoi block location in 3d space in order of ID
+		left_boundary (double): x value which separates rod 1 and rod 2
+		right_boundary (double): x value which separates rod 3 and rod 2
+
+	Returns:
+		List: Rods and the rings on them in their corresponding order
+	"""
+	rods = [[], [], []]
+
+	# Split locations into their rods based on their x value relative to the boundaries.
+	for i, coord in enumerate(arr):
+		rods[get_rod(coord[0], left_boundary, right_boundary)].append((i + 1, coord[1]))
+	rod_1, rod_2, rod_3 = rods
+
+	# Sort based on y value.
+	rod_1 = sorted(rod_1, key=lambda item: item[1], reverse=True)
+	rod_2 = sorted(rod_2, key=lambda item: item[1], reverse=True)
+	rod_3 = sorted(rod_3, key=lambda item: item[1], reverse=True)
+
+	return [
+		[item[0] for item in rod_1],
+		[item[0] for item in rod_2],
+		[item[0] for item in rod_3]
+	]
+
+
+def main():
+	"""Print the state of the hanoi tower every frame."""
+	# Set up args.
+	parser = argparse.ArgumentParser(description="Track AprilTags on a hanoi tower to \
+												return its digital state.")
+	parser.add_argument("--debug", action="store_true", help="enable debug mode")
+	parser.add_argument("n", type=int, help="amount of rings")
+	parser.add_argument("-d", "--delay", default=0, type=int, help="delay in \
+														milliseconds between message")
+	parser.add_argument("--undistort", default="remap", choices=["remap", "points"],
+						help="undistort the whole image or only the detected corners")
+	parser.add_argument("--incremental", action="store_true", help="only search around \
+						the tags of the last frame")
+	parser.add_argument("--full-scan-every", default=30, type=int, help="frames between \
+						full frame scans with --incremental")
+	parser.add_argument("--decimate", default=1, type=float, help="detect on an image \
+						this many times smaller and refine corners at full resolution")
+	parser.add_argument("--depth", action="store_true", help="measure tag positions \
+						in meters with the aligned depth stream")
+	parser.add_argument("--max-pose-error", type=float, help="ignore tags whose pose \
+						reprojects their corners worse than this many pixels")
+	add_source_arguments(parser)
+	add_metrics_arguments(parser)
+	add_calibration_arguments(parser)
+	add_motion_arguments(parser)
+	args = parser.parse_args()
+	metrics = metrics_from_args(args)
+
+	# Set up Intel Realsense camera (or whichever source was chosen).
+	source = source_from_args(args, 1280, 720, depth=args.depth, align=args.depth)
+	tracker = AprilTagTracker(source, args.undistort, metrics, args.incremental,
+							args.full_scan_every, decimate=args.decimate, fuse_depth=args.depth,
+							max_pose_error=args.max_pose_error,
+							motion_gate=motion_gate_from_args(args))
+	store = calibration_from_args(args)
+
+	# Get both x values of tags seperating the rods, from the cache if this
+	# camera was calibrated before.
+	calibration = None
+	try:
+		(left_boundary, right_boundary), calibration = load_or_calibrate(tracker, store)
+	except Exception as e:
+		if args.debug:
+			left_boundary, right_boundary = 0, 0
+			print("Error: ", e)
+			print("Continuing with boundaries set to 0...")
+			time.sleep(3)
+		else:
+			raise DetectionError(e)
+
+	# Keep checking the dividers in the background with a tracker of its own.
+	verifier = None
+	if left_boundary != right_boundary:
+		verifier = verifier_from_args(args, AprilTagTracker(source, args.undistort,
+									fuse_depth=args.depth, max_pose_error=args.max_pose_error),
+									(left_boundary, right_boundary), store, calibration,
+									metrics=metrics)
+
+	# Prints the state of the hanoi tower
+	while True:
+		try:
+			with metrics.span("capture"):
+				frame = source.read()
+			if frame is None:
+				break
+			if verifier is not None:
+				verifier.offer(frame)
+				moved = verifier.poll()
+				if moved is not None:
+					left_boundary, right_boundary = moved
+			state = get_hanoi_tower(
+				tracker.get_average_location_of_id(args.n, not args.debug, frame),
+				left_boundary,
+				right_boundary
+			)
+			with metrics.span("render"):
+				print(state)
+			metrics.set("dropped_frames", source.dropped)
+			metrics.end_frame()
+			time.sleep(args.delay / 1000.0)
+		except KeyboardInterrupt:
+			print("\nCtrl+C detected. Exiting...")
+			break
+	
+	if verifier is not None:
+		verifier.stop()
+	source.stop()
+	metrics.close()
+	cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import cv2
+
+from .frame_source import open_source
+from .hanoi_states import hanoi_states
+
+
+"""
+Offline batch processing of recorded sessions. The recording is split into
+ranges of frames that a pool of worker processes runs the Hanoi tracker and
+the color blob detection on. Every worker opens the recording and builds its
+detectors once. Each finished range is saved as a part file, so an interrupted
+run picks up where it stopped, and at the end the parts are merged in order
+into one timeline file of column arrays (a numpy .npz).
+
+Timeline columns:
+    position, index, timestamp: Position in the recording, frame number and
+        capture time of every frame
+    rings: frames x rings x 3 ring positions, NaN for rings not seen
+    dividers: frames x 2 divider x values, NaN unless both were seen
+    boundaries, states: Median divider x values and the hanoi_states of
+        every frame computed with them
+    blob_position, blob_label, blob_box, blob_area, blob_center: One row per
+        color blob (label is the index in COLORS plus one)
+"""
+
+
+TASKS = ("hanoi", "blobs")
+MANIFEST_FILE = "batch.json"
+
+# State of a worker process, set up once by _init_worker.
+_worker = {}
+
+
+def _init_worker(path, tasks, rings):
+    # The pool already runs one process per core.
+    cv2.setNumThreads(1)
+    source = open_source(path, realtime=False)
+    _worker.update(source=source, tasks=tasks, rings=rings)
+    if "hanoi" in tasks:
+        from .apriltag_detect import AprilTagTracker
+        _worker["tracker"] = AprilTagTracker(source)
+    if "blobs" in tasks:
+        from .segmentation import ColorSegmenter
+        _worker["segmenter"] = ColorSegmenter()
+
+
+def process_range(start, stop):
+    """Process frames start to stop - 1 of the worker's recording.
+
+    Returns:
+        Dict: Column name -> array for those frames
+    """
+    source, tasks, rings = _worker["source"], _worker["tasks"], _worker["rings"]
+    source.seek(start)
+
+    columns = {"position": [], "index": [], "timestamp": []}
+    if "hanoi" in tasks:
+        columns.update(rings=[], dividers=[])
+    if "blobs" in tasks:
+        columns.update(blob_position=[], blob_label=[], blob_box=[], blob_area=[], blob_center=[])
+
+    for position in range(start, stop):
+        frame = source.read()
+        if frame is None:
+            break
+        columns["position"].append(position)
+        columns["index"].append(frame.index)
+        columns["timestamp"].append(frame.timestamp)
+
+        if "hanoi" in tasks:
+            dividers, locations = _worker["tracker"].get_tower_locations(rings, frame=frame)
+            columns["dividers"].append(dividers if len(dividers) == 2 else (np.nan, np.nan))
+            columns["rings"].append([(np.nan,) * 3 if loc is None else loc for loc in locations])
+
+        if "blobs" in tasks:
+            for blob in _worker["segmenter"].detect(frame.color):
+                columns["blob_position"].append(position)
+                columns["blob_label"].append(blob.label)
+                columns["blob_box"].append((blob.x, blob.y, blob.w, blob.h))
+                columns["blob_area"].append(blob.area)
+                columns["blob_center"].append((blob.cx, blob.cy))
+
+    dtypes = {"position": np.int64, "index": np.int64, "timestamp": np.float64,
+              "rings": np.float32, "dividers": np.float32, "blob_position": np.int64,
+              "blob_label": np.int16, "blob_box": np.int32, "blob_area": np.int32,
+              "blob_center": np.float32}
+    shapes = {"rings": (-1, rings, 3), "dividers": (-1, 2), "blob_box": (-1, 4),
+              "blob_center": (-1, 2)}
+    return {name: np.asarray(values, dtypes[name]).reshape(shapes.get(name, (-1,)))
+            for name, values in columns.items()}
+
+
+def _save(path, columns):
+    """Write an .npz file atomically, so a killed run never leaves half a file."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **columns)
+    os.replace(tmp, path)
+
+
+def merge_parts(paths):
+    """Concatenate the columns of part files, in the order of paths."""
+    merged = {}
+    for path in paths:
+        with np.load(path) as part:
+            for name in part.files:
+                merged.setdefault(name, []).append(part[name])
+    return {name: np.concatenate(arrays) for name, arrays in merged.items()}
+
+
+class BatchProcessor:
+    """Run the offline tasks over a whole recording on a process pool.
+
+    Args:
+        path (str): Recording (chunked or PNG session) to process
+        output (str): Timeline file to write (.npz)
+        tasks (List): Any of TASKS
+        rings (int): Amount of rings for the hanoi task
+        range_size (int): Frames per work item and part file
+        workers (int): Worker processes, defaults to the number of cores
+        report_every (float): Seconds between progress lines
+    """
+
+    def __init__(self, path, output, tasks=TASKS, rings=5, range_size=300, workers=None,
+                 report_every=5.0):
+        unknown = set(tasks) - set(TASKS)
+        if unknown:
+            raise ValueError("Unknown tasks: " + ", ".join(sorted(unknown)))
+        self.path = path
+        self.output = output
+        self.tasks = list(tasks)
+        self.rings = rings
+        self.range_size = range_size
+        self.workers = workers or os.cpu_count() or 1
+        self.report_every = report_every
+        self.parts_dir = output + ".parts"
+
+    def _part_path(self, start):
+        return os.path.join(self.parts_dir, "part_%09d.npz" % start)
+
+    def _prepare_parts(self, frames):
+        """Create the part directory, or check that the one left by an
+        interrupted run was made with the same settings.
+        """
+        manifest = {"path": os.path.abspath(self.path), "frames": frames, "tasks": self.tasks,
+                    "rings": self.rings, "range_size": self.range_size}
+        manifest_path = os.path.join(self.parts_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                previous = json.load(f)
+            if previous != manifest:
+                raise ValueError("%s was made with other settings, delete it to start over."
+                                 % self.parts_dir)
+        else:
+            os.makedirs(self.parts_dir, exist_ok=True)
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f)
+
+    def _report(self, done, frames, started, resumed):
+        elapsed = time.monotonic() - started
+        rate = (done - resumed) / elapsed if elapsed > 0 else 0.0
+        eta = (frames - done) / rate if rate > 0 else float("nan")
+        print("%d/%d frames (%.1f%%), %.1f fps, %.0f s left"
+              % (done, frames, 100.0 * done / max(frames, 1), rate, eta), flush=True)
+
+    def run(self):
+        """Process every range that has no part file yet, then merge.
+
+        Returns:
+            Dict: The merged timeline columns
+        """
+        source = open_source(self.path, realtime=False)
+        frames = len(source)
+        source.stop()
+        if not frames:
+            raise ValueError("Recording %s has no frames." % self.path)
+
+        self._prepare_parts(frames)
+        starts = list(range(0, frames, self.range_size))
+        todo = [start for start in starts if not os.path.exists(self._part_path(start))]
+        done = sum(min(self.range_size, frames - start) for start in starts if start not in todo)
+        if done:
+            print("Resuming with %d of %d frames already processed" % (done, frames))
+
+        started = last_report = time.monotonic()
+        resumed = done
+        if todo:
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                     initargs=(self.path, self.tasks, self.rings)) as pool:
+                futures = {pool.submit(process_range, start, min(start + self.range_size, frames)):
+                           start for start in todo}
+                for future in as_completed(futures):
+                    columns = future.result()
+                    _save(self._part_path(futures[future]), columns)
+                    done += len(columns["position"])
+                    if time.monotonic() - last_report >= self.report_every:
+                        last_report = time.monotonic()
+                        self._report(done, frames, started, resumed)
+        self._report(done, frames, started, resumed)
+
+        timeline = merge_parts([self._part_path(start) for start in starts])
+        if "rings" in timeline:
+            boundaries = np.nanmedian(timeline["dividers"], axis=0) if len(timeline["dividers"]) else None
+            if boundaries is not None and not np.isnan(boundaries).any():
+                timeline["boundaries"] = boundaries
+                timeline["states"] = hanoi_states(timeline["rings"], boundaries)
+        _save(self.output, timeline)
+        shutil.rmtree(self.parts_dir)
+        return timeline
+
+
+def main():
+    """Process a recorded session into a timeline file."""
+    parser = argparse.ArgumentParser(description="Run the hanoi tracker and color blob \
+                                     detection over a recorded session.")
+    parser.add_argument("recording", help="chunked recording or session directory")
+    parser.add_argument("output", help="timeline file to write (.npz)")
+    parser.add_argument("--tasks", default=",".join(TASKS), help="comma separated tasks \
+                        (default: %s)" % ",".join(TASKS))
+    parser.add_argument("-n", "--rings", default=5, type=int, help="amount of rings")
+    parser.add_argument("--range-size", default=300, type=int, help="frames per work item")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--report-every", default=5.0, type=float, help="seconds between \
+                        progress lines")
+    args = parser.parse_args()
+
+    processor = BatchProcessor(args.recording, args.output, args.tasks.split(","), args.rings,
+                               args.range_size, args.workers, args.report_every)
+    timeline = processor.run()
+    print("Wrote %d frames to %s" % (len(timeline["position"]), args.output))
+
+
+if __name__ == "__main__":
+    main()
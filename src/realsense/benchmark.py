@@ -0,0 +1,594 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tracemalloc
+
+import numpy as np
+import cv2
+
+from .buffers import BufferArena
+from .deproject import Deprojector
+from .depth_stats import box_depth_stats
+from .frame_source import Frame, Intrinsics, open_source
+from .motion import MotionGate
+from .segmentation import COLORS, ColorSegmenter
+
+
+"""
+Per stage benchmarks. Each stage of the scripts (color masking, AprilTag
+detection, CSRT tracking, depth sampling) runs on deterministic synthetic
+frames at 640x480 and 1280x720, and optionally on recorded frames. Results can
+be saved as a baseline and later runs compared against it.
+
+    python -m realsense.benchmark --save-baseline baseline.json
+    python -m realsense.benchmark --baseline baseline.json --tolerance 0.2
+"""
+
+
+RESOLUTIONS = [(640, 480), (1280, 720)]
+
+# Number of distinct frames generated per resolution.
+SEQUENCE_LENGTH = 30
+
+# Number of rings rendered in synthetic frames.
+RINGS = 5
+
+# Modules of the command line tools, timed by --cold-start. batch is also what
+# every batch worker process imports.
+CLI_MODULES = ("apriltag_detect", "hanoi_service", "batch", "both", "cam", "camVision",
+               "depth", "objects", "frame_source", "benchmark")
+
+
+class SkipStage(Exception):
+    """Raised by a stage setup when the stage can't run here"""
+    pass
+
+
+def synthetic_intrinsics(width, height):
+    """Pinhole intrinsics without distortion for synthetic frames."""
+    return Intrinsics(width, height, 0.9 * width, 0.9 * width, width / 2.0, height / 2.0,
+                      "none", (0.0, 0.0, 0.0, 0.0, 0.0))
+
+
+def render_tag(tag_id, size):
+    """Render a tag36h11 AprilTag with a white quiet zone.
+
+    Args:
+        tag_id (int): Tag id
+        size (int): Side of the returned image in pixels
+
+    Returns:
+        ndarray: Grayscale tag image
+    """
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_APRILTAG_36h11)
+    # 8 cells of tag (6 data + black border) inside a one cell white margin.
+    inner = size * 8 // 10
+    if hasattr(cv2.aruco, "generateImageMarker"):
+        tag = cv2.aruco.generateImageMarker(dictionary, tag_id, inner)
+    else:
+        tag = cv2.aruco.drawMarker(dictionary, tag_id, inner)
+    margin = (size - inner) // 2
+    return cv2.copyMakeBorder(tag, margin, size - inner - margin, margin, size - inner - margin,
+                              cv2.BORDER_CONSTANT, value=255)
+
+
+def _color_bgr(color):
+    """A BGR color in the middle of a ColorRange."""
+    hsv = [min((lo + hi) // 2, 179) for lo, hi in zip(color.lower, color.upper)]
+    hsv[1], hsv[2] = max(hsv[1], 200), max(hsv[2], 200)
+    return tuple(int(v) for v in cv2.cvtColor(np.uint8([[hsv]]), cv2.COLOR_HSV2BGR)[0, 0])
+
+
+def tag_layout(width, height, rings=RINGS):
+    """Where synthetic frames place their tags: two dividers (ID 0) and the
+    rings stacked on the first rod.
+
+    Returns:
+        List: (tag_id, x, y, size) tuples
+    """
+    size = height // 8
+    layout = [(0, width // 3 - size // 2, height // 4, size),
+              (0, 2 * width // 3 - size // 2, height // 4, size)]
+    for ring in range(1, rings + 1):
+        layout.append((ring, width // 6 - size // 2, height - ring * (size + 4) - 10, size))
+    return layout
+
+
+def synthetic_frames(width, height, count=SEQUENCE_LENGTH, seed=0):
+    """Render a deterministic sequence of color+depth frames with tag36h11
+    tags, one blob of every configured color and a blob moving on a circle
+    (for the trackers).
+
+    Returns:
+        List: Frame list
+    """
+    rng = np.random.default_rng(seed)
+    intrinsics = synthetic_intrinsics(width, height)
+
+    # Gray noise so that the background never matches a color range.
+    noise = rng.integers(90, 140, (height, width), dtype=np.uint8)
+    background = cv2.cvtColor(noise, cv2.COLOR_GRAY2BGR)
+    for tag_id, x, y, size in tag_layout(width, height):
+        tag = render_tag(tag_id, size)
+        background[y:y + size, x:x + size] = tag[:, :, None]
+
+    blob = max(height // 12, 8)
+    for i, color in enumerate(COLORS):
+        x = width // 2 + (i - len(COLORS) // 2) * blob * 2
+        cv2.rectangle(background, (x, blob), (x + blob, 2 * blob), _color_bgr(color), -1)
+
+    yy, xx = np.mgrid[0:height, 0:width]
+    depth_background = (800 + xx // 4 + yy // 4).astype(np.uint16)
+
+    frames = []
+    for i in range(count):
+        color = background.copy()
+        angle = 2 * np.pi * i / count
+        cx = int(width * 0.7 + width / 10 * np.cos(angle))
+        cy = int(height * 0.65 + height / 10 * np.sin(angle))
+        cv2.circle(color, (cx, cy), blob, (40, 200, 40), -1)
+        cv2.circle(color, (cx, cy), blob // 2, (20, 20, 20), -1)
+
+        depth = depth_background.copy()
+        cv2.circle(depth, (cx, cy), blob, 600, -1)
+        # Knock out about 5% of the depth pixels like real sensor holes.
+        depth[rng.random((height, width)) < 0.05] = 0
+        frames.append(Frame(color, depth, intrinsics, intrinsics, 0.001, i / 30.0, i))
+    return frames
+
+
+def moving_box(frames):
+    """Initial box of the moving blob in synthetic_frames."""
+    height, width = frames[0].color.shape[:2]
+    blob = max(height // 12, 8)
+    cx, cy = int(width * 0.7 + width / 10), int(height * 0.65)
+    return (cx - blob, cy - blob, 2 * blob, 2 * blob)
+
+
+def legacy_color_blobs(image):
+    """The original per color inRange/dilate/findContours loop of camVision.py,
+    kept as a reference for the color stages.
+    """
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    kernel = np.ones((5, 5), "uint8")
+    boxes = []
+    for color in COLORS:
+        mask = cv2.inRange(hsv, np.array(color.lower, np.uint8), np.array(color.upper, np.uint8))
+        mask = cv2.dilate(mask, kernel)
+        contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in contours:
+            if cv2.contourArea(contour) > 300:
+                boxes.append(cv2.boundingRect(contour))
+    return boxes
+
+
+def stage_color_legacy(frames):
+    return lambda i: legacy_color_blobs(frames[i % len(frames)].color)
+
+
+def stage_color_lut(frames):
+    segmenter = ColorSegmenter()
+    return lambda i: segmenter.detect(frames[i % len(frames)].color)
+
+
+def stage_color_idle(frames):
+    # camVision.py with --motion-gate on a scene that doesn't move.
+    segmenter = ColorSegmenter()
+    gate = MotionGate()
+    frame = frames[0].color
+    blobs = segmenter.detect(frame)
+    gate.update(frame)
+
+    def run(i):
+        regions = gate.update(frame)
+        return blobs if regions is None else segmenter.detect(frame)
+    return run
+
+
+def _apriltag_tracker(frames, **options):
+    try:
+        from .apriltag_detect import AprilTagTracker
+        return AprilTagTracker(None, **options)
+    except ImportError as e:
+        raise SkipStage(str(e))
+
+
+def stage_apriltag_detect(frames):
+    tracker = _apriltag_tracker(frames)
+    return lambda i: tracker.detect(frames[i % len(frames)])
+
+
+def stage_apriltag_incremental(frames):
+    tracker = _apriltag_tracker(frames, incremental=True)
+    return lambda i: tracker.detect(frames[i % len(frames)])
+
+
+def stage_apriltag_decimated(frames, factor):
+    tracker = _apriltag_tracker(frames, decimate=factor)
+    return lambda i: tracker.detect(frames[i % len(frames)])
+
+
+def stage_apriltag_idle(frames):
+    # apriltag_detect.py with --motion-gate on a scene that doesn't move.
+    tracker = _apriltag_tracker(frames, motion_gate=MotionGate())
+    return lambda i: tracker.detect(frames[0])
+
+
+def stage_apriltag_locate(frames):
+    tracker = _apriltag_tracker(frames)
+    return lambda i: tracker.get_average_location_of_id(RINGS, frame=frames[i % len(frames)])
+
+
+def stage_pose_loop(frames):
+    # The old approach: one detection_pose call per tag.
+    tracker = _apriltag_tracker(frames)
+    detections = tracker.detect(frames[0])
+    return lambda i: [tracker.detector.detection_pose(tag, tracker.camera_params, tag_size=1)
+                      for tag in detections]
+
+
+def stage_pose_batch(frames):
+    tracker = _apriltag_tracker(frames)
+    detections = tracker.detect(frames[0])
+    ids = [tag.tag_id for tag in detections]
+    corners = [tag.corners for tag in detections]
+    return lambda i: tracker.pose_solver.solve(ids, corners)
+
+
+def stage_csrt(frames):
+    tracker = cv2.legacy.TrackerCSRT_create()
+    tracker.init(frames[0].color, moving_box(frames))
+    return lambda i: tracker.update(frames[i % len(frames)].color)
+
+
+def _depth_boxes(frames, count=32):
+    height, width = frames[0].depth.shape
+    rng = np.random.default_rng(1)
+    xs = rng.integers(0, width - 40, count)
+    ys = rng.integers(0, height - 40, count)
+    return [(int(x), int(y), 40, 40) for x, y in zip(xs, ys)]
+
+
+def stage_depth_pixel(frames):
+    # The old approach: one get_distance per object.
+    boxes = _depth_boxes(frames)
+    centers = [(x + w // 2, y + h // 2) for x, y, w, h in boxes]
+
+    def run(i):
+        frame = frames[i % len(frames)]
+        return [frame.get_distance(x, y) for x, y in centers]
+    return run
+
+
+def stage_depth_roi(frames):
+    boxes = _depth_boxes(frames)
+    arena = BufferArena()
+
+    def run(i):
+        frame = frames[i % len(frames)]
+        return box_depth_stats(frame.depth, boxes, frame.depth_scale, arena=arena)
+    return run
+
+
+def stage_depth_points(frames):
+    # Full frame point cloud from the cached ray table.
+    deprojector = Deprojector()
+    arena = BufferArena()
+
+    def run(i):
+        frame = frames[i % len(frames)]
+        out = arena.get("points", frame.depth.shape + (3,), np.float32)
+        return deprojector.points(frame.depth, frame.depth_intrinsics, frame.depth_scale, out=out)
+    return run
+
+
+def stage_depth_colormap(frames):
+    # The depth view of depth.py, drawn into preallocated buffers.
+    arena = BufferArena()
+
+    def run(i):
+        depth = frames[i % len(frames)].depth
+        scaled = cv2.convertScaleAbs(depth, dst=arena.get("depth_8bit", depth.shape), alpha=0.03)
+        return cv2.applyColorMap(scaled, cv2.COLORMAP_JET,
+                                 dst=arena.get("depth_colormap", depth.shape + (3,)))
+    return run
+
+
+# Stage name -> setup(frames) returning run(i). Stages that need depth are
+# skipped on recordings without it.
+STAGES = {
+    "color_legacy": stage_color_legacy,
+    "color_lut": stage_color_lut,
+    "color_idle": stage_color_idle,
+    "apriltag_detect": stage_apriltag_detect,
+    "apriltag_incremental": stage_apriltag_incremental,
+    "apriltag_decimate2": lambda frames: stage_apriltag_decimated(frames, 2),
+    "apriltag_decimate4": lambda frames: stage_apriltag_decimated(frames, 4),
+    "apriltag_idle": stage_apriltag_idle,
+    "apriltag_locate": stage_apriltag_locate,
+    "pose_loop": stage_pose_loop,
+    "pose_batch": stage_pose_batch,
+    "csrt": stage_csrt,
+    "depth_pixel": stage_depth_pixel,
+    "depth_roi": stage_depth_roi,
+    "depth_points": stage_depth_points,
+    "depth_colormap": stage_depth_colormap,
+}
+
+DEPTH_STAGES = ("depth_pixel", "depth_roi", "depth_points", "depth_colormap")
+
+
+def peak_allocation(run, calls=5):
+    """Return the most memory, in bytes, allocated during one call of run.
+    tracemalloc sees numpy arrays, including the ones OpenCV returns.
+    """
+    peak = 0
+    tracemalloc.start()
+    try:
+        for i in range(calls):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            run(i)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def measure(run, iterations, warmup=3):
+    """Time iterations calls of run.
+
+    Returns:
+        Dict: n, throughput (calls per second), mean/p50/p95/p99 in ms and
+            alloc_kb, the peak allocation of a call in KB
+    """
+    for i in range(warmup):
+        run(i)
+
+    samples = np.empty(iterations)
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        run(i)
+        samples[i] = time.perf_counter() - t
+    total = time.perf_counter() - start
+
+    samples *= 1000.0
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    # Measured separately, tracemalloc slows every allocation down.
+    alloc_kb = peak_allocation(run) / 1024.0
+    return {"n": iterations, "throughput": iterations / total, "mean": float(samples.mean()),
+            "p50": float(p50), "p95": float(p95), "p99": float(p99), "alloc_kb": alloc_kb}
+
+
+def recorded_frames(path, count=SEQUENCE_LENGTH):
+    """Load up to count frames of a recorded session."""
+    source = open_source(path, realtime=False)
+    try:
+        frames = [frame for _, frame in zip(range(count), source)]
+    finally:
+        source.stop()
+    if not frames:
+        raise ValueError("Recording %s has no frames." % path)
+    if frames[0].intrinsics is None:
+        intrinsics = synthetic_intrinsics(frames[0].color.shape[1], frames[0].color.shape[0])
+        for frame in frames:
+            frame.intrinsics = intrinsics
+    for frame in frames:
+        if frame.depth is not None and frame.depth_intrinsics is None:
+            frame.depth_intrinsics = frame.intrinsics
+    return frames
+
+
+def run_benchmarks(stages, iterations, resolutions=RESOLUTIONS, recordings=()):
+    """Run every stage on every input.
+
+    Returns:
+        Dict: "<stage>@<input>" -> measurement
+    """
+    inputs = [("%dx%d" % (w, h), synthetic_frames(w, h)) for w, h in resolutions]
+    for path in recordings:
+        frames = recorded_frames(path)
+        height, width = frames[0].color.shape[:2]
+        inputs.append(("rec:%s:%dx%d" % (path, width, height), frames))
+
+    results = {}
+    for label, frames in inputs:
+        for name in stages:
+            if name in DEPTH_STAGES and frames[0].depth is None:
+                continue
+            try:
+                run = STAGES[name](frames)
+            except SkipStage as e:
+                print("skipping %s: %s" % (name, e), file=sys.stderr)
+                continue
+            results["%s@%s" % (name, label)] = measure(run, iterations)
+    return results
+
+
+def ground_truth_corners(width, height):
+    """Exact outer corners of every tag in synthetic_frames, in pixel center
+    coordinates.
+
+    Returns:
+        List: (tag_id, 4 x 2 corner array) tuples
+    """
+    truth = []
+    for tag_id, x, y, size in tag_layout(width, height):
+        inner = size * 8 // 10
+        margin = (size - inner) // 2
+        x0, y0 = x + margin - 0.5, y + margin - 0.5
+        x1, y1 = x0 + inner, y0 + inner
+        truth.append((tag_id, np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])))
+    return truth
+
+
+def corner_error(detections, truth):
+    """Compare detections against ground_truth_corners.
+
+    Returns:
+        Tuple: (mean corner error in pixels, fraction of tags found)
+    """
+    errors = []
+    for tag_id, quad in truth:
+        center = quad.mean(axis=0)
+        side = quad[1, 0] - quad[0, 0]
+        matches = [tag for tag in detections
+                   if tag.tag_id == tag_id and np.linalg.norm(tag.center - center) < side / 2]
+        if not matches:
+            continue
+        # Match every true corner with the closest detected one so the corner
+        # order of the detector doesn't matter.
+        distances = np.linalg.norm(quad[:, None, :] - matches[0].corners[None, :, :], axis=2)
+        errors.append(distances.min(axis=1).mean())
+    return (float(np.mean(errors)) if errors else float("nan")), len(errors) / len(truth)
+
+
+def decimation_tradeoff(factors, iterations, resolutions=RESOLUTIONS):
+    """Measure detection time and corner accuracy for every decimation factor.
+
+    Returns:
+        List: (input, factor, measurement, corner error, fraction found) tuples
+    """
+    rows = []
+    for width, height in resolutions:
+        frames = synthetic_frames(width, height)
+        truth = ground_truth_corners(width, height)
+        for factor in factors:
+            try:
+                tracker = _apriltag_tracker(frames, decimate=factor)
+            except SkipStage as e:
+                print("skipping apriltag_decimation: %s" % e, file=sys.stderr)
+                return rows
+            timing = measure(lambda i: tracker.detect(frames[i % len(frames)]), iterations)
+            error, found = corner_error(tracker.detect(frames[0]), truth)
+            rows.append(("%dx%d" % (width, height), factor, timing, error, found))
+    return rows
+
+
+def _time_process(command, runs):
+    """Median wall time in ms of running command in a fresh process."""
+    env = dict(os.environ)
+    # Find the package even when it isn't installed.
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (package_root, env.get("PYTHONPATH")) if p)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(samples))
+
+
+def cold_start(modules=CLI_MODULES, runs=5):
+    """Time how long a fresh interpreter takes to import each module, and to
+    start its command line tool and print --help.
+
+    Returns:
+        List: (name, import ms, --help ms) per module, starting with the bare
+            interpreter and the package itself
+    """
+    results = [("python", _time_process([sys.executable, "-c", "pass"], runs), None),
+               ("realsense", _time_process([sys.executable, "-c", "import realsense"], runs), None)]
+    for module in modules:
+        name = "realsense." + module
+        results.append((module, _time_process([sys.executable, "-c", "import " + name], runs),
+                        _time_process([sys.executable, "-m", name, "--help"], runs)))
+    return results
+
+
+def format_results(results):
+    lines = ["%-40s %10s %9s %9s %9s %10s" % ("stage@input", "per sec", "p50 ms", "p95 ms",
+                                            "p99 ms", "alloc KB")]
+    for key, r in results.items():
+        lines.append("%-40s %10.1f %9.3f %9.3f %9.3f %10.1f" % (
+            key, r["throughput"], r["p50"], r["p95"], r["p99"], r["alloc_kb"]))
+    return "\n".join(lines)
+
+
+def compare(results, baseline, tolerance):
+    """Compare results against a baseline.
+
+    Args:
+        results (Dict): Output of run_benchmarks
+        baseline (Dict): Earlier output of run_benchmarks
+        tolerance (float): Allowed slowdown of the median, e.g. 0.2 for 20%
+
+    Returns:
+        List: Human readable description of every regression
+    """
+    regressions = []
+    for key, r in results.items():
+        if key not in baseline:
+            continue
+        before, after = baseline[key]["p50"], r["p50"]
+        if after > before * (1 + tolerance):
+            regressions.append("%s: p50 %.3fms -> %.3fms (+%.0f%%)" % (
+                key, before, after, 100 * (after / before - 1)))
+    return regressions
+
+
+def main():
+    """Benchmark the processing stages from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark every processing stage.")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma separated \
+                        stages to run (default: all)")
+    parser.add_argument("-n", "--iterations", default=100, type=int, help="timed calls \
+                        per stage and input")
+    parser.add_argument("--recording", action="append", default=[], help="also run \
+                        on the frames of this recorded session (repeatable)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--save-baseline", help="write the results as a baseline file")
+    parser.add_argument("--baseline", help="fail if slower than this baseline file")
+    parser.add_argument("--tolerance", default=0.2, type=float, help="allowed p50 \
+                        slowdown against the baseline (default 0.2 = 20%%)")
+    parser.add_argument("--decimation", help="comma separated AprilTag decimation \
+                        factors to measure speed against corner accuracy for, e.g. 1,2,3,4")
+    parser.add_argument("--cold-start", action="store_true", help="time fresh processes \
+                        importing each tool and printing its --help")
+    args = parser.parse_args()
+
+    if args.cold_start:
+        print("%-16s %10s %10s" % ("module", "import ms", "--help ms"))
+        for name, imported, helped in cold_start():
+            print("%-16s %10.1f %10s" % (name, imported, "" if helped is None else "%.1f" % helped))
+        sys.exit(0)
+
+    if args.decimation:
+        factors = [float(f) for f in args.decimation.split(",")]
+        print("%-10s %7s %9s %9s %12s %7s" % ("input", "factor", "p50 ms", "per sec",
+                                            "corner err", "found"))
+        for label, factor, timing, error, found in decimation_tradeoff(factors, args.iterations):
+            print("%-10s %7.2f %9.3f %9.1f %10.3fpx %6.0f%%" % (
+                label, factor, timing["p50"], timing["throughput"], error, 100 * found))
+        sys.exit(0)
+
+    stages = args.stages.split(",")
+    for name in stages:
+        if name not in STAGES:
+            parser.error("unknown stage " + name)
+
+    results = run_benchmarks(stages, args.iterations, recordings=args.recording)
+    print(format_results(results))
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against %s:" % args.baseline)
+            print("\n".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against %s." % args.baseline)
+
+
+if __name__ == "__main__":
+    main()
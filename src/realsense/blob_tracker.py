@@ -0,0 +1,239 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+from .segmentation import COLORS
+
+
+"""
+Color blob tracking. ColorSegmenter finds anonymous blobs every frame; the
+BlobTracker follows them over time. Each frame the boxes of the live tracks
+are moved by their velocity, the overlap (IoU) of every predicted box with
+every new blob of the same color is computed in one numpy step, and pairs are
+assigned greedily from the best overlap down. Matched tracks keep their ID and
+update their velocity, unmatched blobs start new tracks and tracks that go
+unmatched for too long are dropped.
+
+Between full scans the tracker can hand out the predicted regions of its
+tracks, so the segmentation only runs there (ColorSegmenter.detect_regions).
+New objects show up at the next full scan.
+"""
+
+
+# One tracked blob as handed out by BlobTracker.update. vx and vy are in pixels
+# per second, age counts the frames since the track started and missed the
+# frames since it was last matched (its box is the prediction then).
+TrackedBlob = namedtuple("TrackedBlob", ["id", "label", "name", "x", "y", "w", "h", "area",
+                                         "cx", "cy", "vx", "vy", "age", "missed"])
+
+
+def iou_matrix(a, b):
+    """Compute the intersection over union of every pair of boxes.
+
+    Args:
+        a (ndarray): N x 4 (x0, y0, x1, y1) boxes
+        b (ndarray): M x 4 (x0, y0, x1, y1) boxes
+
+    Returns:
+        ndarray: N x M IoU values
+    """
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y1 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+def greedy_assignment(scores, min_score):
+    """Pair rows and columns from the highest score down, using every row and
+    column at most once.
+
+    Returns:
+        List: (row, column) pairs with a score of at least min_score
+    """
+    rows, cols = np.nonzero(scores >= min_score)
+    order = np.argsort(-scores[rows, cols], kind="stable")
+    used_rows, used_cols, pairs = set(), set(), []
+    for row, col in zip(rows[order], cols[order]):
+        if row not in used_rows and col not in used_cols:
+            used_rows.add(row)
+            used_cols.add(col)
+            pairs.append((int(row), int(col)))
+    return pairs
+
+
+class _Track:
+    """State of one track. The box is (x0, y0, x1, y1) floats. center follows
+    the prediction while the track is missed; the velocity is measured from
+    the last matched center and its timestamp instead.
+    """
+
+    def __init__(self, track_id, blob, timestamp):
+        self.id = track_id
+        self.label = blob.label
+        self.name = blob.name
+        self.box = np.array([blob.x, blob.y, blob.x + blob.w, blob.y + blob.h], np.float64)
+        self.area = blob.area
+        self.center = np.array([blob.cx, blob.cy], np.float64)
+        self.measured_center = self.center.copy()
+        self.measured_at = timestamp
+        self.velocity = np.zeros(2)
+        self.age = 1
+        self.missed = 0
+
+    def predicted(self, dt):
+        shift = self.velocity * dt
+        return self.box + np.concatenate([shift, shift])
+
+    def blob(self):
+        x0, y0, x1, y1 = self.box
+        return TrackedBlob(self.id, self.label, self.name, int(round(x0)), int(round(y0)),
+                           int(round(x1 - x0)), int(round(y1 - y0)), self.area,
+                           float(self.center[0]), float(self.center[1]),
+                           float(self.velocity[0]), float(self.velocity[1]), self.age, self.missed)
+
+
+class BlobTracker:
+    """Give the blobs of ColorSegmenter stable IDs and velocities.
+
+    Args:
+        min_iou (float): Least overlap of a predicted box and a blob of the
+            same color for them to match
+        max_missed (int): Frames a track survives without a match
+        smoothing (float): Weight of the newest measurement in the velocity
+            (exponential moving average)
+        full_scan_every (int): regions() asks for a full scan this often; 1
+            scans every frame
+        padding (float): Padding of the predicted regions relative to the
+            box size
+        colors (List): Color ranges the labels refer to, for draw()
+    """
+
+    def __init__(self, min_iou=0.1, max_missed=5, smoothing=0.5, full_scan_every=1, padding=0.5,
+                 colors=COLORS):
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.smoothing = smoothing
+        self.full_scan_every = full_scan_every
+        self.padding = padding
+        self.colors = colors
+        self.tracks = []
+        self._next_id = 1
+        self._last_timestamp = None
+        self._dt = 0.0
+        self._since_scan = 0
+
+    def regions(self, width, height):
+        """Return the padded predicted boxes of the live tracks to segment in,
+        or None when the next frame should be scanned completely.
+
+        Args:
+            width (int): Image width
+            height (int): Image height
+
+        Returns:
+            List: (x0, y0, x1, y1) rectangles or None
+        """
+        if not self.tracks or self._since_scan + 1 >= self.full_scan_every:
+            return None
+        rects = []
+        for track in self.tracks:
+            x0, y0, x1, y1 = track.predicted(self._dt)
+            pad = self.padding * max(x1 - x0, y1 - y0) + 4
+            rect = [max(int(x0 - pad), 0), max(int(y0 - pad), 0),
+                    min(int(x1 + pad) + 1, width), min(int(y1 + pad) + 1, height)]
+            if rect[0] < rect[2] and rect[1] < rect[3]:
+                rects.append(rect)
+        return rects
+
+    def update(self, blobs, timestamp=None, full_scan=True):
+        """Match the blobs of a new frame to the tracks.
+
+        Args:
+            blobs (List): Blobs from ColorSegmenter
+            timestamp (float): Capture time in seconds, defaults to now
+            full_scan (boolean): Whether blobs cover the whole frame or only
+                the regions() of the tracks
+
+        Returns:
+            List: TrackedBlob of every live track, by ID
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self._last_timestamp is not None and timestamp > self._last_timestamp:
+            self._dt = timestamp - self._last_timestamp
+        self._last_timestamp = timestamp
+        self._since_scan = 0 if full_scan else self._since_scan + 1
+
+        pairs = []
+        if self.tracks and blobs:
+            predicted = np.array([track.predicted(self._dt) for track in self.tracks])
+            boxes = np.array([(b.x, b.y, b.x + b.w, b.y + b.h) for b in blobs], np.float64)
+            scores = iou_matrix(predicted, boxes)
+            # Only blobs of the same color can continue a track.
+            same = (np.array([track.label for track in self.tracks])[:, None]
+                    == np.array([blob.label for blob in blobs])[None, :])
+            scores[~same] = 0
+            pairs = greedy_assignment(scores, self.min_iou)
+
+        matched_tracks = set()
+        matched_blobs = set()
+        for row, col in pairs:
+            track, blob = self.tracks[row], blobs[col]
+            center = np.array([blob.cx, blob.cy])
+            elapsed = timestamp - track.measured_at
+            if elapsed > 0:
+                measured = (center - track.measured_center) / elapsed
+                track.velocity += self.smoothing * (measured - track.velocity)
+            track.box = np.array([blob.x, blob.y, blob.x + blob.w, blob.y + blob.h], np.float64)
+            track.center = track.measured_center = center
+            track.measured_at = timestamp
+            track.area = blob.area
+            track.age += 1
+            track.missed = 0
+            matched_tracks.add(row)
+            matched_blobs.add(col)
+
+        live = []
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.missed += 1
+                track.age += 1
+                # Coast along the prediction until the track is dropped.
+                track.box = track.predicted(self._dt)
+                track.center = (track.box[:2] + track.box[2:]) / 2
+                if track.missed > self.max_missed:
+                    continue
+            live.append(track)
+        for i, blob in enumerate(blobs):
+            if i not in matched_blobs:
+                live.append(_Track(self._next_id, blob, timestamp))
+                self._next_id += 1
+        self.tracks = live
+        return [track.blob() for track in live]
+
+    def draw(self, image, tracked):
+        """Draw the box, color, ID and velocity of the tracks seen this frame.
+
+        Args:
+            image (ndarray): BGR image to draw on
+            tracked (List): TrackedBlobs returned by update()
+        """
+        for blob in tracked:
+            if blob.missed:
+                continue
+            color_val = self.colors[blob.label - 1].draw_color
+            cv2.rectangle(image, (blob.x, blob.y), (blob.x + blob.w, blob.y + blob.h), color_val, 2)
+            cv2.putText(image, "%s #%d" % (blob.name, blob.id), (blob.x, blob.y),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, color_val)
+            # Where the blob will be in a tenth of a second.
+            center = (int(blob.cx), int(blob.cy))
+            ahead = (int(blob.cx + blob.vx / 10), int(blob.cy + blob.vy / 10))
+            if center != ahead:
+                cv2.arrowedLine(image, center, ahead, color_val, 2)
@@ -0,0 +1,127 @@
+import argparse
+import numpy as np
+import cv2
+
+from .buffers import BufferArena
+from .deproject import Deprojector
+from .depth_stats import box_depth_stats
+from .frame_source import add_source_arguments, source_from_args
+from .metrics import add_metrics_arguments, metrics_from_args
+from .recording import add_record_arguments, record_from_args
+from .predictive import PredictiveTracker
+from .stages import add_pipeline_arguments, run_pipeline
+
+
+"""
+Purpose: Trackes object in user inputed region of interest and distance to the center of the region is calcualted in
+real time.
+Result: Objects are tracked successful and distance is correctly track from center of object to camera
+"""
+
+# Buffers for the depth statistics and the annotated image, allocated once
+# instead of every frame
+arena = BufferArena()
+
+
+def main():
+    """Track a selected object and its distance until 'q' is pressed."""
+    parser = argparse.ArgumentParser(description="Track a selected object and its distance.")
+    add_source_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_metrics_arguments(parser)
+    add_record_arguments(parser)
+    parser.add_argument("--predict", action="store_true", help="only run CSRT every few \
+                        frames and predict the box in between")
+    parser.add_argument("--max-skip", default=8, type=int, help="most frames between \
+                        CSRT updates with --predict")
+    args = parser.parse_args()
+    metrics = metrics_from_args(args)
+
+    # Configure depth and color streams and start streaming. Depth is aligned to
+    # color so the tracked box covers the same pixels in both images.
+    source = source_from_args(args, 640, 480, depth=True, align=True)
+    source = record_from_args(args, source)
+
+    # Create a tracker object
+    tracker = cv2.legacy.TrackerCSRT_create()
+    if args.predict:
+        tracker = PredictiveTracker(tracker, max_skip=args.max_skip)
+
+    # Get initial frame for ROI selection
+    initial_frame = source.read().color
+
+    # Select ROI for tracker from the first frame
+    bbox = cv2.selectROI("Frame", initial_frame, fromCenter=False, showCrosshair=True)
+    tracker.init(initial_frame, bbox)
+
+    # Ray table of every depth pixel, built on the first frame
+    deprojector = Deprojector()
+
+
+    def process(frame):
+        # Update the tracker with the current frame
+        with metrics.span("tracker_update"):
+            ret, bbox = tracker.update(frame.color)
+        if not ret:
+            metrics.incr("tracker_losses")
+            return None
+
+        # Calculate the center of the bounding box
+        center_x = int(bbox[0] + bbox[2] / 2)
+        center_y = int(bbox[1] + bbox[3] / 2)
+
+        # Get the median depth over the whole bounding box, which ignores holes
+        # and is much less noisy than the single pixel at its center
+        with metrics.span("depth"):
+            stats = box_depth_stats(frame.depth, [bbox], frame.depth_scale, arena=arena)
+        distance_meters = stats.median[0]
+
+        # 3D position of the center in meters, relative to the camera
+        point = None
+        if frame.depth_intrinsics is not None and not np.isnan(distance_meters):
+            point = deprojector.pixel_points([center_x], [center_y], [distance_meters],
+                                             frame.depth_intrinsics)[0]
+        return bbox, (center_x, center_y), distance_meters, point
+
+
+    def render(frame, result):
+        # Frames read from the frame bus without copying are read only
+        color_image = arena.writable("annotated", frame.color)
+        if result is not None:
+            bbox, center, distance_meters, point = result
+
+            # Draw bounding box
+            p1 = (int(bbox[0]), int(bbox[1]))
+            p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
+            cv2.rectangle(color_image, p1, p2, (0, 255, 0), 2, 1)
+            cv2.circle(color_image, center, 5, (0, 0, 255), -1)
+
+            if np.isnan(distance_meters):
+                distance_text = "Distance: no depth"
+            else:
+                distance_inches = distance_meters * 39.37  # Convert meters to inches
+                distance_text = f"Distance: {distance_inches:.2f} inches"
+            cv2.putText(color_image, distance_text, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            if point is not None:
+                point_text = "X: %.3f Y: %.3f Z: %.3f m" % tuple(point)
+                cv2.putText(color_image, point_text, (50, 90), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+        # Show images
+        cv2.imshow("Tracking", color_image)
+
+        # Press 'q' to quit
+        return cv2.waitKey(1) & 0xFF != ord('q')
+
+
+    try:
+        run_pipeline(args, source, process, render, metrics)
+
+    finally:
+        # Stop streaming
+        source.stop()
+        metrics.close()
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+"""
+Preallocated image buffers. The processing stages hand OpenCV and numpy a
+buffer from a BufferArena as the destination (dst= / out=) instead of getting
+a new image back every frame. The arena only allocates when a buffer is asked
+for the first time or has to grow; smaller requests (a region of the frame)
+are served from the start of the existing memory. So after the first frame
+the hot path does not allocate any frame sized arrays.
+
+A buffer is overwritten by the next frame, so only keep results that have to
+outlive the frame (blob lists, distances, ...) or copy them.
+"""
+
+
+class BufferArena:
+    """Named arrays reused from frame to frame.
+
+    Attributes:
+        allocations (int): Buffers allocated so far, stays constant once
+            every buffer exists
+        allocated_bytes (int): Total size of those allocations
+        reuses (int): Requests served with an existing buffer
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.reuses = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Return a contiguous array of shape called name, allocating memory
+        for it if it doesn't exist yet, has another type or is too small. Its
+        contents are whatever was written last.
+        """
+        shape = tuple(shape)
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            buffer = self._buffers[name] = np.empty(size, dtype)
+            self.allocations += 1
+            self.allocated_bytes += buffer.nbytes
+        else:
+            self.reuses += 1
+        return buffer[:size].reshape(shape)
+
+    def like(self, name, array):
+        """Return the buffer called name with the shape and type of array."""
+        return self.get(name, array.shape, array.dtype)
+
+    def writable(self, name, array):
+        """Return array if it can be drawn on, otherwise a copy of it in the
+        buffer called name. Frames read from the frame bus without copying
+        are read only views.
+        """
+        if array.flags.writeable:
+            return array
+        copy = self.like(name, array)
+        np.copyto(copy, array)
+        return copy
+
+    def nbytes(self):
+        """Bytes held by the arena right now."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
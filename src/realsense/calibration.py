@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+from .frame_source import intrinsics_from_dict, intrinsics_to_dict
+from .metrics import NULL_METRICS
+
+
+"""
+Calibration cache. Startup used to measure the dividers on a single frame
+(failing whenever a ring or a hand hid one of them) and build the undistortion
+remap tables from scratch. The CalibrationStore keeps, per camera serial and
+resolution, the intrinsics, the remap tables and the divider positions, so a
+known camera starts with them right away. A DividerVerifier then measures the
+dividers again in the background over several frames and only writes the
+cache when they actually moved.
+
+Layout of the store, one directory per camera and resolution:
+    <root>/<serial>_<width>x<height>/calibration.json
+        intrinsics, dividers, units ("meters" with depth fusion, "tag"
+        otherwise) and the time the dividers were last measured
+    <root>/<serial>_<width>x<height>/maps.npz
+        map1 and map2 of cv2.initUndistortRectifyMap
+"""
+
+
+CALIBRATION_DIR = os.path.join(os.path.expanduser("~"), ".cache", "realsense", "calibration")
+CALIBRATION_FILE = "calibration.json"
+MAPS_FILE = "maps.npz"
+
+
+def calibration_key(source):
+    """Return the store key of a started source, or None for sources that
+    can't be told apart (webcams, recordings).
+    """
+    serial = getattr(source, "serial", None)
+    intr = source.intrinsics
+    if not serial or intr is None:
+        return None
+    return "%s_%dx%d" % (serial, intr.width, intr.height)
+
+
+def tracker_units(tracker):
+    """Units of the tag positions of an AprilTagTracker."""
+    return "meters" if tracker.fuse_depth else "tag"
+
+
+class Calibration:
+    """Calibration of one camera at one resolution.
+
+    Attributes:
+        intrinsics (Intrinsics): Color intrinsics the entry was made with
+        maps (Tuple): Undistortion remap tables, or None
+        dividers (Tuple): Sorted x of both dividers, or None
+        units (str): Units of the dividers
+        measured (float): Time the dividers were measured
+    """
+
+    def __init__(self, intrinsics, maps=None, dividers=None, units="tag", measured=None):
+        self.intrinsics = intrinsics
+        self.maps = maps
+        self.dividers = dividers
+        self.units = units
+        self.measured = measured
+
+
+class CalibrationStore:
+    """Calibrations on disk, keyed by calibration_key.
+
+    Args:
+        root (str): Directory holding one directory per key
+    """
+
+    def __init__(self, root=CALIBRATION_DIR):
+        self.root = root
+        # The verifier writes from its own thread.
+        self._lock = threading.Lock()
+
+    def _path(self, key, name):
+        return os.path.join(self.root, key, name)
+
+    def load(self, key, intrinsics, units):
+        """Return the calibration stored under key, or None if there is none
+        or it was made with other intrinsics (the camera was recalibrated).
+        Dividers measured in other units are left out.
+        """
+        try:
+            with open(self._path(key, CALIBRATION_FILE)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("intrinsics") != intrinsics_to_dict(intrinsics):
+            return None
+
+        calibration = Calibration(intrinsics_from_dict(data["intrinsics"]))
+        if data.get("dividers") is not None and data.get("units") == units:
+            calibration.dividers = tuple(data["dividers"])
+            calibration.units = units
+            calibration.measured = data.get("measured")
+        try:
+            with np.load(self._path(key, MAPS_FILE)) as maps:
+                calibration.maps = (maps["map1"], maps["map2"])
+        except (OSError, KeyError, ValueError):
+            pass
+        return calibration
+
+    def save(self, key, calibration):
+        """Write a calibration, replacing the files atomically."""
+        with self._lock:
+            os.makedirs(os.path.join(self.root, key), exist_ok=True)
+            if calibration.maps is not None:
+                tmp = self._path(key, MAPS_FILE + ".tmp")
+                with open(tmp, "wb") as f:
+                    np.savez(f, map1=calibration.maps[0], map2=calibration.maps[1])
+                os.replace(tmp, self._path(key, MAPS_FILE))
+            self._write_json(key, calibration)
+
+    def save_dividers(self, key, calibration):
+        """Write only the json part of a calibration (the maps don't change
+        when the dividers move).
+        """
+        with self._lock:
+            os.makedirs(os.path.join(self.root, key), exist_ok=True)
+            self._write_json(key, calibration)
+
+    def _write_json(self, key, calibration):
+        data = {"intrinsics": intrinsics_to_dict(calibration.intrinsics),
+                "dividers": list(calibration.dividers) if calibration.dividers else None,
+                "units": calibration.units, "measured": calibration.measured}
+        tmp = self._path(key, CALIBRATION_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self._path(key, CALIBRATION_FILE))
+
+
+def load_or_calibrate(tracker, store, reverse=False):
+    """Set up a tracker from the store, measuring and storing whatever is
+    missing. Without a store (or for sources with no serial) this is the old
+    single frame tracker.get_pos_of_dividers.
+
+    Args:
+        tracker (AprilTagTracker): Tracker whose source is started
+        store (CalibrationStore): Store to use, or None
+        reverse (boolean): Whether to return the dividers in reverse
+
+    Returns:
+        Tuple: The dividers, and the Calibration in use (None without a store)
+    """
+    source = tracker.source
+    key = calibration_key(source) if store is not None else None
+    if key is None:
+        return tracker.get_pos_of_dividers(reverse), None
+
+    units = tracker_units(tracker)
+    calibration = store.load(key, source.intrinsics, units)
+    tracker.set_remap_tables(source.intrinsics, calibration.maps if calibration else None)
+
+    changed = False
+    if calibration is None or calibration.dividers is None:
+        dividers = tracker.get_pos_of_dividers()
+        calibration = Calibration(source.intrinsics, calibration and calibration.maps,
+                                  tuple(dividers), units, time.time())
+        changed = True
+    if calibration.maps is None and tracker.undistort == "remap":
+        calibration.maps = tracker.remap_tables()
+        changed = True
+    if changed:
+        store.save(key, calibration)
+
+    dividers = calibration.dividers
+    return (dividers[::-1] if reverse else dividers), calibration
+
+
+class DividerVerifier:
+    """Measure the dividers again on a background thread and report when they
+    moved. The main loop hands frames over with offer() and picks up new
+    dividers with poll(); the verifier only looks at the latest frame offered,
+    so it never holds the main loop up.
+
+    Args:
+        tracker (AprilTagTracker): Tracker used only by the verifier (the
+            detector is not thread safe), on the same source
+        dividers (Tuple): Sorted x of both dividers in use
+        store (CalibrationStore): Store to update, or None
+        calibration (Calibration): Stored calibration to update
+        frames (int): Frames the dividers are measured over
+        tolerance (float): How far, relative to the distance between the
+            dividers, the median of a measurement has to be from the dividers
+            in use for them to count as moved
+        interval (float): Seconds between measurements, None to measure once
+        reverse (boolean): Whether poll returns the dividers in reverse
+        metrics (Metrics): Where to count moves
+    """
+
+    def __init__(self, tracker, dividers, store=None, calibration=None, frames=15,
+                 tolerance=0.05, interval=30.0, reverse=False, metrics=NULL_METRICS):
+        self.tracker = tracker
+        self.dividers = tuple(sorted(dividers))
+        self.store = store
+        self.calibration = calibration
+        self.key = calibration_key(tracker.source) if store is not None else None
+        self.frames = frames
+        self.tolerance = tolerance
+        self.interval = interval
+        self.reverse = reverse
+        self.metrics = metrics
+        self.measurements = 0
+
+        self._frame = None
+        self._moved = None
+        self._lock = threading.Lock()
+        self._offered = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def offer(self, frame):
+        """Make frame the next one the verifier looks at."""
+        with self._lock:
+            self._frame = frame
+        self._offered.set()
+
+    def poll(self):
+        """Return the new dividers if they moved since the last poll, else None."""
+        with self._lock:
+            moved, self._moved = self._moved, None
+        if moved is None:
+            return None
+        return moved[::-1] if self.reverse else moved
+
+    def stop(self):
+        self._stop.set()
+        self._offered.set()
+        self._thread.join()
+
+    def _next_frame(self):
+        self._offered.wait()
+        with self._lock:
+            frame, self._frame = self._frame, None
+            self._offered.clear()
+        return frame
+
+    def _measure(self):
+        """Median of the dividers over self.frames frames in which both were
+        seen, or None if the verifier was stopped first.
+        """
+        samples = []
+        while len(samples) < self.frames and not self._stop.is_set():
+            frame = self._next_frame()
+            if frame is None:
+                continue
+            try:
+                samples.append(self.tracker.get_pos_of_dividers(frame=frame))
+            except ValueError:
+                # A divider is hidden in this frame.
+                pass
+        if len(samples) < self.frames:
+            return None
+        return tuple(float(x) for x in np.median(samples, axis=0))
+
+    def _run(self):
+        while not self._stop.is_set():
+            measured = self._measure()
+            if measured is None:
+                break
+            self.measurements += 1
+            spacing = abs(self.dividers[1] - self.dividers[0])
+            moved = max(abs(a - b) for a, b in zip(measured, self.dividers))
+            if moved > self.tolerance * spacing:
+                self.metrics.incr("divider_moves")
+                self.dividers = measured
+                with self._lock:
+                    self._moved = measured
+                if self.key is not None and self.calibration is not None:
+                    self.calibration.dividers = measured
+                    self.calibration.measured = time.time()
+                    self.store.save_dividers(self.key, self.calibration)
+            if self.interval is None or self._stop.wait(self.interval):
+                break
+
+
+def add_calibration_arguments(parser):
+    """Add the calibration cache options understood by calibration_from_args."""
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR, help="where \
+                        calibrations are cached per camera serial and resolution")
+    parser.add_argument("--no-calibration-cache", action="store_true", help="measure \
+                        the dividers on startup instead of using the cache")
+    parser.add_argument("--verify-every", default=30.0, type=float, help="seconds \
+                        between background divider checks (0 disables them)")
+    parser.add_argument("--verify-frames", default=15, type=int, help="frames a \
+                        background divider check is measured over")
+
+
+def calibration_from_args(args):
+    """Return the CalibrationStore selected on the command line, or None."""
+    if args.no_calibration_cache:
+        return None
+    return CalibrationStore(args.calibration_dir)
+
+
+def verifier_from_args(args, tracker, dividers, store, calibration, reverse=False,
+                       metrics=NULL_METRICS):
+    """Start the DividerVerifier selected on the command line, or return None."""
+    if args.verify_every <= 0:
+        return None
+    if calibration is not None and calibration.maps is not None:
+        tracker.set_remap_tables(calibration.intrinsics, calibration.maps)
+    return DividerVerifier(tracker, dividers, store, calibration, args.verify_frames,
+                           interval=args.verify_every, reverse=reverse,
+                           metrics=metrics).start()
@@ -0,0 +1,54 @@
+import argparse
+import cv2
+
+from .blob_tracker import BlobTracker
+from .frame_source import add_source_arguments, source_from_args
+from .segmentation import ColorSegmenter
+
+
+def main():
+    """Detect colored objects with a webcam until 'q' is pressed."""
+    parser = argparse.ArgumentParser(description="Detect colored objects with a webcam.")
+    add_source_arguments(parser, default="webcam:0")
+    parser.add_argument("--full-scan-every", default=1, type=int, help="segment the whole \
+                        frame only this often and just around the tracked blobs in between")
+    args = parser.parse_args()
+
+    webcam = source_from_args(args)
+
+    #build the lookup table for blue, red, yellow, green and purple once
+    segmenter = ColorSegmenter()
+
+    #follow the blobs from frame to frame with stable IDs
+    tracker = BlobTracker(full_scan_every=args.full_scan_every)
+
+    while True: 
+
+        frame = webcam.read()
+        if frame is None:
+            break
+        imageFrame = frame.color
+
+        #label every pixel with its color and track all the colors in one pass,
+        #only around the tracked blobs between full scans
+        height, width = imageFrame.shape[:2]
+        regions = tracker.regions(width, height)
+        if regions is None:
+            blobs = segmenter.detect(imageFrame)
+        else:
+            blobs = segmenter.detect_regions(imageFrame, regions, [])
+        tracked = tracker.update(blobs, frame.timestamp, regions is None)
+        # Frames read from the frame bus without copying are read only
+        imageFrame = segmenter.arena.writable("annotated", imageFrame)
+        tracker.draw(imageFrame, tracked)
+
+        # Program Termination 
+        cv2.imshow("Multiple Color Detection in Real-TIme", imageFrame) 
+        if cv2.waitKey(10) & 0xFF == ord('q'): 
+            webcam.stop() 
+            cv2.destroyAllWindows() 
+            break
+
+
+if __name__ == "__main__":
+    main()
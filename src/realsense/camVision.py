@@ -0,0 +1,89 @@
+import argparse
+import cv2
+
+from .blob_tracker import BlobTracker
+from .frame_source import add_source_arguments, source_from_args
+from .metrics import add_metrics_arguments, metrics_from_args
+from .motion import add_motion_arguments, motion_gate_from_args
+from .segmentation import ColorSegmenter
+from .stages import add_pipeline_arguments, run_pipeline
+
+
+def main():
+    """Detect colored objects until 'q' is pressed."""
+    parser = argparse.ArgumentParser(description="Detect colored objects.")
+    add_source_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_metrics_arguments(parser)
+    add_motion_arguments(parser)
+    parser.add_argument("--full-scan-every", default=1, type=int, help="segment the whole \
+                        frame only this often and just around the tracked blobs in between")
+    args = parser.parse_args()
+    metrics = metrics_from_args(args)
+
+    # Configure the color stream and start it
+    source = source_from_args(args, 640, 480)
+
+    # Build the color lookup table once instead of every frame
+    segmenter = ColorSegmenter()
+
+    # Gives the blobs stable IDs and velocities
+    tracker = BlobTracker(full_scan_every=args.full_scan_every)
+
+    # Skips the segmentation while nothing moves, with --motion-gate
+    gate = motion_gate_from_args(args)
+    last_blobs = None
+
+
+    def process(frame):
+        nonlocal last_blobs
+        image = frame.color
+        height, width = image.shape[:2]
+        everything = [[0, 0, width, height]]
+        regions = gate.update(image) if gate is not None else everything
+        full_scan = True
+        if last_blobs is not None and regions is None:
+            # Nothing changed, the blobs of the last frame still hold
+            metrics.incr("motion_skips")
+            blobs = last_blobs
+        elif last_blobs is not None and regions != everything:
+            # Only segment again where the image changed
+            blobs = segmenter.detect_regions(image, regions, last_blobs)
+        else:
+            predicted = tracker.regions(width, height)
+            if predicted is None:
+                # Label every pixel with its color and find the blobs of all colors at once
+                blobs = segmenter.detect(image)
+            else:
+                # Only look where the tracked blobs are expected
+                blobs = segmenter.detect_regions(image, predicted, [])
+                full_scan = False
+        metrics.set("buffer_allocations", segmenter.arena.allocations)
+        last_blobs = blobs
+        return tracker.update(blobs, frame.timestamp, full_scan)
+
+
+    def render(frame, tracked):
+        # Frames read from the frame bus without copying are read only
+        imageFrame = segmenter.arena.writable("annotated", frame.color)
+        tracker.draw(imageFrame, tracked)
+
+        # Display the result
+        cv2.imshow("Multiple Color Detection in Real-Time", imageFrame)
+
+        # Break the loop when 'q' is pressed
+        return cv2.waitKey(1) & 0xFF != ord('q')
+
+
+    try:
+        run_pipeline(args, source, process, render, metrics)
+
+    finally:
+        # Stop the source
+        source.stop()
+        metrics.close()
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import numpy as np
+import cv2
+
+from .buffers import BufferArena
+
+
+"""
+Pixel to 3D conversion without a per pixel rs2_deproject_pixel_to_point call.
+The ray through every pixel depends only on the intrinsics, so it is computed
+once per stream into a table holding (x / z, y / z, 1) of each pixel. Turning
+depth into points is then a single multiply of the table (or a slice of it)
+with the depth in meters.
+"""
+
+
+def pixel_rays(intrinsics):
+    """Compute the ray of every pixel, following rs2_deproject_pixel_to_point.
+
+    Args:
+        intrinsics (Intrinsics): Intrinsics of the depth image
+
+    Returns:
+        ndarray: H x W x 3 float32 table of (x / z, y / z, 1)
+    """
+    width, height = intrinsics.width, intrinsics.height
+    xs = (np.arange(width, dtype=np.float64) - intrinsics.ppx) / intrinsics.fx
+    ys = (np.arange(height, dtype=np.float64) - intrinsics.ppy) / intrinsics.fy
+    x, y = np.meshgrid(xs, ys)
+
+    model = intrinsics.model
+    k1, k2, p1, p2, k3 = (tuple(intrinsics.coeffs) + (0.0,) * 5)[:5]
+    if model == "inverse_brown_conrady" and any(intrinsics.coeffs):
+        # The depth streams of most RealSense cameras: the coefficients map
+        # distorted pixels to undistorted ones directly.
+        r2 = x * x + y * y
+        f = 1 + k1 * r2 + k2 * r2 * r2 + k3 * r2 * r2 * r2
+        x, y = (x * f + 2 * p1 * x * y + p2 * (r2 + 2 * x * x),
+                y * f + 2 * p2 * x * y + p1 * (r2 + 2 * y * y))
+    elif model == "brown_conrady" and any(intrinsics.coeffs):
+        # Forward distortion coefficients have to be inverted iteratively,
+        # which undistortPoints does for all pixels in one call.
+        camera_matrix = np.array([[intrinsics.fx, 0, intrinsics.ppx],
+                                  [0, intrinsics.fy, intrinsics.ppy],
+                                  [0, 0, 1]])
+        pixels = np.stack(np.meshgrid(np.arange(width), np.arange(height)), -1)
+        undistorted = cv2.undistortPoints(pixels.reshape(-1, 1, 2).astype(np.float64),
+                                          camera_matrix, np.array([k1, k2, p1, p2, k3]))
+        x, y = undistorted.reshape(height, width, 2).transpose(2, 0, 1)
+
+    rays = np.empty((height, width, 3), np.float32)
+    rays[..., 0] = x
+    rays[..., 1] = y
+    rays[..., 2] = 1
+    return rays
+
+
+class Deprojector:
+    """Convert depth pixels into 3D points in meters, in the coordinate frame
+    of the depth camera (x right, y down, z forward).
+
+    The ray table is built the first time it is needed and rebuilt only when
+    the intrinsics change, e.g. because the stream resolution changed.
+    """
+
+    def __init__(self):
+        self.intrinsics = None
+        self.rays = None
+        self.arena = BufferArena()
+
+    def table(self, intrinsics):
+        """Return the ray table for intrinsics, building it if needed."""
+        if intrinsics != self.intrinsics:
+            self.rays = pixel_rays(intrinsics)
+            self.intrinsics = intrinsics
+        return self.rays
+
+    def points(self, depth_image, intrinsics, depth_scale, box=None, out=None):
+        """Deproject a whole depth image or the part of it inside box.
+
+        Args:
+            depth_image (ndarray): Raw z16 depth image
+            intrinsics (Intrinsics): Intrinsics of the depth image
+            depth_scale (float): Meters per depth unit
+            box (Tuple): Optional (x, y, w, h) region
+            out (ndarray): Optional float32 array to write the points into,
+                e.g. a BufferArena buffer, instead of allocating one
+
+        Returns:
+            ndarray: H x W x 3 float32 points, all zero where depth is missing
+        """
+        rays = self.table(intrinsics)
+        depth = depth_image
+        if box is not None:
+            height, width = depth_image.shape[:2]
+            x0, y0 = max(int(box[0]), 0), max(int(box[1]), 0)
+            x1, y1 = min(int(box[0] + box[2]), width), min(int(box[1] + box[3]), height)
+            rays = rays[y0:y1, x0:x1]
+            depth = depth_image[y0:y1, x0:x1]
+        if out is None:
+            out = np.empty(depth.shape + (3,), np.float32)
+        z = self.arena.get("z", depth.shape, np.float32)
+        np.multiply(depth, np.float32(depth_scale), out=z, casting="unsafe")
+        np.multiply(rays, z[..., None], out=out)
+        return out
+
+    def mask_points(self, depth_image, intrinsics, depth_scale, mask):
+        """Deproject the valid depth pixels under a boolean mask.
+
+        Returns:
+            ndarray: N x 3 float32 points
+        """
+        mask = mask & (depth_image > 0)
+        z = depth_image[mask].astype(np.float32)
+        z *= depth_scale
+        return self.table(intrinsics)[mask] * z[:, None]
+
+    def pixel_points(self, xs, ys, distances, intrinsics):
+        """Deproject pixels whose distances are already known, such as the
+        median depth of a tracked box.
+
+        Args:
+            xs (ndarray): Pixel columns
+            ys (ndarray): Pixel rows
+            distances (ndarray): Depth of each pixel in meters
+            intrinsics (Intrinsics): Intrinsics of the depth image
+
+        Returns:
+            ndarray: N x 3 float32 points
+        """
+        rays = self.table(intrinsics)
+        xs = np.clip(np.asarray(xs, np.int64), 0, intrinsics.width - 1)
+        ys = np.clip(np.asarray(ys, np.int64), 0, intrinsics.height - 1)
+        return rays[ys, xs] * np.asarray(distances, np.float32)[:, None]
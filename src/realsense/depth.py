@@ -0,0 +1,118 @@
+import argparse
+import numpy as np
+import cv2
+
+from .buffers import BufferArena
+from .depth_stats import box_depth_stats
+from .frame_source import add_source_arguments, source_from_args
+from .metrics import add_metrics_arguments, metrics_from_args
+from .recording import add_record_arguments, record_from_args
+from .stages import add_pipeline_arguments, run_pipeline
+
+"""
+#Purpose: Attempted to in realtime track the distance of the camera to 3 random points on the webfeed.
+#Result: Successfully used camera depth sensing to accurately track the distance from the camera
+to 3 points that are randomly generated. Precursor to both.py where the distance to the center
+of the object is accurately tracked in realtime.
+"""
+
+# Size in pixels of the square the distance is measured over
+CENTER_WINDOW = 9
+
+# Buffers for the depth view and statistics, allocated once instead of every frame
+arena = BufferArena()
+
+
+def main():
+    """Show the distance to the center of the image until 'q' is pressed."""
+    parser = argparse.ArgumentParser(description="Show the distance to the center of the image.")
+    add_source_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_metrics_arguments(parser)
+    add_record_arguments(parser)
+    args = parser.parse_args()
+    metrics = metrics_from_args(args)
+
+    # Configure depth and color streams and start streaming
+    source = source_from_args(args, 640, 480, depth=True)
+    source = record_from_args(args, source)
+    frame = arena.writable("roi", source.read().color)
+
+
+    #Select Region of Interest
+    bbox = cv2.selectROI("Frame", frame, fromCenter=False, showCrosshair=True)
+
+    #Create Tracker for object
+    tracker = cv2.legacy.MultiTracker_create()
+    tracker.add(cv2.legacy.TrackerCSRT_create(), frame, bbox)
+    print("Multitracker created")
+
+
+
+    #Draw a Bounding Box
+    p1 = (int(bbox[0]), int(bbox[1]))
+    p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
+    cv2.rectangle(frame, p1, p2, (0, 255, 0), 2, 1)
+
+
+    def process(frame):
+        # Get the depth frame's width and height
+        height, width = frame.depth.shape
+
+        # Calculate the coordinates of the center pixel
+        center_x = width // 2
+        center_y = height // 2
+
+        # Get the median depth of a small window at the center of the image
+        window = (center_x - CENTER_WINDOW // 2, center_y - CENTER_WINDOW // 2, CENTER_WINDOW, CENTER_WINDOW)
+        stats = box_depth_stats(frame.depth, [window], frame.depth_scale, arena=arena)
+        return (center_x, center_y), stats.median[0]
+
+
+    def render(frame, result):
+        # Images as numpy arrays. Frames read from the frame bus without
+        # copying are read only, so draw on a copy of the color image.
+        depth_image = frame.depth
+        color_image = arena.writable("annotated", frame.color)
+        (center_x, center_y), distance_meters = result
+
+        # Print out the distance in inches, the window can be all holes
+        if np.isnan(distance_meters):
+            distance_text = "Distance: no depth"
+        else:
+            distance_inches = distance_meters * 39.37  # Convert meters to inches
+            distance_text = f"Distance: {distance_inches:.2f} inches"
+        print(distance_text)
+
+        # Display the distance on the color image
+        cv2.putText(color_image, distance_text, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
+
+        # Draw a circle at the center pixel
+        cv2.circle(color_image, (center_x, center_y), 5, (0, 0, 255), -1)
+
+        # Apply colormap on depth image (image must be converted to 8-bit per pixel first)
+        depth_8bit = cv2.convertScaleAbs(depth_image, dst=arena.get("depth_8bit", depth_image.shape), alpha=0.03)
+        depth_colormap = cv2.applyColorMap(depth_8bit, cv2.COLORMAP_JET,
+                                           dst=arena.get("depth_colormap", depth_image.shape + (3,)))
+        metrics.set("buffer_allocations", arena.allocations)
+        cv2.circle(depth_colormap, (center_x, center_y), 5, (255, 255, 255), -1)
+
+        # Show images
+        cv2.imshow('RealSense - Color', color_image)
+        cv2.imshow('RealSense - Depth', depth_colormap)
+
+        # Press 'q' to quit
+        return cv2.waitKey(1) & 0xFF != ord('q')
+
+
+    try:
+        run_pipeline(args, source, process, render, metrics)
+    finally:
+        # Stop streaming
+        source.stop()
+        metrics.close()
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
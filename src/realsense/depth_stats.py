@@ -0,0 +1,180 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+"""
+Depth statistics over whole regions instead of single pixels. All regions of a
+frame are handled together: their pixels are gathered into one array, sorted
+once by (region, depth) and every statistic is read off the sorted array with
+index arithmetic, so there is no per region Python work.
+
+The cost still grows with the number of pixels sorted. box_depth_stats
+therefore samples every few rows and columns of large boxes, so that each box
+contributes at most max_pixels pixels and the cost tracks the number of boxes
+instead of their area.
+
+Pass a BufferArena (buffers.py) as arena to sort in buffers that are reused
+from frame to frame; then only arrays with one value per region are
+allocated.
+"""
+
+
+# Every field is an array with one value per region. Distances are in meters
+# and are NaN for regions without a single valid (non zero) depth pixel.
+DepthStats = namedtuple("DepthStats", ["median", "trimmed_mean", "valid_ratio", "min", "max"])
+
+
+def _buffer(arena, name, size, dtype):
+    if arena is None:
+        return np.empty(size, dtype)
+    return arena.get(name, (size,), dtype)
+
+
+def _sorted_stats(keys, count, depth_scale, trim, arena):
+    """Statistics from the (region << 16 | depth) key of every pixel. keys is
+    sorted in place.
+    """
+    if not 0 <= trim < 0.5:
+        raise ValueError("trim must be in [0, 0.5)")
+
+    # One sort orders the pixels by region and, within a region, by depth.
+    # Invalid pixels (depth 0) end up at the start of their region, so where
+    # every region starts, where its valid pixels start and where it ends can
+    # all be looked up in the sorted keys.
+    keys.sort()
+    regions = np.arange(count, dtype=np.int64) << 16
+    starts = np.searchsorted(keys, regions)
+    first = np.searchsorted(keys, regions, side="right")
+    ends = np.searchsorted(keys, regions + (1 << 16))
+    total, valid = ends - starts, ends - first
+    has_valid = valid > 0
+
+    nan = np.full(count, np.nan)
+    valid_ratio = valid / np.maximum(total, 1)
+    if not has_valid.any():
+        return DepthStats(nan, nan.copy(), valid_ratio, nan.copy(), nan.copy())
+
+    last = keys.size - 1
+
+    def pick(index):
+        return (keys[np.clip(index, 0, last)] & 0xFFFF).astype(np.float64)
+
+    low = pick(first)
+    high = pick(ends - 1)
+    median = (pick(first + (valid - 1) // 2) + pick(first + valid // 2)) / 2
+
+    # Running sum of the sorted depths, with a zero in front.
+    cumsum = _buffer(arena, "depth_cumsum", keys.size + 1, np.int64)
+    cumsum[0] = 0
+    np.bitwise_and(keys, 0xFFFF, out=cumsum[1:])
+    np.cumsum(cumsum[1:], out=cumsum[1:])
+    cut = np.floor(valid * trim).astype(np.int64)
+    start, stop = first + cut, ends - cut
+    trimmed_mean = (cumsum[stop] - cumsum[start]) / np.maximum(stop - start, 1)
+
+    def finish(stat):
+        return np.where(has_valid, stat * depth_scale, np.nan)
+
+    return DepthStats(finish(median), finish(trimmed_mean), valid_ratio, finish(low), finish(high))
+
+
+def segment_depth_stats(values, segments, count, depth_scale, trim=0.1, arena=None):
+    """Compute depth statistics of pixels grouped into regions.
+
+    Args:
+        values (ndarray): Raw z16 depth of every pixel (1D, uint16)
+        segments (ndarray): Region index of every pixel (1D, 0 to count - 1)
+        count (int): Number of regions
+        depth_scale (float): Meters per depth unit
+        trim (float): Fraction cut from each end for the trimmed mean
+        arena (BufferArena): Buffers to sort in, None to allocate them
+
+    Returns:
+        DepthStats: Statistics of every region
+    """
+    values = np.asarray(values).ravel()
+    keys = _buffer(arena, "depth_keys", values.size, np.int64)
+    np.copyto(keys, np.asarray(segments).ravel(), casting="unsafe")
+    keys <<= 16
+    keys |= values
+    return _sorted_stats(keys, count, depth_scale, trim, arena)
+
+
+def box_depth_stats(depth_image, boxes, depth_scale, trim=0.1, max_pixels=4096, arena=None):
+    """Compute depth statistics inside a batch of bounding boxes.
+
+    Args:
+        depth_image (ndarray): Raw z16 depth image
+        boxes (List): (x, y, w, h) boxes, like the ones trackers return
+        depth_scale (float): Meters per depth unit
+        trim (float): Fraction cut from each end for the trimmed mean
+        max_pixels (int): Pixels sampled at most per box. Larger boxes are
+            sampled on an evenly spaced grid, so min and max become estimates.
+            None uses every pixel.
+        arena (BufferArena): Buffers to sort in, None to allocate them
+
+    Returns:
+        DepthStats: Statistics of every box, in the order of boxes
+    """
+    height, width = depth_image.shape[:2]
+    patches = []
+    for x, y, w, h in boxes:
+        # Clip the box to the image.
+        x0, y0 = max(int(x), 0), max(int(y), 0)
+        x1, y1 = max(min(int(x + w), width), x0), max(min(int(y + h), height), y0)
+        step = 1
+        if max_pixels:
+            area = (x1 - x0) * (y1 - y0)
+            step = max(int(np.ceil(np.sqrt(area / max_pixels))), 1)
+        patches.append(depth_image[y0:y1:step, x0:x1:step])
+
+    # Write the keys of every box straight into one buffer.
+    keys = _buffer(arena, "depth_keys", sum(patch.size for patch in patches), np.int64)
+    offset = 0
+    for i, patch in enumerate(patches):
+        part = keys[offset:offset + patch.size].reshape(patch.shape)
+        part[...] = patch
+        part |= i << 16
+        offset += patch.size
+    return _sorted_stats(keys, len(patches), depth_scale, trim, arena)
+
+
+def mask_depth_stats(depth_image, masks, depth_scale, trim=0.1, arena=None):
+    """Compute depth statistics inside a batch of boolean masks.
+
+    Args:
+        depth_image (ndarray): Raw z16 depth image
+        masks (List): Boolean masks the size of the depth image
+        depth_scale (float): Meters per depth unit
+        trim (float): Fraction cut from each end for the trimmed mean
+        arena (BufferArena): Buffers to sort in, None to allocate them
+
+    Returns:
+        DepthStats: Statistics of every mask, in the order of masks
+    """
+    patches = [depth_image[mask] for mask in masks]
+    sizes = [patch.size for patch in patches]
+    values = np.concatenate(patches) if patches else np.zeros(0, np.uint16)
+    segments = np.repeat(np.arange(len(patches)), sizes)
+    return segment_depth_stats(values, segments, len(patches), depth_scale, trim, arena)
+
+
+def label_depth_stats(depth_image, labels, count, depth_scale, trim=0.1, arena=None):
+    """Compute depth statistics of every region of a label image, such as the
+    color labels of ColorSegmenter.segment.
+
+    Args:
+        depth_image (ndarray): Raw z16 depth image
+        labels (ndarray): Region id of every pixel, 0 for no region
+        count (int): Highest region id
+        depth_scale (float): Meters per depth unit
+        trim (float): Fraction cut from each end for the trimmed mean
+        arena (BufferArena): Buffers to sort in, None to allocate them
+
+    Returns:
+        DepthStats: Statistics of regions 1 to count (index 0 is region 1)
+    """
+    inside = labels > 0
+    return segment_depth_stats(depth_image[inside], labels[inside] - 1, count, depth_scale, trim,
+                               arena)
@@ -0,0 +1,334 @@
+import os
+import sys
+import json
+import time
+import signal
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .frame_source import (Frame, FrameSource, add_source_arguments, intrinsics_from_dict,
+                           intrinsics_to_dict, source_from_args)
+
+
+"""
+Shared memory frame bus. A RealSense device can only be opened by one process,
+so a capture daemon (python -m realsense.frame_bus, or realsense-bus) opens it
+once and publishes every frame into a ring of slots in a shared memory
+segment. Any number of consumers attach to the segment with --source shm[:name]
+and read the newest frame from it, as a copy or, with shm[:name]?nocopy, as
+read only views into the segment.
+
+The producer never waits for readers. Every slot carries a sequence number used
+as a seqlock: it is odd while the slot is being written and 2 * n + 2 once frame
+n is complete. A reader checks it before and after reading a slot, so a frame
+that got overwritten in between is detected and the newest one is read
+instead. Readers that are slower than the camera skip frames (counted in
+dropped) rather than holding the producer up.
+
+The segment holds:
+    header: magic, version, size of the metadata, closed flag, sequence number
+        of the newest frame and the time it was written
+    metadata: JSON with the image shapes, number of slots, intrinsics, depth
+        scale and camera serial
+    slots: sequence number, timestamp and frame number, color then depth pixels
+"""
+
+
+DEFAULT_NAME = "realsense"
+MAGIC = 0x52534642  # "RSFB"
+VERSION = 1
+HEADER_DTYPE = np.dtype([("magic", "<u4"), ("version", "<u4"), ("meta_bytes", "<u4"),
+                         ("closed", "<u4"), ("latest", "<i8"), ("written", "<f8")])
+# The metadata and the slots start on cache line boundaries.
+ALIGNMENT = 64
+
+
+def _align(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def _slot_dtype(color_shape, depth_shape):
+    fields = [("sequence", "<u8"), ("timestamp", "<f8"), ("index", "<i8"),
+              ("color", np.uint8, tuple(color_shape))]
+    if depth_shape is not None:
+        fields.append(("depth", np.uint16, tuple(depth_shape)))
+    return np.dtype(fields, align=True)
+
+
+# Segments created by this process, which its resource tracker has to remove.
+_created = set()
+
+
+def _segment_name(name):
+    # Segment names are global to the machine, so keep ours apart from others.
+    return "realsense_bus_" + name
+
+
+class _Segment(shared_memory.SharedMemory):
+    """A SharedMemory segment that stays mapped instead of failing to close
+    while numpy arrays still point into it, e.g. frames handed out without
+    copying. It is unmapped once they are gone.
+    """
+
+    def close(self):
+        try:
+            super().close()
+        except BufferError:
+            pass
+
+
+def _attach(name):
+    try:
+        return _Segment(_segment_name(name), track=False)
+    except TypeError:
+        pass
+    segment = _Segment(_segment_name(name))
+    if os.name == "posix" and name not in _created:
+        # Before Python 3.13 attaching registers the segment with the resource
+        # tracker, which unlinks it when this process exits, taking the bus
+        # away from the daemon and every other consumer.
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+class FrameBusWriter:
+    """Publish frames on a shared memory frame bus.
+
+    The segment is created from the first frame written, whose image shapes
+    and calibration every later frame has to share.
+
+    Args:
+        name (str): Bus name consumers attach to with shm:<name>
+        slots (int): Frames kept in the ring. A consumer that reads without
+            copying has until the slot comes around again to use the frame.
+        serial (str): Serial number of the camera, published so consumers
+            can cache calibrations per camera
+    """
+
+    def __init__(self, name=DEFAULT_NAME, slots=16, serial=None):
+        self.name = name
+        self.slots = slots
+        self.serial = serial
+        self.count = 0
+        self._segment = None
+        self._header = None
+        self._ring = None
+
+    def _begin(self, frame):
+        depth_shape = None if frame.depth is None else frame.depth.shape
+        meta = json.dumps({
+            "color_shape": list(frame.color.shape),
+            "depth_shape": None if depth_shape is None else list(depth_shape),
+            "slots": self.slots,
+            "intrinsics": intrinsics_to_dict(frame.intrinsics),
+            "depth_intrinsics": intrinsics_to_dict(frame.depth_intrinsics),
+            "depth_scale": frame.depth_scale,
+            "serial": self.serial,
+        }).encode()
+        dtype = _slot_dtype(frame.color.shape, depth_shape)
+        offset = _align(HEADER_DTYPE.itemsize) + _align(len(meta))
+        try:
+            self._segment = _Segment(
+                _segment_name(self.name), create=True, size=offset + self.slots * dtype.itemsize)
+        except FileExistsError:
+            raise FileExistsError("Frame bus %r already exists, is another capture daemon "
+                                  "running?" % self.name) from None
+        _created.add(self.name)
+
+        buffer = self._segment.buf
+        start = _align(HEADER_DTYPE.itemsize)
+        buffer[start:start + len(meta)] = meta
+        self._ring = np.frombuffer(buffer, dtype, self.slots, offset)
+        self._ring["sequence"] = 0
+        self._header = np.frombuffer(buffer, HEADER_DTYPE, 1)
+        self._header[0] = (MAGIC, VERSION, len(meta), 0, -1, time.time())
+
+    def write(self, frame):
+        if self._segment is None:
+            self._begin(frame)
+        n = self.count
+        slot = n % self.slots
+        ring, header = self._ring, self._header
+
+        # Odd while the slot is inconsistent, see the module docstring.
+        ring["sequence"][slot] = 2 * n + 1
+        ring["color"][slot] = frame.color
+        if frame.depth is not None and "depth" in ring.dtype.names:
+            ring["depth"][slot] = frame.depth
+        ring["timestamp"][slot] = frame.timestamp
+        ring["index"][slot] = frame.index
+        ring["sequence"][slot] = 2 * n + 2
+
+        header["latest"] = n
+        header["written"] = time.time()
+        self.count += 1
+
+    def close(self):
+        """Tell the consumers the bus is closed and remove the segment."""
+        if self._segment is None:
+            return
+        self._header["closed"] = 1
+        self._ring = self._header = None
+        segment, self._segment = self._segment, None
+        segment.unlink()
+        _created.discard(self.name)
+        segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameBusSource(FrameSource):
+    """Frames from a shared memory frame bus published by FrameBusWriter.
+
+    read() returns the newest frame on the bus and waits for one when there is
+    nothing newer than the frame read last. Frames skipped in between are
+    counted in dropped.
+
+    Args:
+        name (str): Bus name
+        copy (boolean): Copy the pixels out of the bus. Without copying the
+            images are read only views into the ring, which stay valid until
+            the producer comes around to their slot again (see valid()).
+        timeout (float): Seconds without a new frame after which the daemon
+            is taken to be gone and read() returns None
+        poll (float): Seconds to sleep between checks for a new frame
+    """
+
+    def __init__(self, name=DEFAULT_NAME, copy=True, timeout=5.0, poll=0.001):
+        self.name = name
+        self.copy = copy
+        self.timeout = timeout
+        self.poll = poll
+        self.serial = None
+        self.has_depth = False
+        self._segment = None
+        self._header = None
+        self._ring = None
+        self._last = -1
+
+    def start(self):
+        self._segment = segment = _attach(self.name)
+        header = np.frombuffer(segment.buf, HEADER_DTYPE, 1)
+        if header["magic"][0] != MAGIC or header["version"][0] != VERSION:
+            segment.close()
+            raise ValueError("%r is not a version %d frame bus." % (self.name, VERSION))
+
+        start = _align(HEADER_DTYPE.itemsize)
+        meta_bytes = int(header["meta_bytes"][0])
+        meta = json.loads(bytes(segment.buf[start:start + meta_bytes]))
+        self.intrinsics = intrinsics_from_dict(meta["intrinsics"])
+        self.depth_intrinsics = intrinsics_from_dict(meta["depth_intrinsics"])
+        self.depth_scale = meta["depth_scale"]
+        self.serial = meta["serial"]
+        self.has_depth = meta["depth_shape"] is not None
+
+        ring = np.frombuffer(segment.buf, _slot_dtype(meta["color_shape"], meta["depth_shape"]),
+                             meta["slots"], start + _align(meta_bytes))
+        header.flags.writeable = ring.flags.writeable = False
+        self._header, self._ring = header, ring
+        self.slots = meta["slots"]
+        return self
+
+    def _try_read(self, n):
+        """Read frame n, or return None if its slot was (being) overwritten."""
+        slot = n % self.slots
+        ring = self._ring
+        sequence = 2 * n + 2
+        if ring["sequence"][slot] != sequence:
+            return None
+        color = ring["color"][slot]
+        depth = ring["depth"][slot] if self.has_depth else None
+        if self.copy:
+            color = color.copy()
+            depth = None if depth is None else depth.copy()
+        timestamp, index = float(ring["timestamp"][slot]), int(ring["index"][slot])
+        if ring["sequence"][slot] != sequence:
+            return None
+        return Frame(color, depth, self.intrinsics, self.depth_intrinsics, self.depth_scale,
+                     timestamp, index, n)
+
+    def read(self):
+        waited = time.monotonic()
+        while True:
+            latest = int(self._header["latest"][0])
+            if latest > self._last:
+                frame = self._try_read(latest)
+                if frame is None:
+                    # Overwritten while reading, a newer frame is out.
+                    continue
+                if self._last >= 0:
+                    self.dropped += latest - self._last - 1
+                self._last = latest
+                return frame
+            if self._header["closed"][0] or time.monotonic() - waited > self.timeout:
+                return None
+            time.sleep(self.poll)
+
+    def valid(self, frame):
+        """Whether a frame read without copying is still intact, i.e. its slot
+        has not been written again since. Check it after using the pixels.
+        Copied frames are always intact.
+        """
+        if self.copy:
+            return True
+        n = frame.raw
+        return int(self._ring["sequence"][n % self.slots]) == 2 * n + 2
+
+    def stop(self):
+        if self._segment is not None:
+            self._header = self._ring = None
+            self._segment.close()
+            self._segment = None
+
+
+def main():
+    """Capture daemon: open the camera once and publish its frames on a bus."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Publish camera frames on a shared memory \
+                                     frame bus that other tools read with --source shm[:name].")
+    parser.add_argument("--name", default=DEFAULT_NAME, help="bus name (default %s)" % DEFAULT_NAME)
+    parser.add_argument("--slots", default=16, type=int, help="frames kept in the ring \
+                        (default 16)")
+    parser.add_argument("--width", default=1280, type=int)
+    parser.add_argument("--height", default=720, type=int)
+    parser.add_argument("--fps", default=30, type=int)
+    parser.add_argument("--no-depth", action="store_true", help="only publish color")
+    parser.add_argument("--no-align", action="store_true", help="publish depth as \
+                        captured instead of aligned to color")
+    parser.add_argument("--stats", default=5.0, type=float, help="seconds between \
+                        printed frame rates, 0 for none")
+    add_source_arguments(parser)
+    args = parser.parse_args()
+    # Close the bus when stopped by a service manager as well as with Ctrl+C.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    source = source_from_args(args, args.width, args.height, args.fps, depth=not args.no_depth,
+                              align=not args.no_depth and not args.no_align)
+    writer = FrameBusWriter(args.name, args.slots, getattr(source, "serial", None))
+    print("Publishing %s on frame bus %r" % (args.source, args.name))
+    last_report, last_count = time.monotonic(), 0
+    try:
+        with writer:
+            for frame in source:
+                writer.write(frame)
+                now = time.monotonic()
+                if args.stats and now - last_report >= args.stats:
+                    print("%.1f fps, %d frames, %d dropped by the source"
+                          % ((writer.count - last_count) / (now - last_report), writer.count,
+                             source.dropped))
+                    last_report, last_count = now, writer.count
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.stop()
+
+
+if __name__ == "__main__":
+    main()
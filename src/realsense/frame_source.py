@@ -0,0 +1,463 @@
+import os
+import json
+import time
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+
+"""
+Frame sources shared by every script. The RealSense pipeline, a plain webcam and
+a recorded session on disk all hand out the same Frame object, so the processing
+code does not need to know where the pixels came from.
+"""
+
+
+# Mirrors the fields of pyrealsense2.intrinsics so existing code that reads
+# intr.fx, intr.ppx, intr.coeffs, ... keeps working on any source.
+Intrinsics = namedtuple("Intrinsics", ["width", "height", "fx", "fy", "ppx", "ppy",
+                                       "model", "coeffs"])
+
+
+def intrinsics_from_rs(intr):
+    """Convert a pyrealsense2 intrinsics object into an Intrinsics tuple.
+
+    Args:
+        intr (rs.intrinsics): Intrinsics of a RealSense video stream profile
+
+    Returns:
+        Intrinsics: Plain python copy of the intrinsics
+    """
+    return Intrinsics(intr.width, intr.height, intr.fx, intr.fy, intr.ppx, intr.ppy,
+                      str(intr.model).split(".")[-1], tuple(intr.coeffs))
+
+
+def intrinsics_to_dict(intr):
+    """Return a JSON friendly version of an Intrinsics tuple (or None)."""
+    if intr is None:
+        return None
+    data = intr._asdict()
+    data["coeffs"] = list(data["coeffs"])
+    return data
+
+
+def intrinsics_from_dict(data):
+    """Inverse of intrinsics_to_dict."""
+    if data is None:
+        return None
+    return Intrinsics(data["width"], data["height"], data["fx"], data["fy"],
+                      data["ppx"], data["ppy"], data.get("model", "none"),
+                      tuple(data.get("coeffs", (0, 0, 0, 0, 0))))
+
+
+class Frame:
+    """One color image with an optional depth image and its calibration.
+
+    Attributes:
+        color (ndarray): BGR image (H x W x 3, uint8)
+        depth (ndarray): Raw z16 depth image (H x W, uint16) or None
+        intrinsics (Intrinsics): Intrinsics of the color image or None
+        depth_intrinsics (Intrinsics): Intrinsics of the depth image or None
+        depth_scale (float): Meters per depth unit or None
+        timestamp (float): Capture time in seconds
+        index (int): Frame number reported by the source
+    """
+    __slots__ = ("color", "depth", "intrinsics", "depth_intrinsics", "depth_scale",
+                 "timestamp", "index", "raw")
+
+    def __init__(self, color, depth=None, intrinsics=None, depth_intrinsics=None,
+                 depth_scale=None, timestamp=None, index=0, raw=None):
+        self.color = color
+        self.depth = depth
+        self.intrinsics = intrinsics
+        self.depth_intrinsics = depth_intrinsics
+        self.depth_scale = depth_scale
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.index = index
+        # Keeps the underlying librealsense frameset alive while the numpy
+        # views above are in use.
+        self.raw = raw
+
+    def get_distance(self, x, y):
+        """Return the distance in meters at pixel (x, y) of the depth image,
+        like rs.depth_frame.get_distance.
+        """
+        if self.depth is None:
+            raise ValueError("Frame has no depth image.")
+        return float(self.depth[y, x]) * self.depth_scale
+
+
+class FrameSource:
+    """Base class for everything that produces Frames.
+
+    Subclasses implement read(), which blocks until the next frame is available
+    and returns None once the source is exhausted.
+    """
+    intrinsics = None
+    depth_intrinsics = None
+    depth_scale = None
+    # Frames the source knows it lost (skipped frame numbers, incomplete sets).
+    dropped = 0
+
+    def start(self):
+        return self
+
+    def read(self):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+    def valid(self, frame):
+        """Whether the pixels of a frame read earlier are still the ones that
+        were read. Only frames handed out as views into memory the source
+        reuses (the frame bus without copying) can go stale.
+        """
+        return True
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __iter__(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+
+class RealSenseSource(FrameSource):
+    """Frames from an Intel RealSense pipeline.
+
+    Args:
+        width (int): Stream width
+        height (int): Stream height
+        fps (int): Stream frame rate
+        depth (boolean): Also stream z16 depth
+        align (boolean): Align depth to the color image
+        serial (str): Only open the device with this serial number
+    """
+
+    def __init__(self, width=640, height=480, fps=30, depth=False, align=False,
+                 serial=None):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.depth = depth
+        self.align = align
+        self.serial = serial
+        self.pipeline = None
+        self._align = None
+        self._last_number = None
+
+    def start(self):
+        import pyrealsense2 as rs
+
+        self.pipeline = rs.pipeline()
+        config = rs.config()
+        if self.serial:
+            config.enable_device(self.serial)
+        config.enable_stream(rs.stream.color, self.width, self.height, rs.format.bgr8, self.fps)
+        if self.depth:
+            config.enable_stream(rs.stream.depth, self.width, self.height, rs.format.z16, self.fps)
+        profile = self.pipeline.start(config)
+
+        device = profile.get_device()
+        self.serial = device.get_info(rs.camera_info.serial_number)
+
+        # Calibration never changes while streaming so only read it once.
+        color_profile = profile.get_stream(rs.stream.color).as_video_stream_profile()
+        self.intrinsics = intrinsics_from_rs(color_profile.get_intrinsics())
+        if self.depth:
+            self.depth_scale = device.first_depth_sensor().get_depth_scale()
+            if self.align:
+                self._align = rs.align(rs.stream.color)
+                self.depth_intrinsics = self.intrinsics
+            else:
+                depth_profile = profile.get_stream(rs.stream.depth).as_video_stream_profile()
+                self.depth_intrinsics = intrinsics_from_rs(depth_profile.get_intrinsics())
+        return self
+
+    def read(self):
+        while True:
+            frames = self.pipeline.wait_for_frames()
+            if self._align is not None:
+                frames = self._align.process(frames)
+            color_frame = frames.get_color_frame()
+            depth_frame = frames.get_depth_frame() if self.depth else None
+            # Wait for a coherent pair of frames.
+            if not color_frame or (self.depth and not depth_frame):
+                self.dropped += 1
+                continue
+
+            number = frames.get_frame_number()
+            if self._last_number is not None and number > self._last_number + 1:
+                self.dropped += number - self._last_number - 1
+            self._last_number = number
+
+            return Frame(
+                np.asanyarray(color_frame.get_data()),
+                np.asanyarray(depth_frame.get_data()) if depth_frame else None,
+                self.intrinsics,
+                self.depth_intrinsics,
+                self.depth_scale,
+                frames.get_timestamp() / 1000.0,
+                number,
+                frames,
+            )
+
+    def stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+
+class WebcamSource(FrameSource):
+    """Frames from a cv2.VideoCapture device. Webcams have no depth and no
+    known intrinsics.
+
+    Args:
+        index (int): OpenCV camera index
+    """
+
+    def __init__(self, index=0):
+        self.index = index
+        self.capture = None
+        self._count = 0
+
+    def start(self):
+        self.capture = cv2.VideoCapture(self.index)
+        return self
+
+    def read(self):
+        ret, image = self.capture.read()
+        if not ret:
+            return None
+        self._count += 1
+        return Frame(image, index=self._count)
+
+    def stop(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+
+SESSION_FILE = "session.json"
+
+
+class SessionWriter:
+    """Write frames to a session directory that ReplaySource can play back.
+
+    Color frames are stored as PNG, depth frames as 16 bit PNG, and the
+    intrinsics, depth scale and timestamps go into session.json.
+
+    Args:
+        path (str): Directory to write the session into
+        intrinsics (Intrinsics): Color intrinsics
+        depth_scale (float): Meters per depth unit
+        depth_intrinsics (Intrinsics): Depth intrinsics
+    """
+
+    def __init__(self, path, intrinsics=None, depth_scale=None, depth_intrinsics=None):
+        self.path = path
+        self.intrinsics = intrinsics
+        self.depth_scale = depth_scale
+        self.depth_intrinsics = depth_intrinsics
+        self.timestamps = []
+        self.has_depth = False
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, frame):
+        i = len(self.timestamps)
+        cv2.imwrite(os.path.join(self.path, "%06d_color.png" % i), frame.color)
+        if frame.depth is not None:
+            cv2.imwrite(os.path.join(self.path, "%06d_depth.png" % i), frame.depth)
+            self.has_depth = True
+        if self.intrinsics is None:
+            self.intrinsics = frame.intrinsics
+            self.depth_intrinsics = frame.depth_intrinsics
+            self.depth_scale = frame.depth_scale
+        self.timestamps.append(frame.timestamp)
+
+    def close(self):
+        with open(os.path.join(self.path, SESSION_FILE), "w") as f:
+            json.dump({
+                "intrinsics": intrinsics_to_dict(self.intrinsics),
+                "depth_intrinsics": intrinsics_to_dict(self.depth_intrinsics),
+                "depth_scale": self.depth_scale,
+                "depth": self.has_depth,
+                "timestamps": self.timestamps,
+            }, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplaySource(FrameSource):
+    """Play back a session directory written by SessionWriter.
+
+    Args:
+        path (str): Session directory
+        realtime (boolean): Pace frames at their recorded timestamps. When
+            false frames are returned as fast as they can be read, which is
+            what you want when measuring processing throughput.
+        loop (boolean): Start over at the end instead of returning None
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+
+        with open(os.path.join(path, SESSION_FILE)) as f:
+            session = json.load(f)
+        self.intrinsics = intrinsics_from_dict(session["intrinsics"])
+        self.depth_intrinsics = intrinsics_from_dict(session.get("depth_intrinsics"))
+        self.depth_scale = session.get("depth_scale")
+        self.has_depth = session.get("depth", False)
+        self.timestamps = session["timestamps"]
+        self.position = 0
+        self._clock_start = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def seek(self, position):
+        self.position = position
+        self._clock_start = None
+
+    def read(self):
+        if self.position >= len(self.timestamps):
+            if not self.loop or not len(self):
+                return None
+            self.seek(0)
+
+        i = self.position
+        self.position += 1
+
+        if self.realtime:
+            now = time.perf_counter()
+            if self._clock_start is None:
+                self._clock_start = now - (self.timestamps[i] - self.timestamps[0])
+            delay = self._clock_start + (self.timestamps[i] - self.timestamps[0]) - now
+            if delay > 0:
+                time.sleep(delay)
+
+        return self._load(i)
+
+    def _load(self, i):
+        color = cv2.imread(os.path.join(self.path, "%06d_color.png" % i), cv2.IMREAD_COLOR)
+        depth = None
+        if self.has_depth:
+            depth = cv2.imread(os.path.join(self.path, "%06d_depth.png" % i), cv2.IMREAD_UNCHANGED)
+        return Frame(color, depth, self.intrinsics, self.depth_intrinsics, self.depth_scale,
+                     self.timestamps[i], i)
+
+
+def open_source(spec, width=640, height=480, fps=30, depth=False, align=False,
+                realtime=True, loop=False):
+    """Create a frame source from a short description.
+
+    Args:
+        spec (str): "realsense", "realsense:<serial>", "webcam", "webcam:<index>",
+            "shm" or "shm:<name>" for a frame bus published by the capture
+            daemon (frame_bus.py), with "?nocopy" appended to read it
+            without copying, or the path of a recorded session or chunked
+            recording
+        width (int): Stream width (RealSense only)
+        height (int): Stream height (RealSense only)
+        fps (int): Stream frame rate (RealSense only)
+        depth (boolean): Stream depth as well (RealSense only)
+        align (boolean): Align depth to color (RealSense only)
+        realtime (boolean): Pace replayed frames at the recorded rate
+        loop (boolean): Loop replayed sessions
+
+    Returns:
+        FrameSource: A started frame source
+    """
+    base, _, option = spec.partition("?")
+    kind, _, arg = base.partition(":")
+    if kind == "realsense":
+        source = RealSenseSource(width, height, fps, depth, align, serial=arg or None)
+    elif kind == "webcam":
+        source = WebcamSource(int(arg) if arg else 0)
+    elif kind == "shm":
+        from .frame_bus import DEFAULT_NAME, FrameBusSource
+        if option not in ("", "nocopy"):
+            raise ValueError("Unknown frame bus option %r, the only one is nocopy." % option)
+        source = FrameBusSource(arg or DEFAULT_NAME, copy=option != "nocopy").start()
+        # The daemon decides what is captured, so only check it is enough.
+        if (depth and not source.has_depth) or (
+                align and source.has_depth and source.depth_intrinsics != source.intrinsics):
+            source.stop()
+            raise ValueError("Frame bus %r has no%s depth, restart the daemon with it."
+                             % (source.name, " aligned" if source.has_depth else ""))
+        return source
+    else:
+        from .recording import RecordingSource, is_recording
+        if is_recording(spec):
+            source = RecordingSource(spec, realtime=realtime, loop=loop)
+        else:
+            source = ReplaySource(spec, realtime=realtime, loop=loop)
+    return source.start()
+
+
+def add_source_arguments(parser, default="realsense"):
+    """Add the --source/--fast/--loop options understood by source_from_args."""
+    parser.add_argument("--source", default=default, help="realsense[:serial], \
+                        webcam[:index], shm[:bus name][?nocopy] or the path of a recorded session")
+    parser.add_argument("--fast", action="store_true", help="replay recorded \
+                        sessions as fast as possible instead of in real time")
+    parser.add_argument("--loop", action="store_true", help="loop recorded sessions")
+
+
+def source_from_args(args, width=640, height=480, fps=30, depth=False, align=False):
+    """Open the frame source selected on the command line."""
+    return open_source(args.source, width, height, fps, depth, align,
+                       realtime=not args.fast, loop=args.loop)
+
+
+def main():
+    """Record a session that can be replayed with --source <path>."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Record a color+depth session that \
+                                     can be replayed with --source <path>.")
+    parser.add_argument("path", help="directory to write the session into")
+    parser.add_argument("-n", "--frames", default=300, type=int, help="number of frames")
+    parser.add_argument("--no-depth", action="store_true", help="only record color")
+    parser.add_argument("--chunked", action="store_true", help="write a memory mapped \
+                        chunked recording instead of PNG files")
+    parser.add_argument("--width", default=640, type=int)
+    parser.add_argument("--height", default=480, type=int)
+    add_source_arguments(parser)
+    args = parser.parse_args()
+
+    source = source_from_args(args, args.width, args.height, depth=not args.no_depth)
+    if args.chunked:
+        from .recording import RecordingWriter
+        writer = RecordingWriter(args.path)
+    else:
+        writer = SessionWriter(args.path)
+    recorded = 0
+    try:
+        with writer:
+            for frame in source:
+                writer.write(frame)
+                recorded += 1
+                if recorded == args.frames:
+                    break
+    finally:
+        source.stop()
+    print("Recorded %d frames to %s" % (recorded, args.path))
+
+
+if __name__ == "__main__":
+    main()
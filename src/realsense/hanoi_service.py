@@ -0,0 +1,378 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+from collections import Counter, deque
+
+import cv2
+
+from .apriltag_detect import AprilTagTracker, DetectionError, get_rod
+from .calibration import (add_calibration_arguments, calibration_from_args, load_or_calibrate,
+                         verifier_from_args)
+from .frame_source import add_source_arguments, source_from_args
+from .metrics import NULL_METRICS, add_metrics_arguments, metrics_from_args
+from .motion import add_motion_arguments, motion_gate_from_args
+
+
+"""
+Hanoi state service. Instead of printing the tower state every frame, the
+state is debounced over a few frames and only published when it changes.
+Events are JSON lines sent to every program connected to a Unix domain socket
+(or a TCP port), so any number of consumers can follow the tower without each
+of them opening the camera.
+
+Event fields:
+    type: "state" for a change, "snapshot" for the state sent on connect
+    seq: Number of the event, increases by one per change
+    timestamp: Capture time of the frame that completed the change
+    time: Wall clock time the event was made
+    state: Rings on each rod, in the order of get_hanoi_tower
+    previous: State before the change
+    moved: Rings whose rod changed
+    confidence: Per ring fraction of the last frames agreeing with its rod
+    missed: Events this subscriber skipped because it read too slowly
+"""
+
+
+class HanoiStateFilter:
+    """Debounce per frame ring locations into a stable tower state.
+
+    A ring's rod is the rod it was seen on in most of the last window frames.
+    It only moves to another rod once that rod wins at least min_confidence of
+    the window, so a misdetection or a hand passing by doesn't make the state
+    flicker. A ring that disappears stays on its last rod.
+
+    Args:
+        rings (int): Amount of rings
+        window (int): Number of frames the state is debounced over
+        min_confidence (float): Fraction of the window a new rod must win
+    """
+
+    def __init__(self, rings, window=5, min_confidence=0.6):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.rings = rings
+        self.window = window
+        self.min_confidence = min_confidence
+        self.rods = [None] * rings
+        self.confidence = [0.0] * rings
+        self.state = [[], [], []]
+        self.seq = 0
+        self.last_event = None
+        self._heights = [0.0] * rings
+        self._history = deque(maxlen=window)
+
+    def update(self, locations, left_boundary, right_boundary, timestamp=None):
+        """Add the ring locations of one frame.
+
+        Args:
+            locations (List): (x, y, z) of rings 1 to n, None for each ring not
+                seen, as returned by AprilTagTracker.get_ring_locations
+            left_boundary (double): x value which separates rod 1 and rod 2
+            right_boundary (double): x value which separates rod 3 and rod 2
+            timestamp (float): Capture time of the frame
+
+        Returns:
+            dict: Change event if the debounced state changed, otherwise None
+        """
+        self._history.append([
+            None if loc is None else (get_rod(loc[0], left_boundary, right_boundary), loc[1])
+            for loc in locations])
+
+        rods = list(self.rods)
+        for ring in range(self.rings):
+            seen = [frame[ring] for frame in self._history if frame[ring] is not None]
+            votes = Counter(rod for rod, _ in seen)
+            if votes:
+                rod, count = votes.most_common(1)[0]
+                if rod != rods[ring] and count >= self.min_confidence * self.window:
+                    rods[ring] = rod
+            rod = rods[ring]
+            self.confidence[ring] = votes[rod] / self.window if rod is not None else 0.0
+
+            # Order rings by their average height on their rod, keeping the
+            # last known height while a ring is hidden.
+            heights = [y for on, y in seen if on == rod]
+            if heights:
+                self._heights[ring] = sum(heights) / len(heights)
+
+        state = [[], [], []]
+        for ring in sorted(range(self.rings), key=lambda ring: self._heights[ring], reverse=True):
+            if rods[ring] is not None:
+                state[rods[ring]].append(ring + 1)
+
+        moved = [ring + 1 for ring in range(self.rings) if rods[ring] != self.rods[ring]]
+        self.rods = rods
+        if state == self.state:
+            return None
+
+        self.seq += 1
+        self.last_event = {
+            "type": "state",
+            "seq": self.seq,
+            "timestamp": timestamp,
+            "time": time.time(),
+            "state": state,
+            "previous": self.state,
+            "moved": moved,
+            "confidence": [round(c, 3) for c in self.confidence],
+        }
+        self.state = state
+        return self.last_event
+
+
+class _Subscriber:
+    """Bounded event queue of one connection. When full, the oldest event is
+    dropped: every event carries the whole state, so the newest one is all a
+    slow reader needs to catch up.
+    """
+
+    def __init__(self, size):
+        self.events = deque(maxlen=size)
+        self.ready = asyncio.Event()
+        self.missed = 0
+
+    def push(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.missed += 1
+        self.events.append(event)
+        self.ready.set()
+
+    async def pop(self):
+        while not self.events:
+            self.ready.clear()
+            await self.ready.wait()
+        event = self.events.popleft()
+        if self.missed:
+            event = dict(event, missed=self.missed)
+            self.missed = 0
+        return event
+
+
+class HanoiStateServer:
+    """Publish Hanoi state events as JSON lines to local subscribers.
+
+    A subscriber gets the current state as soon as it connects and then one
+    line per change. Each subscriber has its own queue of queue_size events
+    and its own writer, so a slow subscriber only delays (and drops) its own
+    events and never the camera loop or the other subscribers.
+
+    Args:
+        path (str): Unix domain socket to listen on
+        host (str): Host to listen on instead of a Unix socket
+        port (int): TCP port to listen on instead of a Unix socket
+        queue_size (int): Events kept for each subscriber that falls behind
+        metrics (Metrics): Where to count subscribers and dropped events
+    """
+
+    def __init__(self, path=None, host="127.0.0.1", port=None, queue_size=16,
+                 metrics=NULL_METRICS):
+        if path is None and port is None:
+            raise ValueError("Give a socket path or a port to listen on")
+        self.path = path
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.metrics = metrics
+        self.snapshot = None
+        self._subscribers = set()
+        self._server = None
+
+    async def start(self):
+        if self.path is not None:
+            # A socket file left behind by a previous run blocks the bind.
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        else:
+            self._server = await asyncio.start_server(self._serve, self.host, self.port)
+
+    def publish(self, event):
+        """Queue event for every subscriber. Call from the event loop thread,
+        e.g. through loop.call_soon_threadsafe.
+        """
+        self.snapshot = event
+        for subscriber in self._subscribers:
+            dropped = subscriber.missed
+            subscriber.push(event)
+            if subscriber.missed != dropped:
+                self.metrics.incr("events_dropped")
+        self.metrics.incr("state_changes")
+
+    async def _send(self, subscriber, writer):
+        while True:
+            event = await subscriber.pop()
+            writer.write(json.dumps(event).encode() + b"\n")
+            # Waits while the subscriber's socket buffer is full; meanwhile its
+            # queue fills up and drops the oldest events.
+            await writer.drain()
+
+    async def _serve(self, reader, writer):
+        subscriber = _Subscriber(self.queue_size)
+        if self.snapshot is not None:
+            subscriber.push(dict(self.snapshot, type="snapshot"))
+        self._subscribers.add(subscriber)
+        self.metrics.set("subscribers", len(self._subscribers))
+
+        # Subscribers never send anything, so the read only returns when
+        # they disconnect.
+        tasks = [asyncio.ensure_future(self._send(subscriber, writer)),
+                 asyncio.ensure_future(reader.read())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._subscribers.discard(subscriber)
+            self.metrics.set("subscribers", len(self._subscribers))
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+async def subscribe(path=None, host="127.0.0.1", port=None):
+    """Yield the events of a running HanoiStateServer.
+
+    Args:
+        path (str): Unix domain socket of the server
+        host (str): Host of the server when using TCP
+        port (int): TCP port of the server
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            yield json.loads(line)
+    finally:
+        writer.close()
+
+
+async def serve(tracker, server, state_filter, boundaries, headless=True, echo=False,
+                metrics=NULL_METRICS, verifier=None):
+    """Detect the tower on a worker thread and publish every change until the
+    source runs out or the task is cancelled.
+
+    Args:
+        tracker (AprilTagTracker): Tracker reading from the camera
+        server (HanoiStateServer): Server to publish the changes on
+        state_filter (HanoiStateFilter): Debounces the per frame states
+        boundaries (Tuple): x values of the left and right dividers
+        headless (boolean): Hide debug image if true
+        echo (boolean): Also print every change
+        metrics (Metrics): Where to record timing spans
+        verifier (DividerVerifier): Checks the dividers in the background and
+            replaces boundaries when they moved
+    """
+    loop = asyncio.get_running_loop()
+    stop = threading.Event()
+
+    def detect_loop():
+        nonlocal boundaries
+        while not stop.is_set():
+            with metrics.span("capture"):
+                frame = tracker.source.read()
+            if frame is None:
+                break
+            if verifier is not None:
+                verifier.offer(frame)
+                boundaries = verifier.poll() or boundaries
+            locations = tracker.get_ring_locations(state_filter.rings, headless, frame)
+            event = state_filter.update(locations, *boundaries, timestamp=frame.timestamp)
+            if event is not None:
+                loop.call_soon_threadsafe(server.publish, event)
+                if echo:
+                    print(event["state"])
+            metrics.set("dropped_frames", tracker.source.dropped)
+            metrics.end_frame()
+
+    await server.start()
+    try:
+        await loop.run_in_executor(None, detect_loop)
+    finally:
+        stop.set()
+        await server.close()
+
+
+def main():
+    """Run the hanoi state service until interrupted."""
+    parser = argparse.ArgumentParser(description="Publish the state of a hanoi tower \
+                                     to local subscribers whenever it changes.")
+    parser.add_argument("n", type=int, help="amount of rings")
+    parser.add_argument("--debug", action="store_true", help="enable debug mode")
+    parser.add_argument("--socket", default="/tmp/hanoi.sock", help="Unix domain \
+                        socket to publish on (default /tmp/hanoi.sock)")
+    parser.add_argument("--port", type=int, help="publish on this TCP port of \
+                        localhost instead of a Unix socket")
+    parser.add_argument("--window", default=5, type=int, help="frames the state is \
+                        debounced over")
+    parser.add_argument("--min-confidence", default=0.6, type=float, help="fraction \
+                        of the window a ring must be seen on a new rod before it moves")
+    parser.add_argument("--queue-size", default=16, type=int, help="events kept for \
+                        a subscriber that reads too slowly")
+    parser.add_argument("--print", action="store_true", help="also print every change")
+    parser.add_argument("--undistort", default="remap", choices=["remap", "points"],
+                        help="undistort the whole image or only the detected corners")
+    parser.add_argument("--incremental", action="store_true", help="only search around \
+                        the tags of the last frame")
+    parser.add_argument("--depth", action="store_true", help="measure tag positions \
+                        in meters with the aligned depth stream")
+    add_source_arguments(parser)
+    add_metrics_arguments(parser)
+    add_calibration_arguments(parser)
+    add_motion_arguments(parser)
+    args = parser.parse_args()
+    metrics = metrics_from_args(args)
+
+    source = source_from_args(args, 1280, 720, depth=args.depth, align=args.depth)
+    tracker = AprilTagTracker(source, args.undistort, metrics, args.incremental,
+                              fuse_depth=args.depth, motion_gate=motion_gate_from_args(args))
+    store = calibration_from_args(args)
+
+    calibration = None
+    try:
+        boundaries, calibration = load_or_calibrate(tracker, store)
+    except Exception as e:
+        if not args.debug:
+            raise DetectionError(e)
+        boundaries = (0, 0)
+        print("Error: ", e)
+        print("Continuing with boundaries set to 0...")
+
+    verifier = None
+    if boundaries[0] != boundaries[1]:
+        verifier = verifier_from_args(args, AprilTagTracker(source, args.undistort,
+                                                            fuse_depth=args.depth),
+                                      boundaries, store, calibration, metrics=metrics)
+
+    server = HanoiStateServer(None if args.port else args.socket, port=args.port,
+                              queue_size=args.queue_size, metrics=metrics)
+    state_filter = HanoiStateFilter(args.n, args.window, args.min_confidence)
+    try:
+        asyncio.run(serve(tracker, server, state_filter, boundaries, not args.debug,
+                          args.print, metrics, verifier))
+    except KeyboardInterrupt:
+        print("\nCtrl+C detected. Exiting...")
+
+    if verifier is not None:
+        verifier.stop()
+
+    source.stop()
+    metrics.close()
+    cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
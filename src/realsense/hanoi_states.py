@@ -0,0 +1,70 @@
+import numpy as np
+
+
+"""
+Vectorized Hanoi state reconstruction for recorded timelines. get_hanoi_tower
+builds the state of one frame with Python lists; hanoi_states builds the
+states of any number of frames at once, for any number of rods, with one
+searchsorted for the rods and one lexsort for the order on every rod.
+"""
+
+
+def hanoi_states(positions, boundaries):
+    """Compute the tower state of every frame.
+
+    Args:
+        positions (ndarray): frames x rings x 3 average (x, y, z) of every
+            ring, in the order of ID, NaN for rings not seen in a frame
+        boundaries (List): Sorted x values separating the rods, one less
+            than the number of rods (the two divider x values for three rods)
+
+    Returns:
+        ndarray: frames x rods x rings int16 array. states[f, rod] holds the
+            IDs of the rings on rod in frame f in the order of
+            get_hanoi_tower, followed by zeros.
+    """
+    positions = np.asarray(positions, np.float64)
+    boundaries = np.asarray(boundaries, np.float64)
+    frames, rings = positions.shape[:2]
+    rods = len(boundaries) + 1
+
+    x, y = positions[..., 0].ravel(), positions[..., 1].ravel()
+    seen = ~np.isnan(x)
+    # Like get_rod, a ring right on a divider counts as on the middle rod: the
+    # first divider belongs to the rod on its right, the last one to the rod
+    # on its left.
+    rod = np.searchsorted(boundaries, x, side="right").astype(np.int64)
+    if len(boundaries) > 1:
+        rod -= x == boundaries[-1]
+    frame = np.repeat(np.arange(frames), rings)
+    ring = np.tile(np.arange(rings), frames)
+
+    # Order by frame, then rod, then height (highest y first, like
+    # get_hanoi_tower), then ID. Unseen rings go to a rod of their own.
+    rod[~seen] = rods
+    order = np.lexsort((ring, -np.nan_to_num(y), rod, frame))
+    group = (frame * (rods + 1) + rod)[order]
+
+    # Level of every ring on its rod is its distance from the group start.
+    level = np.arange(group.size) - np.searchsorted(group, group)
+
+    keep = seen[order]
+    states = np.zeros((frames, rods, rings), np.int16)
+    states[frame[order][keep], rod[order][keep], level[keep]] = ring[order][keep] + 1
+    return states
+
+
+def state_lists(state):
+    """Convert one frame of hanoi_states into the lists of get_hanoi_tower."""
+    return [[int(ring) for ring in rod if ring] for rod in state]
+
+
+def state_changes(states):
+    """Return the index of every frame whose state differs from the frame
+    before it, starting with frame 0.
+    """
+    states = np.asarray(states)
+    if not len(states):
+        return np.zeros(0, np.int64)
+    changed = (states[1:] != states[:-1]).reshape(len(states) - 1, -1).any(axis=1)
+    return np.concatenate(([0], np.flatnonzero(changed) + 1))
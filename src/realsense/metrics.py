@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import threading
+
+
+"""
+Lightweight hot path instrumentation. Code wraps its stages in timing spans
+and bumps counters; once per frame the spans are written as one JSON line, and
+every few seconds the running totals are written to a Prometheus text file
+(for node_exporter's textfile collector or anything that scrapes it).
+
+When no output is configured the NULL_METRICS object is used instead. Its
+spans and counters do nothing, so instrumented code costs next to nothing
+with instrumentation switched off.
+"""
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add(self.name, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Collect per frame timing spans and counters.
+
+    Args:
+        jsonl_path (str): Append one JSON line per frame to this file
+        prom_path (str): Keep Prometheus text format totals in this file
+        prom_every (float): Seconds between rewrites of the Prometheus file
+        prefix (str): Prefix of the Prometheus metric names
+    """
+    enabled = True
+
+    def __init__(self, jsonl_path=None, prom_path=None, prom_every=5.0, prefix="realsense"):
+        self.prom_path = prom_path
+        self.prom_every = prom_every
+        self.prefix = prefix
+        self.frames = 0
+        self.counters = {}
+        self.totals = {}
+        self._frame_spans = {}
+        self._lock = threading.Lock()
+        self._last_prom = time.monotonic()
+        self._jsonl = open(jsonl_path, "a", buffering=1 << 16) if jsonl_path else None
+
+    def span(self, name):
+        """Time a with block under name."""
+        return _Span(self, name)
+
+    def add(self, name, seconds):
+        """Record seconds spent in span name."""
+        with self._lock:
+            self._frame_spans[name] = self._frame_spans.get(name, 0.0) + seconds
+            total = self.totals.get(name)
+            if total is None:
+                self.totals[name] = [1, seconds, seconds]
+            else:
+                total[0] += 1
+                total[1] += seconds
+                if seconds > total[2]:
+                    total[2] = seconds
+
+    def incr(self, name, amount=1):
+        """Increase counter name."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name, value):
+        """Set counter name to a running total kept elsewhere."""
+        with self._lock:
+            self.counters[name] = value
+
+    def end_frame(self, **fields):
+        """Write the spans of the current frame and start the next one.
+
+        Args:
+            **fields: Extra values stored in the frame's JSON line
+        """
+        with self._lock:
+            spans, self._frame_spans = self._frame_spans, {}
+            self.frames += 1
+            if self._jsonl is not None:
+                record = {"t": time.time(), "frame": self.frames,
+                          "ms": {name: round(s * 1000.0, 3) for name, s in spans.items()}}
+                if fields:
+                    record.update(fields)
+                if self.counters:
+                    record["counters"] = dict(self.counters)
+                self._jsonl.write(json.dumps(record) + "\n")
+
+        if self.prom_path and time.monotonic() - self._last_prom >= self.prom_every:
+            self.write_prometheus()
+
+    def prometheus_text(self):
+        """Return the running totals in Prometheus text exposition format."""
+        p = self.prefix
+        with self._lock:
+            totals = {name: list(total) for name, total in self.totals.items()}
+            counters = dict(self.counters)
+            frames = self.frames
+
+        lines = ["# TYPE %s_frames_total counter" % p, "%s_frames_total %d" % (p, frames)]
+        if totals:
+            lines.append("# TYPE %s_span_seconds summary" % p)
+            for name, (count, total, _) in sorted(totals.items()):
+                lines.append('%s_span_seconds_sum{span="%s"} %.9f' % (p, name, total))
+                lines.append('%s_span_seconds_count{span="%s"} %d' % (p, name, count))
+            lines.append("# TYPE %s_span_seconds_max gauge" % p)
+            for name, (_, _, peak) in sorted(totals.items()):
+                lines.append('%s_span_seconds_max{span="%s"} %.9f' % (p, name, peak))
+        if counters:
+            lines.append("# TYPE %s_events_total counter" % p)
+            for name, value in sorted(counters.items()):
+                lines.append('%s_events_total{event="%s"} %d' % (p, name, value))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        """Rewrite the Prometheus file atomically."""
+        self._last_prom = time.monotonic()
+        tmp = self.prom_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, self.prom_path)
+
+    def close(self):
+        if self.prom_path:
+            self.write_prometheus()
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullMetrics:
+    """Metrics that record nothing, used when instrumentation is off."""
+    enabled = False
+    _span = _NullSpan()
+
+    def span(self, name):
+        return self._span
+
+    def add(self, name, seconds):
+        pass
+
+    def incr(self, name, amount=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def end_frame(self, **fields):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def add_metrics_arguments(parser):
+    """Add the --metrics-jsonl/--metrics-prom options understood by metrics_from_args."""
+    parser.add_argument("--metrics-jsonl", help="append per frame timings to this \
+                        JSON lines file")
+    parser.add_argument("--metrics-prom", help="keep Prometheus text format totals \
+                        in this file")
+
+
+def metrics_from_args(args):
+    """Return Metrics for the outputs given on the command line, or
+    NULL_METRICS when there are none.
+    """
+    if not args.metrics_jsonl and not args.metrics_prom:
+        return NULL_METRICS
+    return Metrics(args.metrics_jsonl, args.metrics_prom)
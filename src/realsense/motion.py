@@ -0,0 +1,161 @@
+import cv2
+
+
+"""
+Motion gate for the detection loops. Between moves the Hanoi rig and the
+colored objects sit still, so detecting every frame mostly recomputes the
+last result. The gate compares a heavily downsampled grayscale copy of each
+frame with the one detection last ran on and tells the loop whether nothing
+changed (reuse the last result), which regions changed (detect only there) or
+that the whole frame has to be detected (first frame, too much changed, or the
+result got older than max_stale frames).
+"""
+
+
+def rects_overlap(a, b):
+    """Whether two (x0, y0, x1, y1) rectangles overlap."""
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def merge_rects(rects):
+    """Merge overlapping (x0, y0, x1, y1) rectangles until none overlap.
+
+    Args:
+        rects (List): Rectangles as lists of four ints
+
+    Returns:
+        List: Non-overlapping rectangles covering the same pixels
+    """
+    rects = [list(rect) for rect in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if rects_overlap(a, b):
+                    rects[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+class MotionGate:
+    """Decide per frame how much of it needs detecting.
+
+    Args:
+        scale (int): Compare images this many times smaller than the frame
+        threshold (int): Gray level change (0-255) of a downsampled pixel
+            that counts as motion
+        min_pixels (int): Changed downsampled pixels a region needs, smaller
+            ones are noise
+        padding (int): Pixels added around every changed region
+        max_stale (int): Frames after which the whole frame is detected again
+            even if nothing changed
+        max_dirty (float): Fraction of the image that may change before the
+            whole frame is detected instead of the changed regions
+
+    Attributes:
+        skipped (int): Frames nothing changed in
+        partial (int): Frames only some regions changed in
+        full (int): Frames detected completely
+    """
+
+    def __init__(self, scale=8, threshold=12, min_pixels=2, padding=24, max_stale=30,
+                 max_dirty=0.5):
+        self.scale = scale
+        self.threshold = threshold
+        self.min_pixels = min_pixels
+        self.padding = padding
+        self.max_stale = max_stale
+        self.max_dirty = max_dirty
+        self.skipped = 0
+        self.partial = 0
+        self.full = 0
+        self._reference = None
+        self._stale = 0
+
+    def reset(self):
+        """Detect the whole next frame."""
+        self._reference = None
+
+    def _small(self, image):
+        height, width = image.shape[:2]
+        small = cv2.resize(image, (max(width // self.scale, 1), max(height // self.scale, 1)),
+                           interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def update(self, image):
+        """Compare image with the image detection last ran on. Whatever is
+        returned for detecting becomes the new reference there, so changes
+        too small to count keep adding up until they do.
+
+        Args:
+            image (ndarray): Color or grayscale frame
+
+        Returns:
+            List: None if nothing changed and the last result still holds,
+                otherwise the [x0, y0, x1, y1] rectangles to detect in; a
+                single rectangle covering the image to detect everything
+        """
+        height, width = image.shape[:2]
+        small = self._small(image)
+        self._stale += 1
+        if (self._reference is None or self._reference.shape != small.shape
+                or self._stale > self.max_stale):
+            return self._full(small, width, height)
+
+        _, mask = cv2.threshold(cv2.absdiff(small, self._reference), self.threshold, 255,
+                                cv2.THRESH_BINARY)
+        if cv2.countNonZero(mask) > self.max_dirty * mask.size:
+            return self._full(small, width, height)
+
+        # Scale of a downsampled pixel in the frame.
+        sx, sy = width / small.shape[1], height / small.shape[0]
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        rects = []
+        for x, y, w, h, area in stats[1:]:
+            if area < self.min_pixels:
+                continue
+            rects.append([max(int(x * sx) - self.padding, 0), max(int(y * sy) - self.padding, 0),
+                          min(int((x + w) * sx) + self.padding, width),
+                          min(int((y + h) * sy) + self.padding, height)])
+        if not rects:
+            self.skipped += 1
+            return None
+
+        rects = merge_rects(rects)
+        for x0, y0, x1, y1 in rects:
+            sx0, sy0 = int(x0 / sx), int(y0 / sy)
+            sx1, sy1 = int(-(-x1 // sx)), int(-(-y1 // sy))
+            self._reference[sy0:sy1, sx0:sx1] = small[sy0:sy1, sx0:sx1]
+        self.partial += 1
+        return rects
+
+    def _full(self, small, width, height):
+        self._reference = small
+        self._stale = 0
+        self.full += 1
+        return [[0, 0, width, height]]
+
+
+def add_motion_arguments(parser):
+    """Add the --motion-gate options understood by motion_gate_from_args."""
+    parser.add_argument("--motion-gate", action="store_true", help="skip detection \
+                        while the scene is still and only detect where it changed")
+    parser.add_argument("--motion-threshold", default=12, type=int, help="gray level \
+                        change that counts as motion (default 12)")
+    parser.add_argument("--max-stale", default=30, type=int, help="frames between full \
+                        detections with --motion-gate (default 30)")
+
+
+def motion_gate_from_args(args):
+    """Return the MotionGate selected on the command line, or None."""
+    if not args.motion_gate:
+        return None
+    return MotionGate(threshold=args.motion_threshold, max_stale=args.max_stale)
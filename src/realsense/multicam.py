@@ -0,0 +1,509 @@
+import os
+import json
+import time
+import queue
+import signal
+import asyncio
+import argparse
+import threading
+import multiprocessing
+from collections import deque, namedtuple
+
+from .apriltag_detect import get_rod
+from .frame_source import open_source
+from .hanoi_service import HanoiStateFilter, HanoiStateServer
+from .metrics import NULL_METRICS, add_metrics_arguments, metrics_from_args
+
+
+"""
+Multi-camera Hanoi tracking. Every camera gets a worker process that opens its
+source (realsense:<serial>, a frame bus or a recording), calibrates its own
+dividers (from the calibration cache when it can) and runs the AprilTag
+tracker. Workers only send the ring locations of each frame back, so the
+cameras scale with the cores of the host; the parent process just groups and
+fuses those small results.
+
+Cameras see the rig from different places, so each worker converts its ring
+locations to rod coordinates first: x is 0 at the first divider and 1 at the
+second (a camera behind the rig, with reversed dividers, is mirrored by this),
+and y is the height below the dividers in divider spacings. The FrameAligner
+groups the frames of all cameras taken within max_skew of each other, and in
+each group a ring is placed on the rod most cameras see it on and at the
+average of their positions. A ring hidden from one camera is taken from the
+others, and the fused locations go through the HanoiStateFilter like the
+locations of a single camera.
+
+Frames are matched by their capture timestamps, so the cameras must share a
+clock: RealSense devices report host synchronized (global) timestamps, and
+sessions recorded at the same time keep them.
+"""
+
+
+# Rings of one group of frames in rod coordinates. locations holds the fused
+# (x, y) of every ring, None for rings no camera saw, views the number of
+# cameras that saw each ring, cameras the cameras in the group and skew the
+# spread of their timestamps.
+FusedFrame = namedtuple("FusedFrame", ["timestamp", "locations", "views", "cameras", "skew"])
+
+
+def to_rod_coordinates(locations, boundaries, base=0.0):
+    """Convert the ring locations of one camera to rod coordinates.
+
+    Args:
+        locations (List): (x, y, z) of rings 1 to n, None for each ring not
+            seen, as returned by AprilTagTracker.get_tower_locations
+        boundaries (Tuple): x of the dividers, reversed for a camera behind
+            the rig
+        base (float): y of the dividers
+
+    Returns:
+        List: (x, y) rod coordinates of every ring or None
+    """
+    left, right = boundaries
+    span = right - left
+    return [None if loc is None else ((loc[0] - left) / span, (loc[1] - base) / abs(span))
+            for loc in locations]
+
+
+def fuse_observations(observations, rings):
+    """Fuse the rod coordinates of one group of frames.
+
+    A ring goes on the rod most cameras see it on. A tie goes to the rod with
+    the observation farthest from a divider, which is the least ambiguous.
+
+    Args:
+        observations (List): Rod coordinates of each camera in the group
+        rings (int): Amount of rings
+
+    Returns:
+        Tuple: Fused (x, y) of every ring or None, and the number of cameras
+            that saw each ring
+    """
+    locations, views = [], []
+    for ring in range(rings):
+        by_rod = {}
+        for coords in observations:
+            if coords[ring] is not None:
+                by_rod.setdefault(get_rod(coords[ring][0], 0.0, 1.0), []).append(coords[ring])
+        if not by_rod:
+            locations.append(None)
+            views.append(0)
+            continue
+        rod = max(by_rod, key=lambda rod: (len(by_rod[rod]),
+                                           max(min(abs(x), abs(x - 1)) for x, _ in by_rod[rod])))
+        agree = by_rod[rod]
+        locations.append((sum(x for x, _ in agree) / len(agree),
+                          sum(y for _, y in agree) / len(agree)))
+        views.append(sum(len(seen) for seen in by_rod.values()))
+    return locations, views
+
+
+class FrameAligner:
+    """Group the frames of several cameras taken at about the same time.
+
+    Each camera's frames queue up until every camera that is still running has
+    one. The newest of the oldest frames is the pivot, and every camera
+    contributes its frame closest to the pivot within max_skew. Frames that
+    are too old to ever be grouped are dropped.
+
+    Args:
+        cameras (int): Number of cameras
+        max_skew (float): Largest difference in seconds between the timestamps
+            of the pivot and a frame grouped with it
+        max_wait (float): Seconds to wait for a camera before grouping the
+            frames of the others without it, None to always wait for every
+            camera that is still running (for replays as fast as possible)
+
+    Attributes:
+        dropped (int): Frames that were not in any group
+    """
+
+    def __init__(self, cameras, max_skew=0.02, max_wait=0.25):
+        self.max_skew = max_skew
+        self.max_wait = max_wait
+        self.pending = [deque() for _ in range(cameras)]
+        self.running = set(range(cameras))
+        self.dropped = 0
+
+    def add(self, camera, timestamp, item, now=None):
+        """Queue a frame of camera and return the groups that are complete.
+
+        Returns:
+            List: Groups as dicts of camera -> (timestamp, item)
+        """
+        now = time.monotonic() if now is None else now
+        self.pending[camera].append((timestamp, item, now))
+        return self.poll(now)
+
+    def finish(self, camera):
+        """Stop waiting for a camera that ended and return the groups that
+        are complete without it.
+        """
+        self.running.discard(camera)
+        return self.poll()
+
+    def poll(self, now=None):
+        """Return the groups that are complete, including those that waited
+        longer than max_wait for a camera.
+        """
+        now = time.monotonic() if now is None else now
+        groups = []
+        while True:
+            waiting = [frames for frames in self.pending if frames]
+            if not waiting:
+                break
+            if any(not self.pending[camera] for camera in self.running):
+                oldest = min(frames[0][2] for frames in waiting)
+                if self.max_wait is None or now - oldest < self.max_wait:
+                    break
+
+            pivot = max(frames[0][0] for frames in waiting)
+            group = {}
+            for camera, frames in enumerate(self.pending):
+                # The pivot only gets later, so these will never be grouped.
+                while frames and frames[0][0] < pivot - self.max_skew:
+                    frames.popleft()
+                    self.dropped += 1
+                best = None
+                for i, (timestamp, _, _) in enumerate(frames):
+                    if timestamp > pivot + self.max_skew:
+                        break
+                    if best is None or abs(timestamp - pivot) < abs(frames[best][0] - pivot):
+                        best = i
+                if best is not None:
+                    for _ in range(best):
+                        frames.popleft()
+                        self.dropped += 1
+                    timestamp, item, _ = frames.popleft()
+                    group[camera] = (timestamp, item)
+            groups.append(group)
+        return groups
+
+
+def _camera_worker(camera, spec, options, results, stop):
+    """Track the rings seen by one camera and send their rod coordinates."""
+    import cv2
+    from .apriltag_detect import AprilTagTracker
+    from .calibration import CalibrationStore, DividerVerifier, load_or_calibrate
+
+    # Ctrl+C reaches the whole process group; the parent stops the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Leave the cores to the other cameras.
+    cv2.setNumThreads(max(1, (os.cpu_count() or 1) // options["cameras"]))
+    source = verifier = None
+    try:
+        source = open_source(spec, 1280, 720, depth=options["depth"], align=options["depth"],
+                             realtime=options["realtime"], loop=options["loop"])
+        tracker = AprilTagTracker(source, options["undistort"], fuse_depth=options["depth"])
+        store = (CalibrationStore(options["calibration_dir"])
+                 if options["calibration_dir"] else None)
+        reverse = camera in options["reverse"]
+        boundaries, calibration = load_or_calibrate(tracker, store, reverse)
+        if options["verify_every"] > 0:
+            verifier_tracker = AprilTagTracker(source, options["undistort"],
+                                               fuse_depth=options["depth"])
+            if calibration is not None and calibration.maps is not None:
+                verifier_tracker.set_remap_tables(calibration.intrinsics, calibration.maps)
+            verifier = DividerVerifier(verifier_tracker, boundaries, store, calibration,
+                                       interval=options["verify_every"],
+                                       reverse=reverse).start()
+        results.put(("ready", camera, getattr(source, "serial", None),
+                     tuple(float(x) for x in boundaries)))
+
+        base = 0.0
+        while not stop.is_set():
+            frame = source.read()
+            if frame is None:
+                break
+            if verifier is not None:
+                verifier.offer(frame)
+                boundaries = verifier.poll() or boundaries
+            _, locations = tracker.get_tower_locations(options["rings"], frame=frame)
+            if len(tracker.divider_positions) == 2:
+                base = float(sum(tvec[1] for tvec in tracker.divider_positions) / 2)
+            coords = [None if loc is None else (float(loc[0]), float(loc[1]))
+                      for loc in to_rod_coordinates(locations, boundaries, base)]
+            results.put(("frame", camera, frame.timestamp, coords))
+        results.put(("done", camera))
+    except Exception as e:
+        results.put(("error", camera, "%s: %s" % (type(e).__name__, e)))
+    finally:
+        if verifier is not None:
+            verifier.stop()
+        if source is not None:
+            source.stop()
+
+
+class MultiCameraRunner:
+    """Track the tower with several cameras at once, each in a worker process,
+    and fuse their time aligned ring locations.
+
+    Args:
+        specs (List): Source of every camera, as for open_source
+        rings (int): Amount of rings
+        depth (boolean): Measure tag positions with the aligned depth streams
+        undistort (str): Undistortion mode of the trackers
+        calibration_dir (str): Calibration cache, None to measure the
+            dividers on startup
+        verify_every (float): Seconds between background divider checks in
+            every worker, 0 to disable them
+        reverse (List): Numbers of the cameras looking at the rig from behind
+        realtime (boolean): Pace replayed sessions at the recorded rate
+        loop (boolean): Loop replayed sessions
+        max_skew (float): See FrameAligner
+        max_wait (float): See FrameAligner, None by default for replays that
+            are not paced
+        timeout (float): Seconds to wait for the workers to calibrate
+
+    Attributes:
+        serials (List): Serial of every camera once started
+        boundaries (List): Dividers every camera calibrated
+        frames (List): Frames every camera processed
+        errors (Dict): Camera number -> error of workers that failed
+    """
+
+    def __init__(self, specs, rings, depth=False, undistort="remap", calibration_dir=None,
+                 verify_every=0, reverse=(), realtime=True, loop=False, max_skew=0.02,
+                 max_wait=0.25, timeout=60.0):
+        self.specs = list(specs)
+        self.rings = rings
+        self.timeout = timeout
+        self.options = {"cameras": len(self.specs), "rings": rings, "depth": depth,
+                        "undistort": undistort, "calibration_dir": calibration_dir,
+                        "verify_every": verify_every, "reverse": list(reverse),
+                        "realtime": realtime, "loop": loop}
+        self.aligner = FrameAligner(len(self.specs), max_skew,
+                                    max_wait if realtime else None)
+        self.serials = [None] * len(self.specs)
+        self.boundaries = [None] * len(self.specs)
+        self.frames = [0] * len(self.specs)
+        self.errors = {}
+        self._results = multiprocessing.Queue()
+        self._stop = multiprocessing.Event()
+        self._processes = []
+        self._groups = deque()
+        self._running = set()
+
+    def start(self):
+        """Start the workers and wait until every camera is calibrated."""
+        for camera, spec in enumerate(self.specs):
+            process = multiprocessing.Process(
+                target=_camera_worker, args=(camera, spec, self.options, self._results, self._stop),
+                daemon=True)
+            process.start()
+            self._processes.append(process)
+            self._running.add(camera)
+
+        deadline = time.monotonic() + self.timeout
+        while any(serial is None for serial in self.serials):
+            try:
+                message = self._results.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                self.stop()
+                raise RuntimeError("Cameras did not start within %g seconds." % self.timeout)
+            if message[0] == "error":
+                self.stop()
+                raise RuntimeError("Camera %d (%s): %s" % (message[1], self.specs[message[1]],
+                                                          message[2]))
+            if message[0] == "ready":
+                _, camera, serial, boundaries = message
+                self.serials[camera] = serial or self.specs[camera]
+                self.boundaries[camera] = boundaries
+            else:
+                # A fast replay can already send frames while others calibrate.
+                self._handle(message)
+        return self
+
+    def _handle(self, message):
+        kind, camera = message[:2]
+        if kind == "frame":
+            self.frames[camera] += 1
+            self._groups.extend(self.aligner.add(camera, message[2], message[3]))
+        else:
+            if kind == "error":
+                self.errors[camera] = message[2]
+            self._running.discard(camera)
+            self._groups.extend(self.aligner.finish(camera))
+
+    def _fuse(self, group):
+        cameras = sorted(group)
+        timestamps = [group[camera][0] for camera in cameras]
+        locations, views = fuse_observations([group[camera][1] for camera in cameras], self.rings)
+        return FusedFrame(sum(timestamps) / len(timestamps), locations, views, cameras,
+                          max(timestamps) - min(timestamps))
+
+    @property
+    def done(self):
+        """Whether every camera ended and every group was read."""
+        return not self._running and not self._groups
+
+    def read(self, timeout=None):
+        """Return the next FusedFrame, or None once every camera ended or
+        after timeout seconds without one.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._groups:
+            if not self._running:
+                return None
+            wait = 0.05 if deadline is None else min(0.05, deadline - time.monotonic())
+            if wait <= 0:
+                return None
+            try:
+                self._handle(self._results.get(timeout=wait))
+            except queue.Empty:
+                self._groups.extend(self.aligner.poll())
+        return self._fuse(self._groups.popleft())
+
+    def __iter__(self):
+        while True:
+            fused = self.read()
+            if fused is None:
+                return
+            yield fused
+
+    def stop(self):
+        self._stop.set()
+        deadline = time.monotonic() + 5.0
+        for process in self._processes:
+            # A worker only exits once what it put on the queue was taken.
+            while process.is_alive() and time.monotonic() < deadline:
+                try:
+                    while True:
+                        self._results.get_nowait()
+                except queue.Empty:
+                    pass
+                process.join(0.05)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._running.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+async def serve(runner, server, state_filter, echo=False, metrics=NULL_METRICS):
+    """Fuse the cameras on a worker thread and publish every change of the
+    tower until they end or the task is cancelled.
+
+    Args:
+        runner (MultiCameraRunner): Started runner
+        server (HanoiStateServer): Server to publish the changes on, or None
+        state_filter (HanoiStateFilter): Debounces the fused states
+        echo (boolean): Also print every change
+        metrics (Metrics): Where to record the fused frames
+    """
+    loop = asyncio.get_running_loop()
+    stop = threading.Event()
+
+    def fuse_loop():
+        while not stop.is_set():
+            fused = runner.read(timeout=0.5)
+            if fused is None:
+                if runner.done:
+                    break
+                continue
+            # Rod coordinates put the dividers at 0 and 1.
+            event = state_filter.update(fused.locations, 0.0, 1.0, timestamp=fused.timestamp)
+            if event is not None:
+                event["views"] = fused.views
+                event["cameras"] = fused.cameras
+                if server is not None:
+                    loop.call_soon_threadsafe(server.publish, event)
+                if echo:
+                    print(json.dumps(event))
+            metrics.set("camera_skew_ms", fused.skew * 1000)
+            metrics.set("unaligned_frames", runner.aligner.dropped)
+            metrics.end_frame()
+
+    if server is not None:
+        await server.start()
+    try:
+        await loop.run_in_executor(None, fuse_loop)
+    finally:
+        stop.set()
+        if server is not None:
+            await server.close()
+
+
+def connected_serials():
+    """Return the serial numbers of the connected RealSense devices."""
+    import pyrealsense2 as rs
+    return [device.get_info(rs.camera_info.serial_number)
+            for device in rs.context().query_devices()]
+
+
+def main():
+    """Track the hanoi tower with several cameras until interrupted."""
+    from .calibration import add_calibration_arguments
+
+    parser = argparse.ArgumentParser(description="Track a hanoi tower with several \
+                                     cameras at once and publish the fused state.")
+    parser.add_argument("n", type=int, help="amount of rings")
+    parser.add_argument("--camera", action="append", help="source of a camera \
+                        (realsense:<serial>, shm:<bus> or a recording), repeat for every \
+                        camera (default: every connected RealSense)")
+    parser.add_argument("--reverse", action="append", type=int, default=[], help="number \
+                        (from 0, in --camera order) of a camera looking at the rig from behind")
+    parser.add_argument("--depth", action="store_true", help="measure tag positions \
+                        in meters with the aligned depth streams")
+    parser.add_argument("--undistort", default="remap", choices=["remap", "points"],
+                        help="undistort the whole image or only the detected corners")
+    parser.add_argument("--max-skew", default=20.0, type=float, help="largest \
+                        difference in milliseconds between frames fused together (default 20)")
+    parser.add_argument("--max-wait", default=250.0, type=float, help="milliseconds \
+                        to wait for a camera before fusing without it (default 250)")
+    parser.add_argument("--window", default=5, type=int, help="frames the state is \
+                        debounced over")
+    parser.add_argument("--min-confidence", default=0.6, type=float, help="fraction \
+                        of the window a ring must be seen on a new rod before it moves")
+    parser.add_argument("--socket", help="also publish on this Unix domain socket")
+    parser.add_argument("--port", type=int, help="also publish on this TCP port of localhost")
+    parser.add_argument("--print", action="store_true", help="print every change even \
+                        when publishing")
+    parser.add_argument("--fast", action="store_true", help="replay recorded \
+                        sessions as fast as possible instead of in real time")
+    parser.add_argument("--loop", action="store_true", help="loop recorded sessions")
+    add_metrics_arguments(parser)
+    add_calibration_arguments(parser)
+    args = parser.parse_args()
+    metrics = metrics_from_args(args)
+
+    specs = args.camera or ["realsense:" + serial for serial in connected_serials()]
+    if not specs:
+        parser.error("no cameras given and no RealSense connected")
+    runner = MultiCameraRunner(
+        specs, args.n, args.depth, args.undistort,
+        None if args.no_calibration_cache else args.calibration_dir, args.verify_every,
+        args.reverse, realtime=not args.fast, loop=args.loop, max_skew=args.max_skew / 1000,
+        max_wait=args.max_wait / 1000)
+
+    server = None
+    if args.socket or args.port:
+        server = HanoiStateServer(args.socket, port=args.port, metrics=metrics)
+    state_filter = HanoiStateFilter(args.n, args.window, args.min_confidence)
+    started = time.monotonic()
+    try:
+        with runner:
+            for camera, serial in enumerate(runner.serials):
+                print("Camera %d: %s, dividers %s" % (camera, serial, runner.boundaries[camera]))
+            started = time.monotonic()
+            asyncio.run(serve(runner, server, state_filter, args.print or server is None,
+                              metrics))
+    except KeyboardInterrupt:
+        print("\nCtrl+C detected. Exiting...")
+
+    elapsed = time.monotonic() - started
+    for camera, frames in enumerate(runner.frames):
+        print("Camera %d: %d frames (%.1f fps)%s" % (
+            camera, frames, frames / elapsed,
+            ", failed: " + runner.errors[camera] if camera in runner.errors else ""))
+    print("%d frames could not be aligned with the other cameras" % runner.aligner.dropped)
+    metrics.close()
+
+
+if __name__ == "__main__":
+    main()
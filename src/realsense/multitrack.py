@@ -0,0 +1,163 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+from .predictive import PredictiveTracker
+
+
+"""
+Parallel multi-object tracking. Each object has its own tracker and the updates
+are spread over a thread pool; OpenCV releases the GIL while a tracker runs, so
+the updates really run side by side, and every worker reads the same frame
+array instead of a copy. Objects whose tracker fails are searched for again
+with template matching around where they were last seen.
+"""
+
+
+TRACKER_TYPES = {
+    "CSRT": "TrackerCSRT_create",
+    "KCF": "TrackerKCF_create",
+    "MOSSE": "TrackerMOSSE_create",
+}
+
+
+def create_tracker(kind):
+    """Create a cv2.legacy tracker from its name (CSRT, KCF or MOSSE)."""
+    try:
+        return getattr(cv2.legacy, TRACKER_TYPES[kind.upper()])()
+    except KeyError:
+        raise ValueError("Unknown tracker type: " + kind) from None
+
+
+def _clip_box(box, width, height):
+    x0, y0 = max(int(box[0]), 0), max(int(box[1]), 0)
+    x1, y1 = min(int(box[0] + box[2]), width), min(int(box[1] + box[3]), height)
+    return x0, y0, x1, y1
+
+
+class TrackedObject:
+    """One object of a ParallelMultiTracker.
+
+    Attributes:
+        kind (str): Tracker type
+        box (Tuple): Last known (x, y, w, h)
+        ok (boolean): Whether the last update found the object
+        lost (int): Number of frames in a row the object was not found
+    """
+
+    def __init__(self, kind, tracker, box, template):
+        self.kind = kind
+        self.tracker = tracker
+        self.box = tuple(float(v) for v in box)
+        self.template = template
+        self.ok = True
+        self.lost = 0
+
+
+class ParallelMultiTracker:
+    """Track many objects at once, one tracker per object, on a thread pool.
+    Has the add/update interface of cv2.legacy.MultiTracker, except that add
+    takes a tracker type instead of a tracker.
+
+    Args:
+        workers (int): Number of threads, defaults to the number of cores
+        reacquire (boolean): Search for lost objects with template matching
+        min_score (float): Lowest template match score (normalized cross
+            correlation) accepted when re-acquiring an object
+        search_scale (float): Size of the re-acquire search window relative to
+            the box, grows with every frame the object stays lost
+        predict (boolean): Schedule every tracker with a PredictiveTracker
+        max_skip (int): See PredictiveTracker
+    """
+
+    def __init__(self, workers=None, reacquire=True, min_score=0.6, search_scale=3.0,
+                 predict=False, max_skip=8):
+        self.workers = workers or os.cpu_count() or 1
+        self.reacquire = reacquire
+        self.min_score = min_score
+        self.search_scale = search_scale
+        self.predict = predict
+        self.max_skip = max_skip
+        self.objects = []
+        self.reacquired = 0
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def _create(self, kind, frame, box):
+        tracker = create_tracker(kind)
+        if self.predict:
+            tracker = PredictiveTracker(tracker, max_skip=self.max_skip)
+        tracker.init(frame, tuple(box))
+        return tracker
+
+    def add(self, kind, frame, box):
+        """Start tracking box in frame with a tracker of the given type.
+
+        Args:
+            kind (str): CSRT, KCF or MOSSE
+            frame (ndarray): BGR image
+            box (Tuple): (x, y, w, h)
+        """
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = _clip_box(box, width, height)
+        template = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        self.objects.append(TrackedObject(kind, self._create(kind, frame, box), box, template))
+        return True
+
+    def _search(self, obj, frame):
+        """Look for a lost object with template matching in a window around its
+        last known box, and restart its tracker if it is found.
+        """
+        height, width = frame.shape[:2]
+        th, tw = obj.template.shape[:2]
+        if th < 2 or tw < 2:
+            return False
+
+        x, y, w, h = obj.box
+        scale = self.search_scale * min(obj.lost, 4)
+        window = (x - w * scale / 2, y - h * scale / 2, w * (scale + 1), h * (scale + 1))
+        x0, y0, x1, y1 = _clip_box(window, width, height)
+        if x1 - x0 < tw or y1 - y0 < th:
+            return False
+
+        region = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        _, score, _, (bx, by) = cv2.minMaxLoc(
+            cv2.matchTemplate(region, obj.template, cv2.TM_CCOEFF_NORMED))
+        if score < self.min_score:
+            return False
+
+        obj.box = (float(x0 + bx), float(y0 + by), float(tw), float(th))
+        obj.tracker = self._create(obj.kind, frame, obj.box)
+        self.reacquired += 1
+        return True
+
+    def _update_one(self, obj, frame):
+        ok, box = obj.tracker.update(frame)
+        if ok:
+            obj.box = tuple(float(v) for v in box)
+            obj.lost = 0
+        else:
+            obj.lost += 1
+            if self.reacquire:
+                ok = self._search(obj, frame)
+                if ok:
+                    obj.lost = 0
+        obj.ok = ok
+        return ok
+
+    def update(self, frame):
+        """Update every tracker with frame.
+
+        Returns:
+            Tuple: (all_ok, boxes) like cv2.legacy.MultiTracker.update
+        """
+        futures = [self._pool.submit(self._update_one, obj, frame) for obj in self.objects]
+        ok = all([future.result() for future in futures])
+        return ok, self.getObjects()
+
+    def getObjects(self):
+        return np.array([obj.box for obj in self.objects], np.float64).reshape(-1, 4)
+
+    def close(self):
+        self._pool.shutdown()
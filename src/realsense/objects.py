@@ -0,0 +1,88 @@
+import argparse
+import cv2 as cv
+
+from .buffers import BufferArena
+from .frame_source import add_source_arguments, source_from_args
+from .multitrack import ParallelMultiTracker
+
+
+"""Purpose: Tracks multiple items using a region of interest algorithm. Users are prompted to draw
+shape around object they want to detect and algorithm draws a bounding box around said object.
+Result: Tracks multiple objects but must be manually selected by user. Number of items tracked can 
+be change in for loop in line 18.
+"""
+
+# Copy of the frame to draw on when the frame itself is read only
+arena = BufferArena()
+
+
+def main():
+    """Track several selected objects until Esc is pressed."""
+    parser = argparse.ArgumentParser(description="Track several selected objects.")
+    add_source_arguments(parser, default="webcam:1")
+    parser.add_argument("--predict", action="store_true", help="only run the tracker every few \
+                        frames and predict the boxes in between")
+    parser.add_argument("--max-skip", default=8, type=int, help="most frames between \
+                        tracker updates with --predict")
+    parser.add_argument("--tracker", default="CSRT", help="tracker type for each object \
+                        (CSRT, KCF or MOSSE), comma separated to pick one per object")
+    parser.add_argument("--workers", default=None, type=int, help="tracking threads \
+                        (defaults to the number of cores)")
+    args = parser.parse_args()
+    kinds = args.tracker.split(",")
+
+    bboxes = []
+    cap = source_from_args(args)
+
+
+    frame = cap.read().color
+
+    for i in range(3):
+        bbox = cv.selectROI("Frame", frame, fromCenter=False, showCrosshair=True)
+        bboxes.append(bbox)
+
+    multi_tracker = ParallelMultiTracker(args.workers, predict=args.predict, max_skip=args.max_skip)
+    for i, box in enumerate(bboxes):
+         multi_tracker.add(kinds[i % len(kinds)], frame, box)
+
+
+    print("Multitracker created")
+
+
+    while True:
+        #Read each frame
+        frame = cap.read()
+        if frame is None:
+                break
+        frame = frame.color
+
+        ret, boxes = multi_tracker.update(frame)
+        frame = arena.writable("annotated", frame)
+        # Draw bounding box around the tracked object
+        """
+        if ret:
+            for i in range(len(bboxes)):
+                x, y, w, h = map(int, bboxes[i])
+                cv.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        """
+        for i, newbox in enumerate(boxes):
+            p1 = (int(newbox[0]), int(newbox[1]))
+            p2 = (int(newbox[0] + newbox[2]), int(newbox[1] + newbox[3]))
+            cv.rectangle(frame, p1, p2, (0, 255, 0), 2, 1)
+            cv.putText(frame, 'Ring ' + str(i), (p1[0], p1[1]-10), cv.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
+
+
+        cv.imshow("MultiTracker", frame)
+
+        key = cv.waitKey(30)
+
+        if key == 27:
+            break
+
+    cap.stop()
+    multi_tracker.close()
+    cv.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
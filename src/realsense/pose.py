@@ -0,0 +1,270 @@
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+
+"""
+Batched AprilTag pose estimation. detector.detection_pose solves one tag at a
+time; here the poses of every tag in a frame are solved together with numpy:
+an initial pose from each tag's homography, then a few Gauss-Newton steps on
+the reprojection error of the corners, all tags at once. A tag seen in the
+previous frame starts from its previous pose instead when that fits better.
+
+A small or distant square tag fits two poses almost equally well, tilted
+towards or away from the camera (the planar ambiguity IPPE returns both
+solutions for). Gauss-Newton stays in whichever of the two it starts in, so
+every tag is also refined from the mirror image of its starting pose and the
+pose with the lower reprojection error is kept. Tags that are still improving
+when max_iterations runs out (a poor starting pose on a small tag) are solved
+again one at a time with OpenCV's IPPE_SQUARE, which returns both solutions.
+"""
+
+
+# Tag corners in the order of the detector's corners, in units of half a tag.
+UNIT_CORNERS = np.array([[-1, 1], [1, 1], [1, -1], [-1, -1]], np.float64)
+
+# rotations is N x 3 x 3, translations N x 3 (the tag center in camera
+# coordinates) and errors N root mean square reprojection errors in pixels.
+Poses = namedtuple("Poses", ["rotations", "translations", "errors"])
+
+
+def skew(v):
+    """Return the cross product matrices of a stack of vectors (... x 3)."""
+    m = np.zeros(v.shape[:-1] + (3, 3))
+    m[..., 0, 1], m[..., 0, 2] = -v[..., 2], v[..., 1]
+    m[..., 1, 0], m[..., 1, 2] = v[..., 2], -v[..., 0]
+    m[..., 2, 0], m[..., 2, 1] = -v[..., 1], v[..., 0]
+    return m
+
+
+def rotations_from_vectors(rvecs):
+    """Rodrigues' formula for a stack of rotation vectors (N x 3)."""
+    theta = np.linalg.norm(rvecs, axis=1)[:, None, None]
+    k = skew(rvecs / np.maximum(theta[:, :, 0], 1e-12))
+    return np.eye(3) + np.sin(theta) * k + (1 - np.cos(theta)) * (k @ k)
+
+
+def homographies(corners):
+    """Solve the homography of every tag from its four corners at once.
+
+    Args:
+        corners (ndarray): N x 4 x 2 corners in pixels
+
+    Returns:
+        ndarray: N x 3 x 3 homographies mapping UNIT_CORNERS to the corners
+    """
+    n = len(corners)
+    u, v = UNIT_CORNERS[:, 0], UNIT_CORNERS[:, 1]
+    x, y = corners[..., 0], corners[..., 1]
+    a = np.zeros((n, 4, 2, 8))
+    a[:, :, 0, 0], a[:, :, 0, 1], a[:, :, 0, 2] = u, v, 1
+    a[:, :, 1, 3], a[:, :, 1, 4], a[:, :, 1, 5] = u, v, 1
+    a[:, :, 0, 6], a[:, :, 0, 7] = -u * x, -v * x
+    a[:, :, 1, 6], a[:, :, 1, 7] = -u * y, -v * y
+    h = np.linalg.solve(a.reshape(n, 8, 8), corners.reshape(n, 8, 1))[:, :, 0]
+    return np.concatenate([h, np.ones((n, 1))], axis=1).reshape(n, 3, 3)
+
+
+class BatchPoseSolver:
+    """Solve the poses of all tags of a frame at once.
+
+    Args:
+        camera_params (List): fx, fy, cx, cy of the (undistorted) image
+        tag_size (float): Side of the tags, in the unit the translations
+            should come out in (1 gives the same units as detection_pose
+            with tag_size=1)
+        max_iterations (int): Most Gauss-Newton steps per frame
+        tolerance (float): Stop refining a tag once a step improves its
+            reprojection error by less than this many pixels
+        seed_distance (float): How far, in pixels, a tag may have moved since
+            the previous frame and still start from its previous pose
+    """
+
+    def __init__(self, camera_params, tag_size=1.0, max_iterations=10, tolerance=1e-3,
+                 seed_distance=20.0):
+        self.fx, self.fy, self.cx, self.cy = camera_params
+        self.camera_matrix = np.array([[self.fx, 0, self.cx], [0, self.fy, self.cy], [0, 0, 1]])
+        self.tag_size = tag_size
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.seed_distance = seed_distance
+        self.iterations = 0
+        self.object_points = np.zeros((4, 3))
+        self.object_points[:, :2] = UNIT_CORNERS * tag_size / 2
+        # tag id -> list of (center, rotation, translation) of the last frame
+        # the id was solved in.
+        self._previous = {}
+
+    def _initial_poses(self, corners):
+        """Poses from the homographies: K^-1 H = s [r1 r2 t] up to scale."""
+        m = np.linalg.solve(self.camera_matrix, homographies(corners))
+        c1, c2, c3 = m[:, :, 0], m[:, :, 1], m[:, :, 2]
+        n1, n2 = np.linalg.norm(c1, axis=1), np.linalg.norm(c2, axis=1)
+        scale = (n1 + n2) / self.tag_size
+        # The tag is in front of the camera, which fixes the sign.
+        scale = np.where(c3[:, 2] < 0, -scale, scale)
+        r1 = c1 / (n1 * np.sign(scale))[:, None]
+        r2 = c2 / (n2 * np.sign(scale))[:, None]
+        rotations = np.stack([r1, r2, np.cross(r1, r2)], axis=2)
+
+        # Snap to the closest proper rotation.
+        u, _, vt = np.linalg.svd(rotations)
+        d = np.sign(np.linalg.det(u @ vt))
+        u[:, :, 2] *= d[:, None]
+        return u @ vt, c3 / scale[:, None]
+
+    def _residuals(self, rotations, translations, corners):
+        points = rotations @ self.object_points.T + translations[:, :, None]
+        points = points.transpose(0, 2, 1)
+        z = points[..., 2]
+        projected = np.stack([self.fx * points[..., 0] / z + self.cx,
+                              self.fy * points[..., 1] / z + self.cy], axis=-1)
+        return points, projected - corners
+
+    def _errors(self, residuals):
+        return np.sqrt((residuals ** 2).sum(axis=-1).mean(axis=-1))
+
+    def _mirrored(self, rotations, translations):
+        """The other pose of the planar ambiguity: the tag mirrored about the
+        plane through its center perpendicular to the line of sight, which
+        projects to nearly the same corners.
+        """
+        sight = translations / np.linalg.norm(translations, axis=1)[:, None]
+        # A half turn about the line of sight, after a half turn of the tag
+        # about its normal so the corners stay where they were.
+        half_turn = 2 * sight[:, :, None] * sight[:, None, :] - np.eye(3)
+        return half_turn @ rotations * np.array([-1, -1, 1]), translations.copy()
+
+    def _seed(self, tag_ids, corners, rotations, translations):
+        """Swap in the previous frame's pose of every tag that was seen close
+        to where it is now.
+        """
+        centers = corners.mean(axis=1)
+        for i, tag_id in enumerate(tag_ids):
+            best = None
+            for center, rotation, translation in self._previous.get(tag_id, ()):
+                distance = np.hypot(*(center - centers[i]))
+                if distance < self.seed_distance and (best is None or distance < best[0]):
+                    best = (distance, rotation, translation)
+            if best is not None:
+                rotations[i], translations[i] = best[1], best[2]
+        return rotations, translations
+
+    def _refine(self, rotations, translations, corners):
+        """Gauss-Newton steps on the reprojection error of every tag.
+
+        Returns:
+            Tuple: Refined rotations, translations, their errors and
+                whether each tag was still improving when max_iterations ran
+                out
+        """
+        n = len(corners)
+        _, residuals = self._residuals(rotations, translations, corners)
+        errors = self._errors(residuals)
+        active = np.ones(n, bool)
+        damping = np.full(n, 1e-3)
+        self.iterations = 0
+        while active.any() and self.iterations < self.max_iterations:
+            self.iterations += 1
+            points, residuals = self._residuals(rotations, translations, corners)
+            x, y, z = points[..., 0], points[..., 1], points[..., 2]
+
+            # Derivative of the projections with respect to the points, and of
+            # the points with respect to a small rotation and a translation.
+            d_proj = np.zeros(points.shape[:2] + (2, 3))
+            d_proj[..., 0, 0] = self.fx / z
+            d_proj[..., 0, 2] = -self.fx * x / (z * z)
+            d_proj[..., 1, 1] = self.fy / z
+            d_proj[..., 1, 2] = -self.fy * y / (z * z)
+            d_point = np.concatenate([
+                -skew(points - translations[:, None, :]),
+                np.broadcast_to(np.eye(3), points.shape[:2] + (3, 3))], axis=-1)
+            jacobian = (d_proj @ d_point).reshape(n, 8, 6)
+
+            jt = jacobian.transpose(0, 2, 1)
+            normal = jt @ jacobian
+            # Levenberg-Marquardt: damped steps are shorter and closer to
+            # gradient descent, for poses far from the minimum.
+            diagonal = damping[:, None] * normal.diagonal(axis1=1, axis2=2) + 1e-9
+            normal = normal + diagonal[:, :, None] * np.eye(6)
+            step = -np.linalg.solve(normal, (jt @ residuals.reshape(n, 8, 1)))[:, :, 0]
+            step[~active] = 0
+            # The error the step would reach if the projection were linear.
+            expected = self._errors(residuals + (jacobian @ step[:, :, None]).reshape(n, 4, 2))
+
+            new_rotations = rotations_from_vectors(step[:, :3]) @ rotations
+            new_translations = translations + step[:, 3:]
+            _, new_residuals = self._residuals(new_rotations, new_translations, corners)
+            new_errors = self._errors(new_residuals)
+
+            # Keep a step only if it helped, otherwise retry with more damping
+            # as long as a step could still help. A tag that stops improving
+            # is done.
+            improved = active & (new_errors <= errors)
+            failed = active & ~improved
+            rotations[improved] = new_rotations[improved]
+            translations[improved] = new_translations[improved]
+            active = (improved & (errors - new_errors > self.tolerance)) | (
+                failed & (errors - expected > self.tolerance))
+            damping = np.where(improved, damping / 10, np.where(failed, damping * 10, damping))
+            errors = np.where(improved, new_errors, errors)
+        return rotations, translations, errors, active
+
+    def _solve_single(self, i, corners, rotations, translations, errors):
+        """Replace the pose of tag i with the better IPPE_SQUARE solution if
+        it fits its corners better.
+        """
+        _, rvecs, tvecs, _ = cv2.solvePnPGeneric(self.object_points, corners[i],
+                                                 self.camera_matrix, None,
+                                                 flags=cv2.SOLVEPNP_IPPE_SQUARE)
+        for rvec, tvec in zip(rvecs, tvecs):
+            rotation = cv2.Rodrigues(rvec)[0][None]
+            translation = tvec.reshape(1, 3)
+            error = self._errors(self._residuals(rotation, translation, corners[i:i + 1])[1])[0]
+            if error < errors[i]:
+                rotations[i], translations[i], errors[i] = rotation[0], translation[0], error
+
+    def solve(self, tag_ids, corners):
+        """Solve the pose of every detection.
+
+        Args:
+            tag_ids (List): Id of every detection, used to match tags with
+                the previous frame
+            corners (ndarray): N x 4 x 2 undistorted corners in pixels
+
+        Returns:
+            Poses: Stacked rotations, translations and reprojection errors
+        """
+        corners = np.asarray(corners, np.float64).reshape(-1, 4, 2)
+        n = len(corners)
+        if n == 0:
+            return Poses(np.zeros((0, 3, 3)), np.zeros((0, 3)), np.zeros(0))
+
+        rotations, translations = self._initial_poses(corners)
+        _, residuals = self._residuals(rotations, translations, corners)
+        errors = self._errors(residuals)
+
+        if self._previous:
+            seeded = self._seed(tag_ids, corners, rotations.copy(), translations.copy())
+            _, seeded_residuals = self._residuals(*seeded, corners)
+            seeded_errors = self._errors(seeded_residuals)
+            better = seeded_errors < errors
+            rotations[better], translations[better] = seeded[0][better], seeded[1][better]
+
+        # Refine both poses of the ambiguity together and keep the better one.
+        mirrored = self._mirrored(rotations, translations)
+        rotations, translations, errors, unfinished = self._refine(
+            np.concatenate([rotations, mirrored[0]]), np.concatenate([translations, mirrored[1]]),
+            np.concatenate([corners, corners]))
+        best = np.where(errors[n:] < errors[:n], np.arange(n, 2 * n), np.arange(n))
+        rotations, translations, errors = rotations[best], translations[best], errors[best]
+        for i in np.flatnonzero(unfinished[best]):
+            self._solve_single(i, corners, rotations, translations, errors)
+
+        centers = corners.mean(axis=1)
+        solved = {}
+        for i, tag_id in enumerate(tag_ids):
+            solved.setdefault(tag_id, []).append((centers[i], rotations[i], translations[i]))
+        self._previous.update(solved)
+        return Poses(rotations, translations, errors)
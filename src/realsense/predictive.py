@@ -0,0 +1,134 @@
+import numpy as np
+import cv2
+
+
+"""
+Predictive tracker scheduling. The expensive correlation tracker (CSRT) only
+runs every k frames; in between, boxes are predicted with a constant velocity
+Kalman filter. k grows while an object is still and shrinks while it moves,
+and a cheap template check forces a real update as soon as a prediction stops
+looking like the object.
+"""
+
+
+# Side of the square grayscale patch used for the template check.
+TEMPLATE_SIZE = 24
+
+
+def _patch(frame, box):
+    """Return the grayscale TEMPLATE_SIZE patch of frame under box, or None if
+    the box is outside the frame.
+    """
+    height, width = frame.shape[:2]
+    x0, y0 = max(int(box[0]), 0), max(int(box[1]), 0)
+    x1, y1 = min(int(box[0] + box[2]), width), min(int(box[1] + box[3]), height)
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    patch = frame[y0:y1, x0:x1]
+    if patch.ndim == 3:
+        patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(patch, (TEMPLATE_SIZE, TEMPLATE_SIZE), interpolation=cv2.INTER_AREA)
+
+
+class PredictiveTracker:
+    """Run an OpenCV tracker every k frames and predict boxes in between. Has
+    the same init/update interface as the cv2.legacy trackers.
+
+    Args:
+        tracker (cv2.legacy.Tracker): Tracker to schedule, e.g. TrackerCSRT
+        max_skip (int): Largest number of frames between tracker updates
+        motion_fraction (float): How far, as a fraction of the box size, the
+            object may move between two tracker updates. k is chosen from the
+            measured speed so that this holds.
+        min_similarity (float): Run the tracker immediately when the
+            predicted box looks less like the object than this (normalized
+            cross correlation, -1 to 1)
+    """
+
+    def __init__(self, tracker, max_skip=8, motion_fraction=0.1, min_similarity=0.6):
+        self.tracker = tracker
+        self.max_skip = max_skip
+        self.motion_fraction = motion_fraction
+        self.min_similarity = min_similarity
+        self.k = 1
+        self.box = None
+        self.template = None
+        self.tracker_updates = 0
+        self._since_update = 0
+
+        # State is (cx, cy, w, h, vx, vy), measurement is (cx, cy, w, h).
+        self.kalman = cv2.KalmanFilter(6, 4)
+        self.kalman.transitionMatrix = np.array([
+            [1, 0, 0, 0, 1, 0],
+            [0, 1, 0, 0, 0, 1],
+            [0, 0, 1, 0, 0, 0],
+            [0, 0, 0, 1, 0, 0],
+            [0, 0, 0, 0, 1, 0],
+            [0, 0, 0, 0, 0, 1]], np.float32)
+        self.kalman.measurementMatrix = np.eye(4, 6, dtype=np.float32)
+        self.kalman.processNoiseCov = np.diag([1, 1, 1, 1, 0.5, 0.5]).astype(np.float32)
+        self.kalman.measurementNoiseCov = np.eye(4, dtype=np.float32)
+
+    def init(self, frame, box):
+        """Start tracking box in frame."""
+        ok = self.tracker.init(frame, tuple(box))
+        x, y, w, h = box
+        self.kalman.statePost = np.array([[x + w / 2], [y + h / 2], [w], [h], [0], [0]], np.float32)
+        self.kalman.errorCovPost = np.eye(6, dtype=np.float32)
+        self.box = tuple(float(v) for v in box)
+        self.template = _patch(frame, box)
+        self.k = 1
+        self._since_update = 0
+        return ok is not False
+
+    def _predict(self):
+        cx, cy, w, h = self.kalman.predict()[:4, 0]
+        return (float(cx - w / 2), float(cy - h / 2), float(w), float(h))
+
+    def _similarity(self, frame, box):
+        patch = _patch(frame, box)
+        if patch is None or self.template is None:
+            return -1.0
+        score = cv2.matchTemplate(patch, self.template, cv2.TM_CCOEFF_NORMED)[0, 0]
+        return -1.0 if np.isnan(score) else float(score)
+
+    def _adapt(self):
+        """Pick the next k from the estimated speed and the box size. k shrinks
+        right away when the object speeds up but only doubles per update when
+        it slows down, since the velocity estimate takes a few updates to settle.
+        """
+        vx, vy = self.kalman.statePost[4:6, 0]
+        speed = float(np.hypot(vx, vy))
+        allowed = self.motion_fraction * min(self.box[2], self.box[3])
+        target = self.max_skip if speed <= 1e-3 else int(np.clip(allowed / speed, 1, self.max_skip))
+        self.k = min(target, 2 * self.k)
+
+    def update(self, frame):
+        """Return (ok, box) for the next frame, running the real tracker only
+        when it is due or the prediction looks wrong.
+        """
+        predicted = self._predict()
+        self._since_update += 1
+
+        due = self._since_update >= self.k
+        if not due and self._similarity(frame, predicted) < self.min_similarity:
+            due = True
+        if not due:
+            self.box = predicted
+            return True, predicted
+
+        self._since_update = 0
+        self.tracker_updates += 1
+        ok, box = self.tracker.update(frame)
+        if not ok:
+            # Keep predicting but check with the tracker every frame.
+            self.k = 1
+            self.box = predicted
+            return False, predicted
+
+        x, y, w, h = box
+        self.kalman.correct(np.array([[x + w / 2], [y + h / 2], [w], [h]], np.float32))
+        self.box = tuple(float(v) for v in box)
+        self.template = _patch(frame, box)
+        self._adapt()
+        return True, self.box
@@ -0,0 +1,292 @@
+import os
+import json
+import mmap
+
+import numpy as np
+
+from .frame_source import (Frame, FrameSource, ReplaySource, intrinsics_from_dict,
+                          intrinsics_to_dict)
+
+
+"""
+Chunked recordings for long color+depth sessions. Frames are copied as raw
+pixels into preallocated chunk files of fixed size slots, and a small index
+keeps the timestamp and frame number of every slot. Reading memory maps the
+chunks, so a frame is a view into the file: seeking anywhere in an hour long
+session is a bit of index arithmetic and nothing is loaded into RAM until the
+pixels are touched.
+
+A recording is a directory holding:
+    recording.json: Image shapes, frames per chunk, intrinsics and depth scale
+    index.bin: (timestamp, frame number) of every frame, in recording order
+    chunk_00000.bin, ...: frames_per_chunk slots of color then depth pixels
+"""
+
+
+RECORDING_FILE = "recording.json"
+INDEX_FILE = "index.bin"
+INDEX_DTYPE = np.dtype([("timestamp", "<f8"), ("number", "<i8")])
+# Chunks are sized to hold about this many bytes of frames.
+CHUNK_BYTES = 256 << 20
+
+
+def is_recording(path):
+    """Return whether path is a directory written by RecordingWriter."""
+    return os.path.isfile(os.path.join(path, RECORDING_FILE))
+
+
+def _slot_dtype(color_shape, depth_shape):
+    fields = [("color", np.uint8, tuple(color_shape))]
+    if depth_shape is not None:
+        fields.append(("depth", np.uint16, tuple(depth_shape)))
+    # Aligned so the depth pixels of every slot start on a 2 byte boundary.
+    return np.dtype(fields, align=True)
+
+
+def _chunk_path(path, chunk):
+    return os.path.join(path, "chunk_%05d.bin" % chunk)
+
+
+class RecordingWriter:
+    """Append frames to a chunked recording.
+
+    The image shapes and calibration are taken from the first frame. Chunk
+    files are allocated in full when they are started, so writing a frame is
+    one copy into already mapped memory.
+
+    Args:
+        path (str): Directory to write the recording into
+        chunk_bytes (int): Approximate size of each chunk file
+    """
+
+    def __init__(self, path, chunk_bytes=CHUNK_BYTES):
+        self.path = path
+        self.chunk_bytes = chunk_bytes
+        self.count = 0
+        self.frames_per_chunk = None
+        self._meta = None
+        self._slots = None
+        self._index = None
+        os.makedirs(path, exist_ok=True)
+
+    def _begin(self, frame):
+        dtype = _slot_dtype(frame.color.shape,
+                            None if frame.depth is None else frame.depth.shape)
+        self.frames_per_chunk = max(1, self.chunk_bytes // dtype.itemsize)
+        self._meta = {
+            "color_shape": list(frame.color.shape),
+            "depth_shape": None if frame.depth is None else list(frame.depth.shape),
+            "frames_per_chunk": self.frames_per_chunk,
+            "intrinsics": intrinsics_to_dict(frame.intrinsics),
+            "depth_intrinsics": intrinsics_to_dict(frame.depth_intrinsics),
+            "depth_scale": frame.depth_scale,
+            "frames": 0,
+        }
+        self._dtype = dtype
+        self._write_meta()
+        self._index = open(os.path.join(self.path, INDEX_FILE), "wb")
+
+    def _write_meta(self):
+        self._meta["frames"] = self.count
+        tmp = os.path.join(self.path, RECORDING_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._meta, f)
+        os.replace(tmp, os.path.join(self.path, RECORDING_FILE))
+
+    def _next_chunk(self):
+        # Flushing the index with every finished chunk means a crash loses at
+        # most the frames of the chunk being written.
+        self._index.flush()
+        size = self.frames_per_chunk * self._dtype.itemsize
+        fd = os.open(_chunk_path(self.path, self.count // self.frames_per_chunk),
+                     os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+            buffer = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        # Dropping the previous chunk's array unmaps it; the kernel writes its
+        # pages back in the background instead of the capture loop waiting.
+        self._slots = np.frombuffer(buffer, self._dtype)
+
+    def write(self, frame):
+        if self._meta is None:
+            self._begin(frame)
+        slot = self.count % self.frames_per_chunk
+        if slot == 0:
+            self._next_chunk()
+
+        self._slots["color"][slot] = frame.color
+        if "depth" in self._dtype.names:
+            self._slots["depth"][slot] = frame.depth
+        np.array([(frame.timestamp, frame.index)], INDEX_DTYPE).tofile(self._index)
+        self.count += 1
+
+    def close(self):
+        if self._meta is None:
+            return
+        self._slots = None
+        self._index.close()
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording:
+    """Random access to the frames of a chunked recording. Chunks are memory
+    mapped the first time one of their frames is asked for, and frames are
+    read only views into the mapping; copy an image before drawing on it
+    (BufferArena.writable).
+
+    Args:
+        path (str): Recording directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, RECORDING_FILE)) as f:
+            meta = json.load(f)
+        self.intrinsics = intrinsics_from_dict(meta["intrinsics"])
+        self.depth_intrinsics = intrinsics_from_dict(meta.get("depth_intrinsics"))
+        self.depth_scale = meta.get("depth_scale")
+        self.frames_per_chunk = meta["frames_per_chunk"]
+        self._dtype = _slot_dtype(meta["color_shape"], meta["depth_shape"])
+        self.has_depth = meta["depth_shape"] is not None
+
+        # Use the index rather than meta["frames"], which is only written on
+        # close, so recordings cut short by a crash still open.
+        with open(os.path.join(path, INDEX_FILE), "rb") as f:
+            data = f.read()
+        # A crash can leave half an entry at the end.
+        complete = len(data) // INDEX_DTYPE.itemsize * INDEX_DTYPE.itemsize
+        self.index = np.frombuffer(data[:complete], INDEX_DTYPE)
+        chunk_frames = 0
+        while os.path.exists(_chunk_path(path, chunk_frames // self.frames_per_chunk)):
+            chunk_frames += self.frames_per_chunk
+        self.index = self.index[:chunk_frames]
+        self.timestamps = self.index["timestamp"]
+        self._chunks = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def _chunk(self, chunk):
+        slots = self._chunks.get(chunk)
+        if slots is None:
+            with open(_chunk_path(self.path, chunk), "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(buffer, "madvise"):
+                buffer.madvise(mmap.MADV_SEQUENTIAL)
+            slots = self._chunks[chunk] = np.frombuffer(buffer, self._dtype)
+        return slots
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("frame %d not in recording" % i)
+        slots, slot = self._chunk(i // self.frames_per_chunk), i % self.frames_per_chunk
+        depth = slots["depth"][slot] if self.has_depth else None
+        timestamp, number = self.index[i]
+        return Frame(slots["color"][slot], depth, self.intrinsics, self.depth_intrinsics,
+                     self.depth_scale, float(timestamp), int(number))
+
+    def find(self, timestamp):
+        """Return the position of the first frame taken at or after timestamp."""
+        return int(np.searchsorted(self.timestamps, timestamp))
+
+    def close(self):
+        # Arrays handed out keep their mapping alive until they are dropped.
+        self._chunks = {}
+
+
+class RecordingSource(ReplaySource):
+    """Play back a chunked recording, with the pacing, looping and seeking of
+    ReplaySource.
+
+    Args:
+        path (str): Recording directory
+        realtime (boolean): Pace frames at their recorded timestamps
+        loop (boolean): Start over at the end instead of returning None
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.recording = Recording(path)
+        self.intrinsics = self.recording.intrinsics
+        self.depth_intrinsics = self.recording.depth_intrinsics
+        self.depth_scale = self.recording.depth_scale
+        self.has_depth = self.recording.has_depth
+        self.timestamps = self.recording.timestamps
+        self.position = 0
+        self._clock_start = None
+
+    def seek_time(self, timestamp):
+        """Continue playing at the first frame taken at or after timestamp."""
+        self.seek(self.recording.find(timestamp))
+
+    def _load(self, i):
+        return self.recording[i]
+
+    def stop(self):
+        self.recording.close()
+
+
+class RecordingTap(FrameSource):
+    """Record every frame another source hands out while passing it on.
+
+    Args:
+        source (FrameSource): Started source to record, like the ones
+            open_source returns. The tap only stops it.
+        path (str): Directory to write the recording into
+    """
+
+    def __init__(self, source, path):
+        self.source = source
+        self.writer = RecordingWriter(path)
+        self.intrinsics = source.intrinsics
+        self.depth_intrinsics = source.depth_intrinsics
+        self.depth_scale = source.depth_scale
+
+    @property
+    def dropped(self):
+        return self.source.dropped
+
+    def start(self):
+        # The source was started before the tap read its calibration.
+        return self
+
+    def read(self):
+        frame = self.source.read()
+        if frame is not None:
+            self.writer.write(frame)
+        return frame
+
+    def valid(self, frame):
+        return self.source.valid(frame)
+
+    def stop(self):
+        self.source.stop()
+        self.writer.close()
+
+
+def add_record_arguments(parser):
+    """Add the --record option understood by record_from_args."""
+    parser.add_argument("--record", help="also record every frame into this \
+                        directory, replay it later with --source <directory>")
+
+
+def record_from_args(args, source):
+    """Return source, wrapped in a RecordingTap when --record was given."""
+    if not args.record:
+        return source
+    return RecordingTap(source, args.record)
@@ -0,0 +1,216 @@
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+from .buffers import BufferArena
+from .motion import merge_rects, rects_overlap
+
+
+"""
+Color segmentation in a few whole-image OpenCV passes. Every pixel is labeled
+with its color class by converting the frame to 16 bit BGR565 and looking the
+value up in a 64 KB table built from the HSV ranges, so there is no HSV
+conversion per frame and the table stays in the CPU cache. The blobs of all
+colors come out of one connected components pass over the colored pixels, so
+more colors cost next to nothing. Intermediate images are written into
+preallocated buffers, so segmenting a frame allocates no frame sized arrays
+after the first one.
+"""
+
+
+ColorRange = namedtuple("ColorRange", ["name", "lower", "upper", "draw_color"])
+
+# area is the number of pixels of the blob and cx, cy its centroid.
+Blob = namedtuple("Blob", ["label", "name", "x", "y", "w", "h", "area", "cx", "cy"])
+
+# HSV ranges used by camVision.py and cam.py. When ranges overlap the color
+# listed first wins.
+COLORS = [
+    ColorRange("Blue", (94, 80, 2), (120, 255, 255), (255, 0, 0)),
+    ColorRange("Red", (136, 87, 111), (180, 255, 255), (0, 0, 255)),
+    ColorRange("Yellow", (22, 93, 0), (45, 255, 255), (0, 255, 255)),
+    ColorRange("Green", (50, 100, 50), (70, 255, 255), (0, 255, 0)),
+    ColorRange("Purple", (130, 0, 0), (150, 255, 255), (128, 0, 128)),
+]
+
+
+def build_lut(colors):
+    """Build the color lookup table for a list of HSV ranges.
+
+    The table is indexed by the BGR565 value of a pixel: 5 bits of blue, 6 of
+    green and 5 of red, as produced by cv2.COLOR_BGR2BGR565. Each entry holds
+    the label most of the colors in its bin have, by a vote of 2 x 2 x 2
+    colors spread over the bin, so pixels within a few levels of the edge of a
+    range can land on either side of it.
+
+    Args:
+        colors (List): ColorRange list, label i + 1 belongs to colors[i]
+
+    Returns:
+        ndarray: Flat uint8 table of 2^16 labels (0 means no color)
+    """
+    if len(colors) > 255:
+        raise ValueError("At most 255 colors are supported.")
+
+    # Lowest blue, green and red of every bin, then two samples per channel.
+    index = np.arange(1 << 16, dtype=np.int32)
+    low = np.stack([(index & 0x1F) << 3, (index >> 5 & 0x3F) << 2, (index >> 11) << 3], axis=-1)
+    offsets = np.array([(b, g, r) for b in (2, 6) for g in (1, 3) for r in (2, 6)])
+    bgr = (low[:, None, :] + offsets[None, :, :]).astype(np.uint8)
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+
+    samples = np.zeros(hsv.shape[:2], np.uint8)
+    # Fill in reverse so the first matching color ends up in the table.
+    for label in range(len(colors), 0, -1):
+        inside = cv2.inRange(hsv, colors[label - 1].lower, colors[label - 1].upper)
+        samples[inside != 0] = label
+    votes = np.stack([np.count_nonzero(samples == label, axis=1)
+                      for label in range(len(colors) + 1)], axis=1)
+    return votes.argmax(axis=1).astype(np.uint8)
+
+
+class ColorSegmenter:
+    """Find blobs of every configured color in a BGR image.
+
+    Args:
+        colors (List): ColorRange list to look for
+        min_area (int): Blobs with this area or less are ignored
+        dilate (int): Size of the square kernel used to grow the color regions
+            (0 disables it)
+        arena (BufferArena): Buffers to reuse, a new arena if not given
+    """
+
+    def __init__(self, colors=COLORS, min_area=300, dilate=5, arena=None):
+        self.colors = list(colors)
+        self.arena = arena if arena is not None else BufferArena()
+        self.min_area = min_area
+        self.kernel = np.ones((dilate, dilate), np.uint8) if dilate else None
+        self.lut = build_lut(self.colors)
+        self._cv2_lut = True
+
+    def _lookup(self, index, out):
+        if self._cv2_lut:
+            try:
+                return cv2.LUT(index, self.lut, dst=out)
+            except cv2.error:
+                # Older OpenCV versions only look up 8 bit images.
+                self._cv2_lut = False
+        return self.lut.take(index, out=out)
+
+    def segment(self, image):
+        """Label every pixel of a BGR image with its color class.
+
+        Args:
+            image (ndarray): BGR image
+
+        Returns:
+            ndarray: uint8 label image, 0 for no color and i + 1 for colors[i].
+                It is a buffer of the arena, overwritten by the next call.
+        """
+        arena = self.arena
+        height, width = image.shape[:2]
+        packed = cv2.cvtColor(image, cv2.COLOR_BGR2BGR565, dst=arena.get("packed", (height, width, 2)))
+        labels = self._lookup(packed.view(np.uint16).reshape(height, width),
+                              arena.get("labels", (height, width)))
+
+        if self.kernel is not None:
+            # Grow every color into the uncolored pixels around it, like the
+            # per color cv2.dilate used to.
+            grown = cv2.dilate(labels, self.kernel, dst=arena.like("grown", labels))
+            empty = cv2.compare(labels, 0, cv2.CMP_EQ, dst=arena.like("empty", labels))
+            cv2.copyTo(grown, empty, labels)
+        return labels
+
+    def detect(self, image):
+        """Find the blobs of every color in a BGR image.
+
+        Args:
+            image (ndarray): BGR image
+
+        Returns:
+            List: Blob list sorted by label
+        """
+        return self.blobs(self.segment(image))
+
+    def detect_regions(self, image, regions, blobs):
+        """Update the blobs of the previous frame by detecting again only
+        inside regions, e.g. the changed regions from a MotionGate. A region
+        that touches a previous blob grows to cover it, so a blob moving out of
+        a region is replaced instead of cut in half.
+
+        Args:
+            image (ndarray): BGR image
+            regions (List): (x0, y0, x1, y1) rectangles to detect in
+            blobs (List): Blobs of the previous frame
+
+        Returns:
+            List: Blob list sorted by label
+        """
+        grown = []
+        for rect in regions:
+            rect = list(rect)
+            for blob in blobs:
+                box = (blob.x, blob.y, blob.x + blob.w, blob.y + blob.h)
+                if rects_overlap(box, rect):
+                    rect = [min(rect[0], box[0]), min(rect[1], box[1]),
+                            max(rect[2], box[2]), max(rect[3], box[3])]
+            grown.append(rect)
+        grown = merge_rects(grown)
+
+        result = [blob for blob in blobs if not any(
+            rects_overlap((blob.x, blob.y, blob.x + blob.w, blob.y + blob.h), rect) for rect in grown)]
+        for x0, y0, x1, y1 in grown:
+            for blob in self.detect(image[y0:y1, x0:x1]):
+                result.append(blob._replace(x=blob.x + x0, y=blob.y + y0, cx=blob.cx + x0,
+                                            cy=blob.cy + y0))
+        result.sort(key=lambda blob: blob.label)
+        return result
+
+    def blobs(self, labels):
+        """Find the blobs in a label image produced by segment().
+
+        Args:
+            labels (ndarray): uint8 label image
+
+        Returns:
+            List: Blob list sorted by label
+        """
+        arena = self.arena
+        # Colored pixels, without those next to a pixel of a higher label, so
+        # touching blobs of different colors stay apart and every component
+        # has a single color.
+        highest = cv2.dilate(labels, np.ones((3, 3), np.uint8), dst=arena.like("highest", labels))
+        mask = cv2.compare(highest, labels, cv2.CMP_LE, dst=arena.like("mask", labels))
+        cv2.bitwise_and(mask, labels, dst=mask)
+        # Grana's block based labeling, about 3 times faster here than the
+        # default algorithm when the stats are computed as well.
+        count, components, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+            mask, 8, cv2.CV_32S, cv2.CCL_GRANA,
+            labels=arena.get("components", labels.shape, np.int32))
+
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        blobs = []
+        for i in np.flatnonzero(areas > self.min_area) + 1:
+            x, y, w, h = (int(v) for v in stats[i, :4])
+            # The color of the component, read at its first pixel in its top row.
+            column = x + int(np.argmax(components[y, x:x + w] == i))
+            label = int(labels[y, column])
+            blobs.append(Blob(label, self.colors[label - 1].name, x, y, w, h,
+                              int(stats[i, cv2.CC_STAT_AREA]), float(centroids[i, 0]),
+                              float(centroids[i, 1])))
+        blobs.sort(key=lambda blob: blob.label)
+        return blobs
+
+    def draw(self, image, blobs):
+        """Draw a labeled rectangle around every blob.
+
+        Args:
+            image (ndarray): BGR image to draw on
+            blobs (List): Blobs returned by detect()
+        """
+        for blob in blobs:
+            color_val = self.colors[blob.label - 1].draw_color
+            cv2.rectangle(image, (blob.x, blob.y), (blob.x + blob.w, blob.y + blob.h), color_val, 2)
+            cv2.putText(image, blob.name + " Colour", (blob.x, blob.y), cv2.FONT_HERSHEY_SIMPLEX,
+                        1.0, color_val)
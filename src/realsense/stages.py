@@ -0,0 +1,326 @@
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+from .metrics import NULL_METRICS
+
+
+"""
+Staged capture / process / render pipeline. Capture and processing run on their
+own threads and rendering stays on the calling thread (cv2.imshow has to run on
+the main thread on some platforms). The stages are joined by small bounded
+queues that drop frames instead of letting them pile up, so a slow stage lowers
+the frame rate but not the latency.
+
+Frames the source hands out as views into memory it reuses (the frame bus
+without copying) are checked with source.valid after processing and again
+before rendering. A frame overwritten in between is counted in stale_frames
+and skipped, since its result may not match its pixels.
+"""
+
+
+DROP_POLICIES = ("oldest", "newest", "block")
+
+
+class QueueClosed(Exception):
+    """Raised by DropQueue.get once the queue is closed and empty"""
+    pass
+
+
+class DropQueue:
+    """Bounded queue between two stages.
+
+    Args:
+        maxsize (int): Number of items the queue holds
+        drop (str): What to do when it is full. "oldest" throws away the
+            oldest item, "newest" throws away the item being put and "block"
+            waits for room like queue.Queue.
+    """
+
+    def __init__(self, maxsize=2, drop="oldest"):
+        if drop not in DROP_POLICIES:
+            raise ValueError("drop must be one of " + ", ".join(DROP_POLICIES))
+        self.maxsize = maxsize
+        self.drop = drop
+        self.dropped = 0
+        self.closed = False
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        """Add an item, dropping one if the queue is full.
+
+        Returns:
+            boolean: False if the item itself was dropped
+        """
+        with self._cond:
+            if self.drop == "block":
+                while len(self._items) >= self.maxsize and not self.closed:
+                    self._cond.wait()
+            elif len(self._items) >= self.maxsize:
+                self.dropped += 1
+                if self.drop == "newest":
+                    return False
+                self._items.popleft()
+
+            if self.closed:
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, waiting for one if needed.
+
+        Raises:
+            QueueClosed: If the queue was closed and is empty
+            TimeoutError: If no item arrived within timeout seconds
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self.closed, timeout):
+                raise TimeoutError
+            if not self._items:
+                raise QueueClosed
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Wake up everyone waiting on the queue. Items already queued can
+        still be taken out.
+        """
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """Rolling latency statistics of one stage.
+
+    Args:
+        name (str): Stage name used in reports
+        window (int): Number of recent samples kept
+    """
+
+    def __init__(self, name, window=300):
+        self.name = name
+        self.count = 0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.count += 1
+            self._samples.append(seconds)
+
+    def summary(self):
+        """Return (mean, p50, p95, max) of the recent samples in milliseconds."""
+        with self._lock:
+            samples = np.array(self._samples)
+        if samples.size == 0:
+            return (0.0, 0.0, 0.0, 0.0)
+        samples *= 1000.0
+        p50, p95 = np.percentile(samples, [50, 95])
+        return (float(samples.mean()), float(p50), float(p95), float(samples.max()))
+
+    def __str__(self):
+        mean, p50, p95, peak = self.summary()
+        return "%-10s n=%-6d mean=%6.1fms p50=%6.1fms p95=%6.1fms max=%6.1fms" % (
+            self.name, self.count, mean, p50, p95, peak)
+
+
+class _Packet:
+    __slots__ = ("frame", "result", "captured")
+
+    def __init__(self, frame, captured):
+        self.frame = frame
+        self.result = None
+        self.captured = captured
+
+
+class StagedPipeline:
+    """Run capture, processing and rendering on separate threads.
+
+    Args:
+        source (FrameSource): Where frames come from
+        process (function): process(frame) -> result, runs on the worker thread
+        render (function): render(frame, result) -> boolean, runs on the
+            calling thread. Returning False stops the pipeline.
+        queue_size (int): Size of each queue between stages
+        drop (str): Drop policy of the queues (see DropQueue)
+        metrics (Metrics): Also record stage timings and dropped frames here
+    """
+
+    def __init__(self, source, process, render, queue_size=2, drop="oldest",
+                 metrics=NULL_METRICS):
+        self.source = source
+        self.process = process
+        self.render = render
+        self.metrics = metrics
+        self.captured = DropQueue(queue_size, drop)
+        self.processed = DropQueue(queue_size, drop)
+        self.stats = {name: StageStats(name) for name in
+                      ("capture", "process", "render", "latency")}
+        self.stale = 0
+        self._stop = threading.Event()
+        self._error = None
+        self._threads = [
+            threading.Thread(target=self._guard, args=(self._capture_loop, self.captured),
+                             name="capture", daemon=True),
+            threading.Thread(target=self._guard, args=(self._process_loop, self.processed),
+                             name="process", daemon=True),
+        ]
+
+    def _guard(self, loop, downstream):
+        try:
+            loop()
+        except QueueClosed:
+            pass
+        except Exception as e:
+            self._error = e
+            self._stop.set()
+            self.captured.close()
+        finally:
+            # The next stage finishes what is already queued and then exits.
+            downstream.close()
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            frame = self.source.read()
+            if frame is None:
+                return
+            now = time.perf_counter()
+            self.stats["capture"].add(now - start)
+            self.metrics.add("capture", now - start)
+            self.captured.put(_Packet(frame, now))
+
+    def _process_loop(self):
+        while not self._stop.is_set():
+            packet = self.captured.get()
+            start = time.perf_counter()
+            packet.result = self.process(packet.frame)
+            elapsed = time.perf_counter() - start
+            self.stats["process"].add(elapsed)
+            self.metrics.add("process", elapsed)
+            if self._fresh(packet.frame):
+                self.processed.put(packet)
+
+    def _fresh(self, frame):
+        if self.source.valid(frame):
+            return True
+        self.stale += 1
+        self.metrics.incr("stale_frames")
+        return False
+
+    def run(self, report_every=None):
+        """Start the worker threads and render on the calling thread until
+        render returns False or the source runs out of frames.
+
+        Args:
+            report_every (float): Print stage statistics every this many seconds
+        """
+        for thread in self._threads:
+            thread.start()
+
+        last_report = time.perf_counter()
+        try:
+            while True:
+                try:
+                    packet = self.processed.get(timeout=0.1)
+                except TimeoutError:
+                    continue
+                except QueueClosed:
+                    break
+                if not self._fresh(packet.frame):
+                    continue
+
+                start = time.perf_counter()
+                keep_going = self.render(packet.frame, packet.result)
+                now = time.perf_counter()
+                self.stats["render"].add(now - start)
+                self.stats["latency"].add(now - packet.captured)
+                self.metrics.add("render", now - start)
+                self.metrics.set("dropped_frames", self.dropped())
+                self.metrics.end_frame(latency_ms=round((now - packet.captured) * 1000.0, 3))
+                if keep_going is False:
+                    break
+
+                if report_every and now - last_report >= report_every:
+                    print(self.report())
+                    last_report = now
+        finally:
+            self.stop()
+
+        if self._error is not None:
+            raise self._error
+
+    def stop(self):
+        self._stop.set()
+        self.captured.close()
+        self.processed.close()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(timeout=1.0)
+
+    def dropped(self):
+        """Frames lost by the source plus frames dropped by the queues."""
+        return self.source.dropped + self.captured.dropped + self.processed.dropped
+
+    def report(self):
+        """Return a multi-line summary of stage latencies and dropped frames."""
+        lines = [str(stats) for stats in self.stats.values()]
+        lines.append("dropped    capture->process=%d process->render=%d stale=%d" % (
+            self.captured.dropped, self.processed.dropped, self.stale))
+        return "\n".join(lines)
+
+
+def run_serial(source, process, render, metrics=NULL_METRICS):
+    """Run process and render one frame at a time on the calling thread."""
+    while True:
+        with metrics.span("capture"):
+            frame = source.read()
+        if frame is None:
+            break
+        with metrics.span("process"):
+            result = process(frame)
+        if source.valid(frame):
+            with metrics.span("render"):
+                keep_going = render(frame, result)
+        else:
+            metrics.incr("stale_frames")
+            keep_going = True
+        metrics.set("dropped_frames", source.dropped)
+        metrics.end_frame()
+        if keep_going is False:
+            break
+
+
+def add_pipeline_arguments(parser):
+    """Add the --threaded/--queue-size/--drop options understood by run_pipeline."""
+    parser.add_argument("--threaded", action="store_true", help="capture, process \
+                        and render on separate threads")
+    parser.add_argument("--queue-size", default=2, type=int, help="frames buffered \
+                        between threaded stages")
+    parser.add_argument("--drop", default="oldest", choices=DROP_POLICIES, help="what \
+                        a full queue does with new frames")
+    parser.add_argument("--stats", default=5.0, type=float, help="seconds between \
+                        stage latency reports in threaded mode (0 to disable)")
+
+
+def run_pipeline(args, source, process, render, metrics=NULL_METRICS):
+    """Run process and render over the source, threaded if --threaded was given."""
+    if not args.threaded:
+        run_serial(source, process, render, metrics)
+        return
+
+    pipeline = StagedPipeline(source, process, render, args.queue_size, args.drop, metrics)
+    try:
+        pipeline.run(report_every=args.stats or None)
+    finally:
+        print(pipeline.report())
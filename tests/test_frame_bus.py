@@ -0,0 +1,43 @@
+import numpy as np
+
+from realsense.frame_bus import FrameBusSource, FrameBusWriter
+from realsense.frame_source import Frame
+from realsense.stages import run_serial
+
+
+def frame(i):
+    return Frame(np.full((8, 8, 3), i, np.uint8), timestamp=float(i), index=i)
+
+
+def test_slow_consumer_on_a_small_ring():
+    with FrameBusWriter("test_slow_consumer", slots=2) as writer:
+        writer.write(frame(0))
+        copied = FrameBusSource("test_slow_consumer", timeout=0.1).start()
+        viewed = FrameBusSource("test_slow_consumer", copy=False, timeout=0.1).start()
+        try:
+            rendered = []
+
+            def process(read):
+                # The producer laps the ring while the first frame is processed.
+                if read.raw == 0:
+                    for i in range(1, 4):
+                        writer.write(frame(i))
+                return int(read.color[0, 0, 0])
+
+            def render(read, value):
+                rendered.append(value)
+                return len(rendered) < 2
+
+            run_serial(copied, process, render)
+            # Copied frames can't be torn, so none is skipped as stale.
+            assert rendered == [0, 3]
+
+            view = viewed.read()
+            assert view.color[0, 0, 0] == 3 and viewed.valid(view)
+            for i in range(4, 6):
+                writer.write(frame(i))
+            # The slot of the view was written over.
+            assert not viewed.valid(view)
+        finally:
+            copied.stop()
+            viewed.stop()
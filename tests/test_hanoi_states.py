@@ -0,0 +1,27 @@
+import numpy as np
+
+from realsense.apriltag_detect import get_hanoi_tower
+from realsense.hanoi_states import hanoi_states, state_lists
+
+
+BOUNDARIES = (-0.1, 0.1)
+
+
+def test_matches_get_hanoi_tower():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(-0.3, 0.3, (500, 5, 3))
+    # Rings right on the dividers and rings sharing a height.
+    positions[::3, 0, 0] = BOUNDARIES[0]
+    positions[1::3, 1, 0] = BOUNDARIES[1]
+    positions[::5, 2, 1] = positions[::5, 3, 1]
+    states = hanoi_states(positions, BOUNDARIES)
+
+    for frame, state in zip(positions, states):
+        assert state_lists(state) == get_hanoi_tower(frame, *BOUNDARIES)
+
+
+def test_unseen_rings():
+    positions = np.array([[[BOUNDARIES[0], 0.0, 1.0], [np.nan] * 3, [BOUNDARIES[1], 0.1, 1.0]]])
+    states = hanoi_states(positions, BOUNDARIES)
+
+    assert state_lists(states[0]) == [[], [3, 1], []]
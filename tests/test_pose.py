@@ -0,0 +1,72 @@
+import numpy as np
+import cv2
+
+from realsense.pose import BatchPoseSolver, rotations_from_vectors
+
+
+CAMERA_PARAMS = (600.0, 600.0, 320.0, 240.0)
+TAG_SIZE = 0.05
+
+
+def random_tags(count, noise, seed=0):
+    """Corners of small tags at random poses in front of the camera, with
+    gaussian pixel noise.
+    """
+    rng = np.random.default_rng(seed)
+    solver = BatchPoseSolver(CAMERA_PARAMS, TAG_SIZE)
+    rotations = rotations_from_vectors(rng.normal(0, 0.5, (count, 3)))
+    translations = np.column_stack([rng.uniform(-0.3, 0.3, (count, 2)),
+                                    rng.uniform(0.8, 2.0, count)])
+    points = (rotations @ solver.object_points.T).transpose(0, 2, 1) + translations[:, None]
+    fx, fy, cx, cy = CAMERA_PARAMS
+    corners = np.stack([fx * points[..., 0] / points[..., 2] + cx,
+                        fy * points[..., 1] / points[..., 2] + cy], axis=-1)
+    return corners + rng.normal(0, noise, corners.shape), translations
+
+
+def solve_pnp(solver, corners):
+    """Lowest reprojection error (in the solver's metric) and translation of
+    the IPPE_SQUARE solutions of one tag.
+    """
+    _, rvecs, tvecs, _ = cv2.solvePnPGeneric(solver.object_points, corners, solver.camera_matrix,
+                                             None, flags=cv2.SOLVEPNP_IPPE_SQUARE)
+    best = None
+    for rvec, tvec in zip(rvecs, tvecs):
+        rotation, translation = cv2.Rodrigues(rvec)[0][None], tvec.reshape(1, 3)
+        error = solver._errors(solver._residuals(rotation, translation, corners[None])[1])[0]
+        if best is None or error < best[0]:
+            best = (error, translation[0])
+    return best
+
+
+def test_matches_solvepnp():
+    corners, truth = random_tags(200, noise=0.5)
+    solver = BatchPoseSolver(CAMERA_PARAMS, TAG_SIZE)
+    poses = solver.solve(list(range(len(corners))), corners)
+
+    ours, theirs = [], []
+    for i, quad in enumerate(corners):
+        error, translation = solve_pnp(solver, quad)
+        # Never stuck in a worse minimum than IPPE
+        assert poses.errors[i] <= error + 0.01
+        ours.append(np.linalg.norm(poses.translations[i] - truth[i]) / np.linalg.norm(truth[i]))
+        theirs.append(np.linalg.norm(translation - truth[i]) / np.linalg.norm(truth[i]))
+    assert np.mean(ours) <= np.mean(theirs) * 1.05
+
+
+def test_exact_corners():
+    corners, truth = random_tags(50, noise=0.0, seed=1)
+    poses = BatchPoseSolver(CAMERA_PARAMS, TAG_SIZE).solve(list(range(len(corners))), corners)
+
+    assert poses.errors.max() < 1e-3
+    np.testing.assert_allclose(poses.translations, truth, atol=1e-5)
+
+
+def test_previous_pose():
+    corners, truth = random_tags(20, noise=0.3, seed=2)
+    solver = BatchPoseSolver(CAMERA_PARAMS, TAG_SIZE)
+    ids = list(range(len(corners)))
+    first = solver.solve(ids, corners)
+    second = solver.solve(ids, corners)
+
+    np.testing.assert_allclose(second.errors, first.errors, atol=1e-3)
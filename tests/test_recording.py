@@ -0,0 +1,42 @@
+import numpy as np
+import cv2
+
+from realsense.buffers import BufferArena
+from realsense.frame_source import Frame
+from realsense.recording import Recording, RecordingSource, RecordingWriter
+
+
+def write_recording(path, count=3):
+    with RecordingWriter(str(path)) as writer:
+        for i in range(count):
+            color = np.full((24, 32, 3), i, np.uint8)
+            depth = np.full((24, 32), i, np.uint16)
+            writer.write(Frame(color, depth, depth_scale=0.001, timestamp=i / 30.0, index=i))
+
+
+def test_drawing_does_not_change_later_reads(tmp_path):
+    write_recording(tmp_path)
+    recording = Recording(str(tmp_path))
+    arena = BufferArena()
+
+    image = arena.writable("annotated", recording[0].color)
+    cv2.rectangle(image, (0, 0), (31, 23), (255, 255, 255), -1)
+
+    assert not recording[0].color.flags.writeable
+    assert recording[0].color.max() == 0
+    recording.close()
+
+
+def test_loop_shows_the_recorded_pixels(tmp_path):
+    write_recording(tmp_path)
+    source = RecordingSource(str(tmp_path), realtime=False, loop=True).start()
+    arena = BufferArena()
+
+    seen = []
+    for _ in range(6):
+        frame = source.read()
+        seen.append(int(frame.color[0, 0, 0]))
+        cv2.circle(arena.writable("annotated", frame.color), (0, 0), 3, (200, 200, 200), -1)
+    source.stop()
+
+    assert seen == [0, 1, 2, 0, 1, 2]
@@ -0,0 +1,22 @@
+import numpy as np
+
+from realsense.segmentation import COLORS, ColorSegmenter
+
+
+def test_blobs_of_every_color_in_one_pass():
+    labels = np.zeros((120, 160), np.uint8)
+    labels[10:50, 10:50] = 1
+    # Touches the first blob but has another color.
+    labels[10:50, 50:90] = 2
+    labels[70:110, 100:150] = 5
+    # Too small to count.
+    labels[100:105, 10:15] = 3
+    blobs = ColorSegmenter(min_area=100).blobs(labels)
+
+    assert [(blob.name, blob.label) for blob in blobs] == [
+        (COLORS[0].name, 1), (COLORS[1].name, 2), (COLORS[4].name, 5)]
+    assert (blobs[1].x, blobs[1].y, blobs[1].w, blobs[1].h) == (50, 10, 40, 40)
+    assert blobs[2].area == 40 * 50
+    assert (blobs[2].cx, blobs[2].cy) == (124.5, 89.5)
+    # The lower label loses the column next to the higher one.
+    assert (blobs[0].w, blobs[0].area) == (39, 39 * 40)